@@ -0,0 +1,279 @@
+"""
+Address Parser
+Rule-based address parsing backed by an in-memory gazetteer of localities
+and pincode centroids
+"""
+
+import json
+import os
+import re
+from bisect import bisect_left
+from difflib import get_close_matches
+from functools import lru_cache
+from typing import Any, Dict, List, Optional, Tuple
+
+
+DEFAULT_GAZETTEER_PATH = os.path.join(
+    os.path.dirname(__file__), "data", "ahmedabad_gazetteer.json"
+)
+
+# Similarity needed for a misspelt word to match a locality name
+FUZZY_CUTOFF = 0.85
+
+# Words whose fuzzy lookup result is remembered
+FUZZY_CACHE_SIZE = 10000
+
+# Shortest input that may match a locality by prefix ("satel" -> Satellite)
+MIN_PREFIX_LENGTH = 5
+
+_PINCODE = re.compile(r"\b(\d{3})\s?(\d{3})\b")
+_HOUSE_NUMBER = re.compile(
+    r"^\s*(?:(?:flat|house|plot|shop|office|block|bungalow|h)\s*(?:no\.?|number|#)?\s*"
+    r"|#\s*)?([a-z]?[-/]?\d+[a-z]?(?:\s*[-/]\s*[a-z0-9]+)?)\b",
+    re.IGNORECASE
+)
+_LANDMARK = re.compile(
+    r"^\s*(near|opp\.?|opposite|behind|beside|next to|in front of)\s+(.+)$",
+    re.IGNORECASE
+)
+_STREET = re.compile(
+    r"\b(road|rd\.?|street|st\.?|marg|lane|highway|path|cross road|char rasta|chowk)\b",
+    re.IGNORECASE
+)
+_WORDS = re.compile(r"[a-z]+")
+
+
+class Gazetteer:
+    """Localities of a city with aliases, pincodes and centroid coordinates"""
+
+    def __init__(self, data: Dict[str, Any]):
+        """
+        Build lookup indexes
+
+        Args:
+            data: Parsed gazetteer file (see agents/data/*.json)
+        """
+        self.city = data["city"]
+        self.city_aliases = set(data.get("city_aliases", [self.city.lower()]))
+        self.state = data.get("state", "")
+        self.country = data.get("country", "India")
+        self.localities: List[Dict[str, Any]] = data["localities"]
+
+        self._by_alias: Dict[str, Dict[str, Any]] = {}
+        for locality in self.localities:
+            for alias in [locality["name"].lower()] + locality.get("aliases", []):
+                self._by_alias[alias] = locality
+        self._aliases = sorted(self._by_alias)
+        self._max_alias_words = max(len(alias.split()) for alias in self._aliases)
+        self._fuzzy_cache: Dict[str, Optional[Dict[str, Any]]] = {}
+
+        # Pincode centroid: mean of the localities sharing the pincode
+        grouped: Dict[str, List[Dict[str, Any]]] = {}
+        for locality in self.localities:
+            grouped.setdefault(locality["pincode"], []).append(locality)
+        self.pincodes = {
+            pincode: {
+                "latitude": round(sum(l["latitude"] for l in group) / len(group), 4),
+                "longitude": round(sum(l["longitude"] for l in group) / len(group), 4),
+                "localities": [l["name"] for l in group],
+            }
+            for pincode, group in grouped.items()
+        }
+
+    @classmethod
+    def load(cls, path: str) -> "Gazetteer":
+        with open(path, encoding="utf-8") as f:
+            return cls(json.load(f))
+
+    def lookup(self, text: str) -> Optional[Dict[str, Any]]:
+        """Find a locality by exact name or alias"""
+        return self._by_alias.get(text.strip().lower())
+
+    def prefix_lookup(self, text: str) -> List[Dict[str, Any]]:
+        """Find localities whose name or alias starts with text"""
+        prefix = text.strip().lower()
+        if len(prefix) < MIN_PREFIX_LENGTH:
+            return []
+        matches = []
+        for alias in self._aliases[bisect_left(self._aliases, prefix):]:
+            if not alias.startswith(prefix):
+                break
+            if self._by_alias[alias] not in matches:
+                matches.append(self._by_alias[alias])
+        return matches
+
+    def fuzzy_lookup(self, text: str) -> Optional[Dict[str, Any]]:
+        """Find the locality closest in spelling to text, if close enough"""
+        word = text.strip().lower()
+        if word not in self._fuzzy_cache:
+            if len(self._fuzzy_cache) >= FUZZY_CACHE_SIZE:
+                self._fuzzy_cache.clear()
+            match = get_close_matches(word, self._aliases, n=1, cutoff=FUZZY_CUTOFF)
+            self._fuzzy_cache[word] = self._by_alias[match[0]] if match else None
+        return self._fuzzy_cache[word]
+
+    def find_in_text(self, text: str) -> Optional[Tuple[Dict[str, Any], str]]:
+        """
+        Find the first locality named in a piece of address text
+
+        Tries exact names (longest first), then unambiguous prefixes, then
+        misspellings.
+
+        Returns:
+            (locality, match_type) with match_type 'exact', 'prefix' or
+            'fuzzy', or None
+        """
+        words = _WORDS.findall(text.lower())
+        for size in range(min(self._max_alias_words, len(words)), 0, -1):
+            for start in range(len(words) - size + 1):
+                locality = self._by_alias.get(" ".join(words[start:start + size]))
+                if locality is not None:
+                    return locality, "exact"
+
+        for word in words:
+            matches = self.prefix_lookup(word)
+            if len(matches) == 1:
+                return matches[0], "prefix"
+
+        for word in words:
+            if len(word) >= 4 and word not in self.city_aliases:
+                locality = self.fuzzy_lookup(word)
+                if locality is not None:
+                    return locality, "fuzzy"
+        return None
+
+
+@lru_cache(maxsize=None)
+def load_gazetteer(path: str = DEFAULT_GAZETTEER_PATH) -> Gazetteer:
+    """Load a gazetteer file once per process"""
+    return Gazetteer.load(path)
+
+
+def parse_address(address: str, gazetteer: Gazetteer) -> Dict[str, Any]:
+    """
+    Split an address into components and geocode it from the gazetteer
+
+    Args:
+        address: Unstructured address string
+        gazetteer: Localities and pincode centroids
+
+    Returns:
+        Components in the area agent's parse format, plus 'parsed' (False
+        when neither a known locality nor a known pincode was found)
+    """
+    text = address or ""
+
+    pincode = None
+    pincode_match = _PINCODE.search(text)
+    if pincode_match:
+        pincode = pincode_match.group(1) + pincode_match.group(2)
+        text = text[:pincode_match.start()] + text[pincode_match.end():]
+
+    segments = [s.strip(" .-") for s in re.split(r"[,\n;]", text)]
+    segments = [s for s in segments if s]
+
+    house_number = None
+    if segments:
+        match = _HOUSE_NUMBER.match(segments[0])
+        if match:
+            house_number = match.group(1).strip()
+
+    landmark = None
+    street = None
+    locality = None
+    locality_match = None
+    city = None
+    state = None
+    # Building names and other parts kept only for the formatted address
+    other = []
+    # Roads are often named after a different locality ("Sola Road,
+    # Naranpura"), so they only name the locality if nothing else does
+    street_segments = []
+    for position, segment in enumerate(segments):
+        lowered = segment.lower()
+        if _LANDMARK.match(segment) and landmark is None:
+            landmark = segment
+            continue
+        if lowered in gazetteer.city_aliases:
+            city = gazetteer.city
+            continue
+        if gazetteer.state and lowered == gazetteer.state.lower():
+            state = gazetteer.state
+            continue
+
+        is_street = street is None and bool(_STREET.search(segment))
+        if is_street:
+            street = segment
+            street_segments.append(segment)
+            continue
+        if locality is None:
+            found = gazetteer.find_in_text(segment)
+            if found is not None:
+                locality, locality_match = found
+                continue
+        if position > 0:
+            other.append(segment)
+
+    for segment in street_segments:
+        if locality is None:
+            found = gazetteer.find_in_text(segment)
+            if found is not None:
+                locality, locality_match = found
+
+    words = set(_WORDS.findall((address or "").lower()))
+    if city is None and words & gazetteer.city_aliases:
+        city = gazetteer.city
+    if state is None and gazetteer.state and gazetteer.state.lower() in words:
+        state = gazetteer.state
+
+    pincode_info = gazetteer.pincodes.get(pincode) if pincode else None
+    if locality is None and pincode_info and len(pincode_info["localities"]) == 1:
+        locality = gazetteer.lookup(pincode_info["localities"][0])
+        locality_match = "pincode"
+
+    if locality is not None:
+        latitude, longitude = locality["latitude"], locality["longitude"]
+        source = "locality"
+        city = city or gazetteer.city
+    elif pincode_info is not None:
+        latitude, longitude = pincode_info["latitude"], pincode_info["longitude"]
+        source = "pincode"
+        city = city or gazetteer.city
+    else:
+        latitude = longitude = None
+        source = None
+
+    if city == gazetteer.city:
+        state = state or gazetteer.state
+    pincode = pincode or (locality["pincode"] if locality else None)
+
+    parts = [
+        segments[0] if house_number else None,
+        *other,
+        street,
+        landmark,
+        locality["name"] if locality else None,
+        city,
+        f"{state or ''} {pincode or ''}".strip(),
+    ]
+    formatted = ", ".join(dict.fromkeys(part for part in parts if part))
+
+    return {
+        "house_number": house_number,
+        "street": street,
+        "locality": locality["name"] if locality else None,
+        "landmark": landmark,
+        "city": city,
+        "state": state,
+        "pincode": pincode,
+        "country": gazetteer.country,
+        "formatted_address": formatted,
+        "coordinates": {
+            "latitude": latitude,
+            "longitude": longitude,
+            "accuracy": "approximate" if source else None,
+            "source": source,
+        },
+        "locality_match": locality_match,
+        "parsed": latitude is not None,
+    }
@@ -3,45 +3,29 @@ Area Intelligence Agent
 AI agent for area validation, address parsing, and location intelligence
 """
 
-from typing import Dict, Any
+import os
+from typing import Dict, Any, AsyncIterator, List
 from .base_agent import BaseAgent
+from .service_areas import SERVICE_AREAS, AREAS_BY_PINCODE, score_address
+from .address_parser import DEFAULT_GAZETTEER_PATH, load_gazetteer, parse_address
+from .bulk import process_concurrently
+from .prompt_templates import PromptTemplate
 
 
-class AreaIntelligenceAgent(BaseAgent):
-    """AI Agent for area and location intelligence"""
-    
-    def __init__(self):
-        super().__init__("Area Intelligence Agent")
-    
-    async def validate_area(
-        self,
-        address: str,
-        pincode: str,
-        city: str
-    ) -> Dict[str, Any]:
-        """
-        Validate if address is in serviceable area using AI
-        
-        Args:
-            address: Full address
-            pincode: Postal code
-            city: City name
-            
-        Returns:
-            Validation result with area assignment
-        """
-        prompt = f"""
+# Service areas are filled in once; only the address varies between calls
+_SERVICE_AREA_LINES = "\n".join(
+    f"- {area['area_name']} (area_id {area['area_id']}): "
+    f"pincodes {', '.join(area['pincodes'])}"
+    for area in SERVICE_AREAS
+)
+AREA_VALIDATION_PROMPT = PromptTemplate("""
 You are an intelligent area validation system for The Local Loop hyperlocal platform.
 
 **Service Areas:**
 - Ahmedabad, Gujarat, India
-- Covered Pincodes: 382481, 382424, 382470, 380015, 380052
-- Covered Localities: Gota, Chandkheda, Satellite, Bodakdev, Vastrapur
-
-**Address to Validate:**
-- Address: {address}
-- Pincode: {pincode}
-- City: {city}
+- Covered Pincodes: """ + ", ".join(AREAS_BY_PINCODE) + """
+- Covered Localities: """ + ", ".join(area['locality'] for area in SERVICE_AREAS) + """
+""" + _SERVICE_AREA_LINES + """
 
 **Task:**
 Analyze the address and determine:
@@ -77,12 +61,110 @@ Analyze the address and determine:
   "reasoning": "why this decision was made"
 }}
 
+**Address to Validate:**
+- Address: {address}
+- Pincode: {pincode}
+- City: {city}
+
 Analyze and respond in JSON format only.
-"""
+""")
+
+
+class AreaIntelligenceAgent(BaseAgent):
+    """AI Agent for area and location intelligence"""
+    
+    def __init__(self):
+        super().__init__("Area Intelligence Agent")
+        self.gazetteer = load_gazetteer(os.getenv("GAZETTEER_PATH", DEFAULT_GAZETTEER_PATH))
+    
+    async def validate_area(
+        self,
+        address: str,
+        pincode: str,
+        city: str,
+        priority: str = "critical"
+    ) -> Dict[str, Any]:
+        """
+        Validate if address is in serviceable area
+        
+        Addresses are scored locally against the service area table; only
+        ambiguous ones (pending manual review) are sent to the AI.
         
-        response = await self.generate_response(prompt, temperature=0.3)
+        Args:
+            address: Full address
+            pincode: Postal code
+            city: City name
+            priority: Scheduler lane for the AI call (signup and address
+                edits are critical; bulk imports run in the background)
+            
+        Returns:
+            Validation result with area assignment
+        """
+        result = score_address(address, pincode, city)
+        if result["status"] != "pending":
+            result["validation_method"] = "rules"
+            return result
+        
+        ai_result = await self._validate_area_with_ai(address, pincode, city, priority)
+        if ai_result.get("status") in ("approved", "pending", "rejected"):
+            ai_result["validation_method"] = "ai"
+            return ai_result
+        
+        result["validation_method"] = "rules"
+        return result
+    
+    async def _validate_area_with_ai(
+        self,
+        address: str,
+        pincode: str,
+        city: str,
+        priority: str
+    ) -> Dict[str, Any]:
+        """Validate an ambiguous address using AI"""
+        prompt = AREA_VALIDATION_PROMPT.render(address=address, pincode=pincode, city=city)
+        response = await self.generate_response(
+            prompt,
+            temperature=0.3,
+            priority=priority,
+            static_prefix=AREA_VALIDATION_PROMPT.static_prefix
+        )
         return self.parse_json_response(response)
     
+    def validate_areas_bulk(
+        self,
+        records: List[Dict[str, Any]],
+        concurrency: int = 16
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Validate many addresses concurrently
+        
+        Args:
+            records: [{address, pincode, city, id?}]
+            concurrency: Addresses validated in parallel
+            
+        Returns:
+            Async iterator of per-address results in completion order
+            (see process_concurrently); repeated addresses are validated once
+        """
+        async def validate(record: Dict[str, Any]) -> Dict[str, Any]:
+            return await self.validate_area(
+                address=record.get("address", ""),
+                pincode=record.get("pincode", ""),
+                city=record.get("city", ""),
+                priority="background"
+            )
+        
+        return process_concurrently(
+            records,
+            validate,
+            concurrency,
+            key=lambda r: (
+                " ".join(str(r.get("address", "")).lower().split()),
+                str(r.get("pincode", "")).strip(),
+                str(r.get("city", "")).strip().lower()
+            )
+        )
+    
     async def suggest_area_expansion(
         self,
         new_address: str,
@@ -143,17 +225,27 @@ Provide strategic expansion analysis in JSON format.
     
     async def parse_address_components(
         self,
-        address: str
+        address: str,
+        priority: str = "normal"
     ) -> Dict[str, Any]:
         """
-        Parse address into structured components using AI
+        Parse address into structured components
+        
+        Addresses are parsed locally against the gazetteer; only those with
+        neither a known locality nor a known pincode are sent to the AI.
         
         Args:
             address: Unstructured address string
+            priority: Scheduler lane for the AI call
             
         Returns:
             Structured address components
         """
+        parsed = parse_address(address, self.gazetteer)
+        if parsed.pop("parsed"):
+            parsed["parsed_by"] = "rules"
+            return parsed
+        
         prompt = f"""
 You are an address parsing AI.
 
@@ -191,9 +283,39 @@ Extract and structure the address components:
 Parse and respond in JSON format.
 """
         
-        response = await self.generate_response(prompt, temperature=0.4)
+        response = await self.generate_response(
+            prompt, temperature=0.4, batchable=True, priority=priority
+        )
         return self.parse_json_response(response)
     
+    def parse_addresses_bulk(
+        self,
+        records: List[Dict[str, Any]],
+        concurrency: int = 16
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Parse many addresses concurrently
+        
+        Args:
+            records: [{address, id?}]
+            concurrency: Addresses parsed in parallel
+            
+        Returns:
+            Async iterator of per-address results in completion order
+            (see process_concurrently); repeated addresses are parsed once
+        """
+        async def parse(record: Dict[str, Any]) -> Dict[str, Any]:
+            return await self.parse_address_components(
+                record.get("address", ""), priority="background"
+            )
+        
+        return process_concurrently(
+            records,
+            parse,
+            concurrency,
+            key=lambda r: " ".join(str(r.get("address", "")).lower().split())
+        )
+    
     async def calculate_service_radius(
         self,
         area_center: Dict[str, float],
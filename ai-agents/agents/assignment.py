@@ -0,0 +1,371 @@
+"""
+Delivery Assignment Scoring
+Deterministic ranking of delivery partners for an order, and joint
+min-cost matching of many orders to many partners
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+import numpy as np
+from .geo import haversine_distances, haversine_matrix, coordinate_arrays
+
+
+# Average speed in km/h by vehicle type (20 km/h matches the location matcher)
+VEHICLE_SPEED_KMH = {
+    'bike': 20.0,
+    'scooter': 20.0,
+    'car': 18.0,
+    'bicycle': 12.0,
+}
+DEFAULT_SPEED_KMH = 20.0
+
+# Time spent at the vendor collecting the order
+PICKUP_HANDLING_MINS = 5
+
+# Cost penalties, expressed in minutes so they add to travel time
+LOAD_PENALTY_MINS = 8.0      # per active order already carried
+RATING_PENALTY_MINS = 3.0    # per rating star below 5
+DEFAULT_RATING = 4.0
+
+# Orders one partner may take from a batch; the cost matrix grows as
+# orders x partners x this
+MAX_ORDERS_PER_PARTNER = 5
+
+
+def partner_speed(partner: Dict[str, Any]) -> float:
+    """Get a partner's average speed from their vehicle type"""
+    vehicle = str(partner.get('vehicle_type') or 'bike').lower()
+    return VEHICLE_SPEED_KMH.get(vehicle, DEFAULT_SPEED_KMH)
+
+
+def _partner_features(
+    partners: List[Dict[str, Any]]
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Get (speeds, active_orders, ratings) arrays for partners"""
+    speeds = np.array([partner_speed(p) for p in partners])
+    active_orders = np.array([float(p.get('active_orders') or 0) for p in partners])
+    ratings = np.array([
+        float(p['rating']) if p.get('rating') is not None else DEFAULT_RATING
+        for p in partners
+    ])
+    return speeds, active_orders, ratings
+
+
+def _partner_penalties(active_orders: np.ndarray, ratings: np.ndarray) -> np.ndarray:
+    """Workload and rating penalties in minutes"""
+    return (
+        LOAD_PENALTY_MINS * active_orders
+        + RATING_PENALTY_MINS * np.clip(5 - ratings, 0, 5)
+    )
+
+
+def score_partners(
+    pickup_location: Dict[str, float],
+    delivery_location: Dict[str, float],
+    partners: List[Dict[str, Any]]
+) -> List[Dict[str, Any]]:
+    """
+    Rank partners for an order by estimated cost (lower is better)
+
+    Cost is the time to reach the pickup plus penalties for the partner's
+    current workload and rating, all in minutes.
+
+    Args:
+        pickup_location: Vendor location {lat, lng}
+        delivery_location: Customer location {lat, lng}
+        partners: Available delivery partners with locations
+
+    Returns:
+        Partners with distance, time estimates and cost, cheapest first.
+        Partners without a location are skipped.
+    """
+    located, lats, lngs = coordinate_arrays(partners)
+    if not located:
+        return []
+
+    distances = haversine_distances(
+        pickup_location['lat'], pickup_location['lng'], lats, lngs
+    )
+    trip_km = float(haversine_distances(
+        pickup_location['lat'], pickup_location['lng'],
+        [delivery_location['lat']], [delivery_location['lng']]
+    )[0])
+
+    speeds, active_orders, ratings = _partner_features(located)
+
+    pickup_mins = distances / speeds * 60
+    delivery_mins = pickup_mins + PICKUP_HANDLING_MINS + trip_km / speeds * 60
+    costs = pickup_mins + _partner_penalties(active_orders, ratings)
+
+    ranked = []
+    for i in np.argsort(costs, kind='stable'):
+        partner = located[i]
+        ranked.append({
+            'partner_id': partner.get('id'),
+            'partner_name': partner.get('name', 'Unknown'),
+            'distance_from_pickup': round(float(distances[i]), 2),
+            'estimated_pickup_time': int(round(pickup_mins[i])),
+            'estimated_delivery_time': int(round(delivery_mins[i])),
+            'active_orders': int(active_orders[i]),
+            'rating': float(ratings[i]),
+            'cost': round(float(costs[i]), 2),
+        })
+    return ranked
+
+
+def confidence_score(ranked: List[Dict[str, Any]]) -> float:
+    """
+    Confidence in the top choice, from how clearly it beats the runner-up
+
+    Args:
+        ranked: Output of score_partners
+
+    Returns:
+        Score between 0.5 (tie) and 0.99
+    """
+    if not ranked:
+        return 0.0
+    if len(ranked) == 1:
+        return 0.99
+
+    best = ranked[0]['cost']
+    runner_up = ranked[1]['cost']
+    if runner_up <= 0:
+        return 0.5
+    margin = (runner_up - best) / runner_up
+    return round(min(0.99, 0.5 + 0.5 * margin), 2)
+
+
+def describe_partner(scored: Dict[str, Any]) -> str:
+    """Short human-readable summary of a scored partner"""
+    return (
+        f"{scored['distance_from_pickup']} km from pickup, "
+        f"{scored['active_orders']} active orders, "
+        f"rating {scored['rating']}/5"
+    )
+
+
+def build_assignment(
+    ranked: List[Dict[str, Any]],
+    delivery_priority: Optional[str] = None,
+    max_alternatives: int = 2
+) -> Dict[str, Any]:
+    """
+    Build an assignment response from ranked partners
+
+    Args:
+        ranked: Output of score_partners
+        delivery_priority: Priority passed through from the order
+        max_alternatives: Number of backup partners to include
+
+    Returns:
+        Assignment in the delivery agent's response format
+    """
+    priority = delivery_priority or 'medium'
+
+    if not ranked:
+        return {
+            "selected_partner": None,
+            "reasoning": "No available delivery partners with a known location",
+            "alternative_partners": [],
+            "delivery_priority": priority
+        }
+
+    best = ranked[0]
+    return {
+        "selected_partner": {
+            "partner_id": best['partner_id'],
+            "partner_name": best['partner_name'],
+            "distance_from_pickup": best['distance_from_pickup'],
+            "estimated_pickup_time": best['estimated_pickup_time'],
+            "estimated_delivery_time": best['estimated_delivery_time'],
+            "confidence_score": confidence_score(ranked)
+        },
+        "reasoning": f"Lowest combined travel time and workload cost: {describe_partner(best)}",
+        "alternative_partners": [
+            {"partner_id": alt['partner_id'], "reason": describe_partner(alt)}
+            for alt in ranked[1:1 + max_alternatives]
+        ],
+        "delivery_priority": priority
+    }
+
+
+def solve_assignment(cost: np.ndarray) -> List[Tuple[int, int]]:
+    """
+    Solve the rectangular linear assignment problem (Hungarian algorithm)
+
+    Args:
+        cost: N x M cost matrix
+
+    Returns:
+        (row, col) pairs of a minimum-cost matching covering min(N, M) rows/cols
+    """
+    cost = np.asarray(cost, dtype=np.float64)
+    transposed = cost.shape[0] > cost.shape[1]
+    if transposed:
+        cost = cost.T
+    n, m = cost.shape
+    if n == 0:
+        return []
+
+    # Potentials formulation with 1-based rows/cols; column 0 is a sentinel
+    u = np.zeros(n + 1)
+    v = np.zeros(m + 1)
+    match = np.zeros(m + 1, dtype=int)   # row matched to each column
+    way = np.zeros(m + 1, dtype=int)
+
+    for row in range(1, n + 1):
+        match[0] = row
+        col = 0
+        min_slack = np.full(m + 1, np.inf)
+        used = np.zeros(m + 1, dtype=bool)
+
+        while True:
+            used[col] = True
+            current_row = match[col]
+            free = ~used[1:]
+
+            slack = cost[current_row - 1] - u[current_row] - v[1:]
+            improved = free & (slack < min_slack[1:])
+            min_slack[1:][improved] = slack[improved]
+            way[1:][improved] = col
+
+            candidates = np.where(free, min_slack[1:], np.inf)
+            next_col = int(np.argmin(candidates)) + 1
+            delta = candidates[next_col - 1]
+
+            u[match[used]] += delta
+            v[used] -= delta
+            min_slack[~used] -= delta
+
+            col = next_col
+            if match[col] == 0:
+                break
+
+        # Augment along the alternating path
+        while col:
+            previous = way[col]
+            match[col] = match[previous]
+            col = previous
+
+    pairs = [(int(match[c]) - 1, c - 1) for c in range(1, m + 1) if match[c]]
+    if transposed:
+        pairs = [(c, r) for r, c in pairs]
+    return sorted(pairs)
+
+
+def _slot_count(max_orders_per_partner: Any) -> int:
+    """Validate max_orders_per_partner and cap it at MAX_ORDERS_PER_PARTNER"""
+    value = max_orders_per_partner
+    if isinstance(value, bool) or (isinstance(value, float) and not value.is_integer()):
+        raise ValueError(f"max_orders_per_partner must be an integer, got {value!r}")
+    try:
+        slots = int(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"max_orders_per_partner must be an integer, got {value!r}") from None
+    if slots < 1:
+        raise ValueError(f"max_orders_per_partner must be at least 1, got {slots}")
+    return min(slots, MAX_ORDERS_PER_PARTNER)
+
+
+def assign_orders(
+    orders: List[Dict[str, Any]],
+    partners: List[Dict[str, Any]],
+    max_orders_per_partner: int = 1
+) -> Dict[str, Any]:
+    """
+    Jointly assign many orders to many partners at minimum total cost
+
+    Each partner offers max_orders_per_partner slots; later slots carry the
+    workload penalty of the orders ahead of them, so load is spread out
+    unless stacking is clearly cheaper.
+
+    Args:
+        orders: [{order_id, pickup_location, delivery_location, delivery_priority?}]
+        partners: Available delivery partners with locations
+        max_orders_per_partner: Orders a partner may take from this batch
+            (at least 1; values above MAX_ORDERS_PER_PARTNER are capped)
+
+    Returns:
+        Assignments, unassigned order IDs and the total cost in minutes
+
+    Raises:
+        ValueError: If max_orders_per_partner is not a positive integer
+    """
+    slots = _slot_count(max_orders_per_partner)
+    located, partner_lats, partner_lngs = coordinate_arrays(partners)
+
+    routable = []
+    unassigned = []
+    for order in orders:
+        pickup = order.get('pickup_location') or {}
+        delivery = order.get('delivery_location') or {}
+        if pickup.get('lat') and pickup.get('lng') and delivery.get('lat') and delivery.get('lng'):
+            routable.append(order)
+        else:
+            unassigned.append({"order_id": order.get('order_id'), "reason": "invalid location"})
+
+    if not routable or not located:
+        unassigned.extend(
+            {"order_id": order.get('order_id'), "reason": "no available partners"}
+            for order in routable
+        )
+        return {"assignments": [], "unassigned_orders": unassigned, "total_cost": 0.0}
+
+    pickup_lats = [o['pickup_location']['lat'] for o in routable]
+    pickup_lngs = [o['pickup_location']['lng'] for o in routable]
+    trip_km = np.array([
+        haversine_distances(
+            o['pickup_location']['lat'], o['pickup_location']['lng'],
+            [o['delivery_location']['lat']], [o['delivery_location']['lng']]
+        )[0]
+        for o in routable
+    ])
+
+    distances = haversine_matrix(pickup_lats, pickup_lngs, partner_lats, partner_lngs)
+    speeds, active_orders, ratings = _partner_features(located)
+    pickup_mins = distances / speeds[None, :] * 60
+    base_costs = pickup_mins + _partner_penalties(active_orders, ratings)[None, :]
+
+    # One column per (partner, slot); slot k waits behind k earlier batch orders
+    slot_partner = np.tile(np.arange(len(located)), slots)
+    slot_index = np.repeat(np.arange(slots), len(located))
+    cost = base_costs[:, slot_partner] + LOAD_PENALTY_MINS * slot_index[None, :]
+
+    assignments = []
+    assigned_rows = set()
+    total_cost = 0.0
+    for row, col in solve_assignment(cost):
+        partner_idx = slot_partner[col]
+        partner = located[partner_idx]
+        order = routable[row]
+        pickup_time = pickup_mins[row, partner_idx]
+        delivery_time = (
+            pickup_time + PICKUP_HANDLING_MINS
+            + trip_km[row] / speeds[partner_idx] * 60
+        )
+        assigned_rows.add(row)
+        total_cost += cost[row, col]
+        assignments.append({
+            "order_id": order.get('order_id'),
+            "selected_partner": {
+                "partner_id": partner.get('id'),
+                "partner_name": partner.get('name', 'Unknown'),
+                "distance_from_pickup": round(float(distances[row, partner_idx]), 2),
+                "estimated_pickup_time": int(round(pickup_time)),
+                "estimated_delivery_time": int(round(delivery_time)),
+                "queue_position": int(slot_index[col]) + 1
+            },
+            "delivery_priority": order.get('delivery_priority') or 'medium'
+        })
+
+    unassigned.extend(
+        {"order_id": order.get('order_id'), "reason": "no partner capacity left in batch"}
+        for row, order in enumerate(routable)
+        if row not in assigned_rows
+    )
+
+    return {
+        "assignments": assignments,
+        "unassigned_orders": unassigned,
+        "total_cost": round(float(total_cost), 2)
+    }
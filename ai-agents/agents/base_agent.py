@@ -5,42 +5,105 @@ Provides common functionality for all AI agents using Google Vertex AI
 
 import os
 import json
-from typing import Dict, Any, Optional
-from google.cloud import aiplatform
-from vertexai.generative_models import GenerativeModel, GenerationConfig
-import vertexai
+import time
+import random
+import asyncio
+from typing import Dict, Any, AsyncIterator, Iterable, Optional, Tuple
+from .model_registry import model_registry
+from .response_cache import ResponseCache
+from .llm_scheduler import LLMScheduler
+from .micro_batcher import MicroBatcher
+from .streaming_json import StreamingJSONParser
+from .call_policy import CallPolicy, DeadlineExceeded, deadline, is_retryable, remaining_time
+from .context_cache import ContextCache
 
 
 class BaseAgent:
     """Base class for all AI agents"""
     
+    # Shared by all agents; keys include the model name so agents never collide
+    response_cache = ResponseCache(
+        max_entries=int(os.getenv("LLM_CACHE_MAX_ENTRIES", "1024")),
+        ttl_seconds=float(os.getenv("LLM_CACHE_TTL_SECONDS", "3600"))
+    )
+    
+    # Caps concurrent Vertex AI calls; critical calls are served first
+    scheduler = LLMScheduler.from_env(os.environ)
+    
+    # Deadlines, retries and hedging for every model request
+    call_policy = CallPolicy.from_env(os.environ)
+    
+    # Static prompt prefixes kept as Vertex AI cached content
+    context_cache = ContextCache(
+        min_tokens=int(os.getenv("LLM_CONTEXT_CACHE_MIN_TOKENS", "4096")),
+        ttl_seconds=float(os.getenv("LLM_CONTEXT_CACHE_TTL_SECONDS", "3600"))
+    )
+    
+    # Combines small concurrent prompts into one request (off unless a
+    # window is configured)
+    micro_batcher = MicroBatcher(
+        window_ms=float(os.getenv("LLM_MICROBATCH_WINDOW_MS", "0")),
+        max_batch_size=int(os.getenv("LLM_MICROBATCH_MAX_SIZE", "8"))
+    )
+    
+    # Model calls currently awaited, by cache key, so concurrent identical
+    # prompts share a single Vertex AI request
+    _in_flight: Dict[Tuple, "asyncio.Future[str]"] = {}
+    coalesced_requests = 0
+    
     def __init__(self, agent_name: str):
         """
-        Initialize the base agent with Vertex AI
+        Initialize the base agent
+        
+        The Vertex AI client and model are shared between agents and only
+        created on the first AI call, keeping service start-up fast.
         
         Args:
             agent_name: Name of the agent for logging
         """
         self.agent_name = agent_name
-        self.project_id = os.getenv("GCP_PROJECT_ID", "the-local-loop")
-        self.location = os.getenv("GCP_LOCATION", "us-central1")
+        self.project_id = model_registry.project_id
+        self.location = model_registry.location
         self.model_name = os.getenv("MODEL_NAME", "gemini-2.0-flash-exp")
+        self._model: Any = None
+        self._model_resolved = False
+    
+    @property
+    def model(self) -> Optional[Any]:
+        """Shared GenerativeModel, or None in mock mode"""
+        if not self._model_resolved:
+            self._model = model_registry.get_model(self.model_name)
+            self._model_resolved = True
+        return self._model
+    
+    @model.setter
+    def model(self, model: Optional[Any]) -> None:
+        self._model = model
+        self._model_resolved = True
+    
+    async def _resolve_model(self) -> Optional[Any]:
+        """
+        Get the shared model without blocking the event loop
         
-        # Initialize Vertex AI
-        try:
-            vertexai.init(project=self.project_id, location=self.location)
-            self.model = GenerativeModel(self.model_name)
-            print(f"✅ {agent_name} initialized with Vertex AI")
-        except Exception as e:
-            print(f"⚠️  Warning: Could not initialize Vertex AI for {agent_name}: {e}")
-            print(f"   Agent will run in mock mode")
-            self.model = None
+        The first lookup imports the Vertex AI SDK (and may wait for the
+        start-up warm-up to release the registry), so it runs in a thread.
+        """
+        if not self._model_resolved:
+            loop = asyncio.get_running_loop()
+            self.model = await loop.run_in_executor(
+                None, model_registry.get_model, self.model_name
+            )
+        return self._model
     
     async def generate_response(
         self, 
         prompt: str, 
         temperature: float = 0.7,
-        max_tokens: int = 1024
+        max_tokens: int = 1024,
+        use_cache: bool = True,
+        priority: str = "normal",
+        batchable: bool = False,
+        static_prefix: Optional[str] = None
     ) -> str:
         """
         Generate AI response using Vertex AI
@@ -49,34 +112,383 @@ class BaseAgent:
             prompt: The prompt to send to the AI
             temperature: Creativity level (0-1)
             max_tokens: Maximum response length
+            use_cache: Serve identical earlier requests from the response
+                cache and share identical concurrent ones (disable for
+                creative, high-temperature calls)
+            priority: Scheduler lane - 'critical' for latency-sensitive
+                calls, 'background' for analytics that can wait
+            batchable: Allow sending this prompt together with concurrent
+                ones in a single request; only for short prompts whose
+                answer is a single JSON object
+            static_prefix: Start of the prompt that is the same on every
+                call (e.g. PromptTemplate.static_prefix); long prefixes are
+                sent once as cached content instead of with each request
             
         Returns:
             AI generated response as string
         """
-        if not self.model:
+        if not await self._resolve_model():
             return self._mock_response(prompt)
         
-        try:
-            generation_config = GenerationConfig(
-                temperature=temperature,
-                max_output_tokens=max_tokens,
+        batch = batchable and self.micro_batcher.enabled
+        if not use_cache:
+            if batch:
+                return await self._call_batched(prompt, temperature, max_tokens, priority)
+            return await self._call_model(
+                prompt, temperature, max_tokens, priority, static_prefix=static_prefix
+            )
+        
+        cache_key = (self.model_name, prompt, temperature, max_tokens)
+        cached = self.response_cache.get(cache_key)
+        if cached is not None:
+            return cached
+        
+        in_flight = self._in_flight.get(cache_key)
+        if in_flight is not None:
+            BaseAgent.coalesced_requests += 1
+        else:
+            if batch:
+                call = self._call_batched(prompt, temperature, max_tokens, priority, cache_key)
+            else:
+                call = self._call_model(
+                    prompt, temperature, max_tokens, priority, cache_key, static_prefix
+                )
+            in_flight = asyncio.ensure_future(call)
+            self._in_flight[cache_key] = in_flight
+            in_flight.add_done_callback(
+                lambda _: self._in_flight.pop(cache_key, None)
             )
+        
+        # Shield so one cancelled caller does not cancel the shared request
+        return await asyncio.shield(in_flight)
+    
+    async def _call_model(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        priority: str = "normal",
+        cache_key: Optional[Tuple] = None,
+        static_prefix: Optional[str] = None
+    ) -> str:
+        """
+        Send a prompt to Vertex AI
+        
+        Args:
+            prompt: The prompt to send to the AI
+            temperature: Creativity level (0-1)
+            max_tokens: Maximum response length
+            priority: Scheduler lane
+            cache_key: Key to store a successful response under
+            static_prefix: Unchanging start of the prompt
             
-            response = await self.model.generate_content_async(
-                prompt,
-                generation_config=generation_config
+        Returns:
+            AI generated response, or a mock response on error
+        """
+        try:
+            text = await self._send_prompt(
+                prompt, temperature, max_tokens, priority, static_prefix
             )
+            if cache_key is not None:
+                self.response_cache.set(cache_key, text)
+            return text
+        except DeadlineExceeded as e:
+            print(f"⚠️  {self.agent_name}: {e}")
+            return self._mock_response(prompt, reason="deadline_exceeded")
+        except Exception as e:
+            print(f"Error generating response: {e}")
+            return self._mock_response(prompt, reason="model_error")
+    
+    async def _call_batched(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        priority: str = "normal",
+        cache_key: Optional[Tuple] = None
+    ) -> str:
+        """
+        Send a prompt through the micro-batcher
+        
+        Prompts from this agent with the same model settings that arrive
+        within the batching window go to Vertex AI as one request.
+        
+        Args:
+            prompt: The prompt to send to the AI
+            temperature: Creativity level (0-1)
+            max_tokens: Maximum response length for this prompt
+            priority: Scheduler lane
+            cache_key: Key to store a successful response under
             
-            return response.text
+        Returns:
+            AI generated response, or a mock response on error
+        """
+        # Fix the budget now, so a failed batch is retried individually
+        # within it instead of with a fresh one
+        budget = self.call_policy.default_timeout if remaining_time() is None else None
+        try:
+            with deadline(budget):
+                text = await self.micro_batcher.submit(
+                    (self.agent_name, self.model_name, temperature, max_tokens, priority),
+                    prompt,
+                    max_tokens,
+                    lambda batch_prompt, batch_tokens: self._send_prompt(
+                        batch_prompt, temperature, batch_tokens, priority
+                    )
+                )
+            if cache_key is not None:
+                self.response_cache.set(cache_key, text)
+            return text
+        except DeadlineExceeded as e:
+            print(f"⚠️  {self.agent_name}: {e}")
+            return self._mock_response(prompt, reason="deadline_exceeded")
         except Exception as e:
             print(f"Error generating response: {e}")
-            return self._mock_response(prompt)
+            return self._mock_response(prompt, reason="model_error")
+    
+    async def _send_prompt(
+        self,
+        prompt: str,
+        temperature: float,
+        max_tokens: int,
+        priority: str,
+        static_prefix: Optional[str] = None
+    ) -> str:
+        """
+        Send a prompt to Vertex AI within the request deadline
+        
+        Each attempt waits for a scheduler slot. Transient errors are retried
+        with jittered backoff, and slow attempts may be hedged, as long as
+        the deadline allows. If the static prefix is cached, only the rest
+        of the prompt is sent.
+        
+        Raises:
+            DeadlineExceeded: If no attempt succeeds before the deadline
+        """
+        generation_config = model_registry.generation_config(
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+        )
+        
+        model, request = self.model, prompt
+        if static_prefix and prompt.startswith(static_prefix):
+            cached_model = await self.context_cache.get_model(self.model_name, static_prefix)
+            if cached_model is not None:
+                model, request = cached_model, prompt[len(static_prefix):]
+        
+        async def attempt() -> str:
+            async with self.scheduler.slot(self.agent_name, priority):
+                response = await model.generate_content_async(
+                    request,
+                    generation_config=generation_config
+                )
+            return response.text
+        
+        return await self.call_policy.run(
+            self.agent_name,
+            attempt,
+            can_hedge=lambda: not self.scheduler.saturated
+        )
     
-    def _mock_response(self, prompt: str) -> str:
-        """Fallback mock response when AI is not available"""
+    async def stream_response(
+        self,
+        prompt: str,
+        temperature: float = 0.7,
+        max_tokens: int = 1024,
+        priority: str = "normal"
+    ) -> AsyncIterator[str]:
+        """
+        Generate AI response using Vertex AI, yielding text as it is produced
+        
+        Streamed responses bypass the response cache and request coalescing.
+        The request deadline (or the policy's default timeout) bounds the
+        wait for the first chunk, which is retried like other model calls,
+        and then each gap between chunks.
+        
+        Args:
+            prompt: The prompt to send to the AI
+            temperature: Creativity level (0-1)
+            max_tokens: Maximum response length
+            priority: Scheduler lane
+            
+        Yields:
+            Chunks of the response text; joined they form the full response
+            
+        Raises:
+            DeadlineExceeded: If the stream stalls after text was yielded
+        """
+        if not await self._resolve_model():
+            yield self._mock_response(prompt)
+            return
+        
+        generation_config = model_registry.generation_config(
+            temperature=temperature,
+            max_output_tokens=max_tokens,
+        )
+        
+        budget = remaining_time()
+        if budget is None:
+            budget = self.call_policy.default_timeout
+        expires_at = time.monotonic() + budget
+        
+        policy = self.call_policy
+        responses = None
+        for retry in range(policy.max_retries + 1):
+            try:
+                responses, text = await self._open_stream(
+                    prompt, generation_config, priority, expires_at
+                )
+                break
+            except asyncio.TimeoutError:
+                break
+            except Exception as e:
+                delay = random.uniform(0, policy.backoff_base * 2 ** retry)
+                if (not is_retryable(e) or retry == policy.max_retries
+                        or time.monotonic() + delay >= expires_at):
+                    print(f"Error streaming response: {e}")
+                    yield self._mock_response(prompt, reason="model_error")
+                    return
+                policy.counters["retries"] += 1
+                print(f"⚠️  Retrying streamed model call in {delay:.2f}s after: {e}")
+                await asyncio.sleep(delay)
+        
+        if responses is None:
+            policy.counters["deadline_exceeded"] += 1
+            print(f"⚠️  {self.agent_name}: streamed response did not start within its {budget:.1f}s budget")
+            yield self._mock_response(prompt, reason="deadline_exceeded")
+            return
+        
+        # _open_stream returned holding the scheduler slot
+        try:
+            while text is not None:
+                yield text
+                try:
+                    text = await asyncio.wait_for(self._next_text(responses), budget)
+                except asyncio.TimeoutError:
+                    policy.counters["deadline_exceeded"] += 1
+                    raise DeadlineExceeded(f"Streamed response stalled for {budget:.1f}s")
+        except DeadlineExceeded:
+            raise
+        except Exception as e:
+            # Part of the answer is already out; let the caller report it
+            print(f"Error streaming response: {e}")
+            raise
+        finally:
+            self.scheduler.release(self.agent_name)
+    
+    async def _open_stream(
+        self,
+        prompt: str,
+        generation_config: Any,
+        priority: str,
+        expires_at: float
+    ) -> Tuple[Any, Optional[str]]:
+        """
+        Take a scheduler slot, start a streamed request and wait for its
+        first text, all before expires_at (a time.monotonic() value)
+        
+        Returns:
+            (response stream, first text or None if the stream was empty),
+            with the slot still held; the caller releases it
+            
+        Raises:
+            asyncio.TimeoutError: If expires_at passes first
+        """
+        await asyncio.wait_for(
+            self.scheduler.acquire(self.agent_name, priority),
+            expires_at - time.monotonic()
+        )
+        try:
+            responses = await asyncio.wait_for(
+                self.model.generate_content_async(
+                    prompt,
+                    generation_config=generation_config,
+                    stream=True
+                ),
+                expires_at - time.monotonic()
+            )
+            text = await asyncio.wait_for(
+                self._next_text(responses), expires_at - time.monotonic()
+            )
+            return responses, text
+        except BaseException:
+            self.scheduler.release(self.agent_name)
+            raise
+    
+    @staticmethod
+    async def _next_text(responses: Any) -> Optional[str]:
+        """Next non-empty chunk text of a response stream, None at its end"""
+        async for chunk in responses:
+            if chunk.text:
+                return chunk.text
+        return None
+    
+    async def stream_json_events(
+        self,
+        chunks: AsyncIterator[str],
+        required_fields: Optional[Iterable[str]] = None
+    ) -> AsyncIterator[Dict[str, Any]]:
+        """
+        Parse a streamed JSON response as it arrives
+        
+        Args:
+            chunks: Output of stream_response
+            required_fields: Stop generation as soon as these top-level
+                fields are complete
+            
+        Yields:
+            'token' events with raw text, 'item' and 'field' events from
+            StreamingJSONParser, then one 'result' event with the parsed
+            response (the fallback response if the stream stalled)
+        """
+        parser = StreamingJSONParser(required_fields)
+        text = []
+        stalled = False
+        try:
+            async for chunk in chunks:
+                text.append(chunk)
+                yield {"type": "token", "text": chunk}
+                for event in parser.feed(chunk):
+                    yield event
+                if parser.satisfied:
+                    break
+        except DeadlineExceeded as e:
+            print(f"⚠️  {self.agent_name}: {e}")
+            stalled = True
+        finally:
+            # Closing the stream early stops generation and frees the slot
+            await chunks.aclose()
+        
+        if stalled:
+            # The partial response is unusable; answer as a timed-out call would
+            result = self.parse_json_response(self._mock_response("", reason="deadline_exceeded"))
+        elif parser.done or parser.satisfied:
+            result = parser.result()
+        else:
+            result = self.parse_json_response("".join(text))
+        yield {"type": "result", "data": result}
+    
+    def _mock_response(self, prompt: str, reason: Optional[str] = None) -> str:
+        """
+        Fallback mock response when AI is not available
+        
+        Args:
+            prompt: The prompt that could not be answered
+            reason: Why the model was not used, when it is configured but
+                failed ('deadline_exceeded' or 'model_error')
+        """
+        if reason is None:
+            return json.dumps({
+                "status": "mock",
+                "message": "AI service not configured. Using mock response.",
+                "agent": self.agent_name
+            })
         return json.dumps({
-            "status": "mock",
-            "message": "AI service not configured. Using mock response.",
+            "status": "fallback",
+            "message": "AI service did not respond in time. Using fallback response."
+            if reason == "deadline_exceeded"
+            else "AI service returned an error. Using fallback response.",
+            "reason": reason,
             "agent": self.agent_name
         })
     
@@ -0,0 +1,90 @@
+"""
+Bulk Processing
+Bounded-concurrency processing of large record lists, with results yielded
+as they complete
+"""
+
+import asyncio
+import csv
+import io
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Hashable, List, Optional
+
+
+def read_csv_records(text: str) -> List[Dict[str, str]]:
+    """
+    Parse CSV text with a header row into records
+
+    Args:
+        text: CSV content, e.g. 'id,address,pincode,city'
+
+    Returns:
+        One dict per row, keyed by lower-cased header names
+    """
+    reader = csv.DictReader(io.StringIO(text.lstrip("\ufeff")))
+    if reader.fieldnames is None:
+        return []
+    reader.fieldnames = [name.strip().lower() for name in reader.fieldnames]
+    return [
+        {key: (value or "").strip() for key, value in row.items() if key}
+        for row in reader
+    ]
+
+
+async def process_concurrently(
+    records: List[Dict[str, Any]],
+    handler: Callable[[Dict[str, Any]], Awaitable[Any]],
+    concurrency: int = 16,
+    key: Optional[Callable[[Dict[str, Any]], Hashable]] = None
+) -> AsyncIterator[Dict[str, Any]]:
+    """
+    Run a handler over records with at most `concurrency` running at once
+
+    Args:
+        records: Records to process
+        handler: Coroutine function processing one record
+        concurrency: Records processed in parallel
+        key: Optional function giving a record's identity; duplicates are
+            processed once and share the result
+
+    Yields:
+        {"index", "id", "success", "data" | "error"} per record, in
+        completion order
+    """
+    results: asyncio.Queue = asyncio.Queue()
+    shared: Dict[Hashable, "asyncio.Future[Any]"] = {}
+    positions = iter(range(len(records)))
+
+    async def run(index: int) -> Any:
+        record = records[index]
+        if key is None:
+            return await handler(record)
+        record_key = key(record)
+        future = shared.get(record_key)
+        if future is None:
+            future = asyncio.ensure_future(handler(record))
+            shared[record_key] = future
+        return await asyncio.shield(future)
+
+    async def worker() -> None:
+        for index in positions:
+            record = records[index]
+            # Must not raise: every record has to produce exactly one outcome
+            outcome = {"index": index, "id": record.get("id") if isinstance(record, dict) else None}
+            try:
+                outcome["data"] = await run(index)
+                outcome["success"] = True
+            except Exception as e:
+                outcome["success"] = False
+                outcome["error"] = str(e)
+            await results.put(outcome)
+
+    workers = [
+        asyncio.ensure_future(worker())
+        for _ in range(max(1, min(concurrency, len(records))))
+    ]
+    try:
+        for _ in range(len(records)):
+            yield await results.get()
+    finally:
+        for task in workers:
+            task.cancel()
@@ -0,0 +1,264 @@
+"""
+Call Policy
+Deadlines, retries with jittered backoff and hedged requests for model calls
+"""
+
+import asyncio
+import contextvars
+import math
+import random
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Awaitable, Callable, Deque, Dict, Iterator, Optional
+
+
+# Absolute (monotonic) deadline of the request being served, if any
+_deadline: contextvars.ContextVar[Optional[float]] = contextvars.ContextVar(
+    "llm_deadline", default=None
+)
+
+# Error class names (google.api_core and others) worth retrying
+RETRYABLE_ERRORS = {
+    'ServiceUnavailable', 'ResourceExhausted', 'TooManyRequests',
+    'InternalServerError', 'DeadlineExceeded', 'GatewayTimeout', 'Aborted',
+}
+
+# Call durations kept per agent for latency percentiles
+LATENCY_SAMPLE_SIZE = 200
+
+
+class DeadlineExceeded(Exception):
+    """Raised when a model call cannot finish before the request deadline"""
+
+
+@contextmanager
+def deadline(seconds: Optional[float]) -> Iterator[None]:
+    """
+    Set the deadline for model calls made in this context
+
+    An enclosing, earlier deadline is kept.
+
+    Args:
+        seconds: Time budget from now (None for no deadline)
+    """
+    if seconds is None:
+        yield
+        return
+
+    expires_at = time.monotonic() + seconds
+    current = _deadline.get()
+    token = _deadline.set(expires_at if current is None else min(current, expires_at))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def remaining_time() -> Optional[float]:
+    """Seconds left before the current deadline, or None if there is none"""
+    expires_at = _deadline.get()
+    if expires_at is None:
+        return None
+    return expires_at - time.monotonic()
+
+
+def is_retryable(error: BaseException) -> bool:
+    """Whether a failed call is worth retrying"""
+    if isinstance(error, (ConnectionError, asyncio.TimeoutError)):
+        return True
+    return type(error).__name__ in RETRYABLE_ERRORS
+
+
+class LatencyTracker:
+    """Rolling per-key call durations for percentile estimates"""
+
+    def __init__(self, sample_size: int = LATENCY_SAMPLE_SIZE):
+        self.sample_size = sample_size
+        self._samples: Dict[str, Deque[float]] = {}
+
+    def record(self, key: str, seconds: float) -> None:
+        if key not in self._samples:
+            self._samples[key] = deque(maxlen=self.sample_size)
+        self._samples[key].append(seconds)
+
+    def count(self, key: str) -> int:
+        return len(self._samples.get(key, ()))
+
+    def percentile(self, key: str, q: float) -> Optional[float]:
+        """
+        Get a latency percentile
+
+        Args:
+            key: Tracked key (agent name)
+            q: Percentile between 0 and 1
+
+        Returns:
+            Duration in seconds, or None with no samples
+        """
+        samples = sorted(self._samples.get(key, ()))
+        if not samples:
+            return None
+        return samples[max(0, math.ceil(q * len(samples)) - 1)]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get p50/p95 per key in milliseconds"""
+        return {
+            key: {
+                "samples": len(samples),
+                "p50_ms": round(1000 * self.percentile(key, 0.5), 1),
+                "p95_ms": round(1000 * self.percentile(key, 0.95), 1)
+            }
+            for key, samples in self._samples.items() if samples
+        }
+
+
+class CallPolicy:
+    """Runs model calls within the request deadline, retrying and hedging"""
+
+    def __init__(
+        self,
+        default_timeout: float = 30.0,
+        max_retries: int = 2,
+        backoff_base: float = 0.25,
+        hedging: bool = False,
+        hedge_min_samples: int = 20
+    ):
+        """
+        Initialize the policy
+
+        Args:
+            default_timeout: Budget in seconds when no request deadline is set
+            max_retries: Retries after the first attempt for retryable errors
+            backoff_base: Backoff cap in seconds for the first retry (doubles
+                on each retry, full jitter)
+            hedging: Send a duplicate request when the first one is slower
+                than the agent's p95 latency
+            hedge_min_samples: Calls observed before hedging starts
+        """
+        self.default_timeout = default_timeout
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.hedging = hedging
+        self.hedge_min_samples = hedge_min_samples
+        self.latency = LatencyTracker()
+        self.counters = {
+            "retries": 0,
+            "hedges": 0,
+            "hedge_wins": 0,
+            "deadline_exceeded": 0
+        }
+
+    @classmethod
+    def from_env(cls, env: Dict[str, str]) -> "CallPolicy":
+        """Build a policy from LLM_TIMEOUT_SECONDS, LLM_MAX_RETRIES,
+        LLM_BACKOFF_BASE_SECONDS and LLM_HEDGING"""
+        return cls(
+            default_timeout=float(env.get("LLM_TIMEOUT_SECONDS", "30")),
+            max_retries=int(env.get("LLM_MAX_RETRIES", "2")),
+            backoff_base=float(env.get("LLM_BACKOFF_BASE_SECONDS", "0.25")),
+            hedging=env.get("LLM_HEDGING", "false").lower() in ("1", "true", "yes")
+        )
+
+    def hedge_delay(self, key: str) -> Optional[float]:
+        """Seconds to wait before hedging, or None if hedging is off"""
+        if not self.hedging or self.latency.count(key) < self.hedge_min_samples:
+            return None
+        return self.latency.percentile(key, 0.95)
+
+    async def run(
+        self,
+        key: str,
+        attempt: Callable[[], Awaitable[Any]],
+        can_hedge: Callable[[], bool] = lambda: True
+    ) -> Any:
+        """
+        Run a model call under the current deadline
+
+        Args:
+            key: Latency key, normally the agent name
+            attempt: Coroutine function making one request
+            can_hedge: Checked before sending a duplicate request, so that
+                hedging does not add load when capacity is short
+
+        Returns:
+            Result of the first successful attempt
+
+        Raises:
+            DeadlineExceeded: If the deadline passes before a success
+            Exception: The last error if retries run out or it is not retryable
+        """
+        budget = remaining_time()
+        if budget is None:
+            budget = self.default_timeout
+        expires_at = time.monotonic() + budget
+
+        for retry in range(self.max_retries + 1):
+            left = expires_at - time.monotonic()
+            if left <= 0:
+                break
+            try:
+                return await asyncio.wait_for(self._hedged(key, attempt, can_hedge), left)
+            except asyncio.TimeoutError:
+                break
+            except Exception as e:
+                if not is_retryable(e) or retry == self.max_retries:
+                    raise
+                delay = random.uniform(0, self.backoff_base * 2 ** retry)
+                if time.monotonic() + delay >= expires_at:
+                    raise
+                self.counters["retries"] += 1
+                print(f"⚠️  Retrying model call in {delay:.2f}s after: {e}")
+                await asyncio.sleep(delay)
+
+        self.counters["deadline_exceeded"] += 1
+        raise DeadlineExceeded(f"Model call did not finish within its {budget:.1f}s budget")
+
+    async def _timed(self, key: str, attempt: Callable[[], Awaitable[Any]]) -> Any:
+        started = time.monotonic()
+        result = await attempt()
+        self.latency.record(key, time.monotonic() - started)
+        return result
+
+    async def _hedged(
+        self,
+        key: str,
+        attempt: Callable[[], Awaitable[Any]],
+        can_hedge: Callable[[], bool]
+    ) -> Any:
+        """Make one request, duplicating it if it runs past the p95 latency"""
+        delay = self.hedge_delay(key)
+        if delay is None:
+            return await self._timed(key, attempt)
+
+        primary = asyncio.ensure_future(self._timed(key, attempt))
+        tasks = {primary}
+        try:
+            done, _ = await asyncio.wait(tasks, timeout=delay)
+            if not done and can_hedge():
+                self.counters["hedges"] += 1
+                tasks.add(asyncio.ensure_future(self._timed(key, attempt)))
+
+            error: Optional[BaseException] = None
+            while tasks:
+                done, tasks = await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.counters["hedge_wins"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+
+    def stats(self) -> Dict[str, Any]:
+        """Get settings, counters and per-agent latency"""
+        return {
+            "default_timeout_seconds": self.default_timeout,
+            "max_retries": self.max_retries,
+            "hedging": self.hedging,
+            **self.counters,
+            "latency": self.latency.stats()
+        }
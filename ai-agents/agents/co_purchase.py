@@ -0,0 +1,280 @@
+"""
+Co-purchase Matrix
+Sparse item-item counts of products bought in the same order, kept per area
+and updated one order at a time, for "goes well with your cart" lookups
+"""
+
+import json
+import os
+import threading
+from collections import Counter
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple
+
+
+# Products of one order counted for pairs; bigger orders add little signal
+MAX_BASKET_ITEMS = 50
+
+# Orders a pair needs before it counts as a complement, not a coincidence
+MIN_PAIR_ORDERS = 2
+
+# Orders a product needs in an area before that area's counts are used
+# instead of the city-wide ones
+MIN_AREA_ITEM_ORDERS = 5
+
+# Complements kept per product, best first
+TOP_COMPLEMENTS = 20
+
+# Counts for all areas together
+ALL_AREAS = "*"
+
+
+class _AreaCounts:
+    """Co-purchase counts of one area"""
+
+    def __init__(self):
+        self.orders = 0
+        self.item_orders: Counter = Counter()
+        self.pairs: Dict[str, Counter] = {}
+        # Cached complement lists, dropped when a product's row changes
+        # (lift elsewhere drifts slightly until then)
+        self.top: Dict[str, List[Tuple[str, float, float, int]]] = {}
+
+    def add(self, items: List[str]) -> None:
+        self.orders += 1
+        self.item_orders.update(items)
+        for item in items:
+            row = self.pairs.setdefault(item, Counter())
+            for other in items:
+                if other != item:
+                    row[other] += 1
+            self.top.pop(item, None)
+
+    def complements(self, item: str) -> List[Tuple[str, float, float, int]]:
+        """(product, confidence, lift, orders together) for one product"""
+        cached = self.top.get(item)
+        if cached is not None:
+            return cached
+
+        item_orders = self.item_orders[item]
+        ranked = []
+        for other, together in self.pairs.get(item, {}).items():
+            if together < MIN_PAIR_ORDERS:
+                continue
+            confidence = together / item_orders
+            lift = confidence * self.orders / self.item_orders[other]
+            if lift > 1.0:
+                ranked.append((other, confidence, lift, together))
+        ranked.sort(key=lambda entry: (-entry[1], -entry[2], entry[0]))
+        self.top[item] = ranked = ranked[:TOP_COMPLEMENTS]
+        return ranked
+
+
+class CoPurchaseMatrix:
+    """
+    Per-area sparse co-purchase counts with cached complement lists
+
+    Orders are added incrementally (add_order/add_orders); an order id seen
+    before is skipped, so replaying history is safe. Reads and writes may
+    come from different threads.
+    """
+
+    def __init__(self):
+        self._areas: Dict[str, _AreaCounts] = {}
+        self._seen_orders: Set[str] = set()
+        self.products: Dict[str, Dict[str, Any]] = {}
+        self._names: Dict[str, str] = {}
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        area = self._areas.get(ALL_AREAS)
+        return area.orders if area else 0
+
+    def _product_id(self, item: Any) -> Optional[str]:
+        """Resolve a cart entry (id, name, or dict with either) to a product id"""
+        if isinstance(item, dict):
+            value = item.get("product_id") or item.get("productId") or item.get("id")
+            if value is not None:
+                return str(value)
+            item = item.get("product_name") or item.get("name")
+        if item is None:
+            return None
+        text = str(item)
+        if text in self.products:
+            return text
+        return self._names.get(text.strip().lower())
+
+    def add_order(self, order: Dict[str, Any]) -> bool:
+        """
+        Count one order
+
+        Args:
+            order: {"order_id"?, "area_id"?, "items": [{"product_id",
+                "product_name"?, "category"?}]}
+
+        Returns:
+            False if the order was already counted or has no products
+        """
+        items: List[str] = []
+        for item in order.get("items", []):
+            if not isinstance(item, dict):
+                continue
+            value = item.get("product_id") or item.get("productId") or item.get("id")
+            if value is None:
+                continue
+            product_id = str(value)
+            if product_id not in items:
+                items.append(product_id)
+        if not items:
+            return False
+
+        with self._lock:
+            order_id = order.get("order_id", order.get("id"))
+            if order_id is not None:
+                if str(order_id) in self._seen_orders:
+                    return False
+                self._seen_orders.add(str(order_id))
+
+            for item in order.get("items", []):
+                if isinstance(item, dict):
+                    self._remember(item)
+
+            basket = items[:MAX_BASKET_ITEMS]
+            self._areas.setdefault(ALL_AREAS, _AreaCounts()).add(basket)
+            if order.get("area_id"):
+                self._areas.setdefault(str(order["area_id"]), _AreaCounts()).add(basket)
+        return True
+
+    def _remember(self, item: Dict[str, Any]) -> None:
+        value = item.get("product_id") or item.get("productId") or item.get("id")
+        if value is None:
+            return
+        product_id = str(value)
+        known = self.products.setdefault(
+            product_id, {"product_id": product_id, "name": "", "category": "Other"}
+        )
+        name = item.get("product_name") or item.get("name")
+        if name:
+            known["name"] = name
+            self._names[str(name).strip().lower()] = product_id
+        if item.get("category"):
+            known["category"] = item["category"]
+
+    def add_orders(self, orders: Iterable[Dict[str, Any]]) -> int:
+        """
+        Count many orders (CPU-bound for large histories; run it in an
+        executor from async code)
+
+        Returns:
+            Orders newly counted
+        """
+        return sum(1 for order in orders if self.add_order(order))
+
+    def complements(
+        self,
+        cart_items: Iterable[Any],
+        area_id: Optional[str] = None,
+        k: int = 5
+    ) -> List[Dict[str, Any]]:
+        """
+        Products most often bought together with a cart
+
+        Args:
+            cart_items: Product ids, names, or dicts with either
+            area_id: Prefer this area's buying patterns when it has enough
+                orders of a product
+            k: Products to return
+
+        Returns:
+            Products not in the cart with 'score' (chance at least one cart
+            product leads to it), 'confidence' and 'lift' of the strongest
+            cart product, and that product as 'because_of'
+        """
+        cart = []
+        for item in cart_items:
+            product_id = self._product_id(item)
+            if product_id is not None and product_id not in cart:
+                cart.append(product_id)
+
+        with self._lock:
+            everywhere = self._areas.get(ALL_AREAS)
+            if everywhere is None or not cart:
+                return []
+            local = self._areas.get(str(area_id)) if area_id else None
+
+            # Per candidate: chance no cart product leads to it, best match
+            misses: Dict[str, float] = {}
+            best: Dict[str, Tuple[float, float, int, str]] = {}
+            for item in cart:
+                matches = []
+                if local is not None and local.item_orders[item] >= MIN_AREA_ITEM_ORDERS:
+                    matches = local.complements(item)
+                for other, confidence, lift, together in matches or everywhere.complements(item):
+                    if other in cart:
+                        continue
+                    misses[other] = misses.get(other, 1.0) * (1.0 - confidence)
+                    if other not in best or confidence > best[other][0]:
+                        best[other] = (confidence, lift, together, item)
+
+            ranked = sorted(misses, key=lambda other: (misses[other], other))[:k]
+            results = []
+            for other in ranked:
+                confidence, lift, together, because_of = best[other]
+                product = dict(self.products[other])
+                product.update({
+                    "score": round(1.0 - misses[other], 4),
+                    "confidence": round(confidence, 4),
+                    "lift": round(lift, 2),
+                    "orders_together": together,
+                    "because_of": self.products[because_of]["name"] or because_of,
+                })
+                results.append(product)
+            return results
+
+    def stats(self) -> Dict[str, Any]:
+        """Get matrix size"""
+        with self._lock:
+            everywhere = self._areas.get(ALL_AREAS)
+            return {
+                "orders": everywhere.orders if everywhere else 0,
+                "products": len(self.products),
+                "areas": len(self._areas) - (1 if everywhere else 0),
+                "pairs": sum(len(row) for row in everywhere.pairs.values()) // 2 if everywhere else 0
+            }
+
+    def save(self, path: str) -> None:
+        """Write the counts to a JSON file (atomically replaced)"""
+        with self._lock:
+            data = {
+                "products": self.products,
+                "seen_orders": sorted(self._seen_orders),
+                "areas": {
+                    area_id: {
+                        "orders": counts.orders,
+                        "item_orders": counts.item_orders,
+                        "pairs": counts.pairs,
+                    }
+                    for area_id, counts in self._areas.items()
+                },
+            }
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        temp_path = f"{path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    @classmethod
+    def load(cls, path: str) -> "CoPurchaseMatrix":
+        """Read counts written by save()"""
+        with open(path, encoding="utf-8") as f:
+            data = json.load(f)
+
+        matrix = cls()
+        for product in data.get("products", {}).values():
+            matrix._remember(product)
+        matrix._seen_orders = set(data.get("seen_orders", []))
+        for area_id, saved in data.get("areas", {}).items():
+            counts = matrix._areas[area_id] = _AreaCounts()
+            counts.orders = saved["orders"]
+            counts.item_orders = Counter(saved["item_orders"])
+            counts.pairs = {item: Counter(row) for item, row in saved["pairs"].items()}
+        return matrix
@@ -0,0 +1,175 @@
+"""
+Context Cache
+Caches static prompt prefixes as Vertex AI cached content, so each request
+only sends (and is billed for) its dynamic suffix
+"""
+
+import asyncio
+import hashlib
+import time
+from datetime import timedelta
+from typing import Any, Dict, Optional, Tuple
+
+from .prompt_templates import estimate_tokens
+
+
+class VertexCachedContentBackend:
+    """Creates cached content with the Vertex AI SDK"""
+
+    def create(self, model_name: str, prefix: str, ttl_seconds: float) -> Any:
+        """
+        Cache a prefix and get a model that prepends it to every request
+
+        Args:
+            model_name: Vertex AI model name
+            prefix: Static prompt text to cache
+            ttl_seconds: Lifetime of the cached content
+
+        Returns:
+            GenerativeModel bound to the cached content
+        """
+        # Imported here, like the rest of the SDK, to keep start-up fast
+        from vertexai.generative_models import GenerativeModel, Part
+        from vertexai.preview.caching import CachedContent
+
+        cached_content = CachedContent.create(
+            model_name=model_name,
+            contents=[Part.from_text(prefix)],
+            ttl=timedelta(seconds=ttl_seconds),
+        )
+        return GenerativeModel.from_cached_content(cached_content=cached_content)
+
+
+class _PrefixedModel:
+    """Model wrapper that prepends a prefix to each prompt"""
+
+    def __init__(self, model: Any, prefix: str):
+        self.model = model
+        self.prefix = prefix
+
+    async def generate_content_async(self, prompt: str, **kwargs: Any) -> Any:
+        return await self.model.generate_content_async(self.prefix + prompt, **kwargs)
+
+
+class LocalContextCacheBackend:
+    """
+    Stand-in for cached content that keeps the prefix in process
+
+    Requests behave exactly as with Vertex AI cached content (the prefix is
+    prepended to each prompt), so it can stand in for tests and local runs.
+    """
+
+    def __init__(self, model: Any):
+        """
+        Args:
+            model: Model that receives prefix + suffix prompts
+        """
+        self.model = model
+        self.created = 0
+
+    def create(self, model_name: str, prefix: str, ttl_seconds: float) -> Any:
+        self.created += 1
+        return _PrefixedModel(self.model, prefix)
+
+
+class ContextCache:
+    """
+    Keeps one cached-content model per (model name, static prefix)
+
+    The static prefixes of the current prompt templates are a few hundred
+    tokens, below the 4096-token default minimum, so they are sent in full
+    and only counted as skipped; caching applies once a prompt's fixed
+    part (e.g. a catalogue or policy section) reaches min_tokens.
+    """
+
+    def __init__(
+        self,
+        min_tokens: int = 4096,
+        ttl_seconds: float = 3600.0,
+        backend: Optional[Any] = None
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            min_tokens: Shortest prefix worth caching (Vertex AI rejects
+                cached content below the model's minimum); 0 disables caching
+            ttl_seconds: Lifetime of each cached prefix
+            backend: Creates cached-content models (Vertex AI by default)
+        """
+        self.min_tokens = min_tokens
+        self.ttl_seconds = ttl_seconds
+        self.backend = backend or VertexCachedContentBackend()
+        self._models: Dict[Tuple[str, str], Tuple[float, Any]] = {}
+        self._locks: Dict[Tuple[str, str], asyncio.Lock] = {}
+        self.hits = 0
+        self.created = 0
+        self.failures = 0
+        self.skipped = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.min_tokens > 0
+
+    def should_cache(self, prefix: str) -> bool:
+        """Whether a prefix is long enough to cache"""
+        return self.enabled and estimate_tokens(prefix) >= self.min_tokens
+
+    async def get_model(self, model_name: str, prefix: str) -> Optional[Any]:
+        """
+        Get a model with the prefix cached, creating the cache if needed
+
+        Args:
+            model_name: Vertex AI model name
+            prefix: Static prompt text
+
+        Returns:
+            Model whose requests need only the dynamic suffix, or None if the
+            prefix is too short or caching failed (send the full prompt)
+        """
+        if not self.should_cache(prefix):
+            if self.enabled:
+                self.skipped += 1
+            return None
+
+        key = (model_name, hashlib.sha256(prefix.encode("utf-8")).hexdigest())
+        entry = self._models.get(key)
+        if entry is not None and entry[0] > time.monotonic():
+            self.hits += 1
+            return entry[1]
+
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            entry = self._models.get(key)
+            if entry is not None and entry[0] > time.monotonic():
+                self.hits += 1
+                return entry[1]
+
+            # Refresh a little before the server-side copy expires
+            expires_at = time.monotonic() + self.ttl_seconds * 0.9
+            try:
+                loop = asyncio.get_running_loop()
+                model = await loop.run_in_executor(
+                    None, self.backend.create, model_name, prefix, self.ttl_seconds
+                )
+                self.created += 1
+            except Exception as e:
+                # Do not retry on every call; send full prompts until expiry
+                print(f"⚠️  Could not cache prompt prefix: {e}")
+                model = None
+                self.failures += 1
+
+            self._models[key] = (expires_at, model)
+            return model
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cached prefix counts"""
+        return {
+            "min_tokens": self.min_tokens,
+            "ttl_seconds": self.ttl_seconds,
+            "cached_prefixes": sum(1 for _, model in self._models.values() if model),
+            "hits": self.hits,
+            "created": self.created,
+            "failures": self.failures,
+            "skipped_short_prefixes": self.skipped
+        }
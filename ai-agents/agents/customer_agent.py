@@ -3,46 +3,21 @@ Customer Agent
 AI agent for personalized customer recommendations and assistance
 """
 
-from typing import Dict, Any, List
+import os
+import json
+from datetime import datetime
+from typing import Dict, Any, AsyncIterator, List, Optional
 from .base_agent import BaseAgent
+from .prompt_templates import PromptTemplate
+from .semantic_cache import SemanticCache
+from .recommender import RecommendationEngine
+from .co_purchase import CoPurchaseMatrix
 
 
-class CustomerAgent(BaseAgent):
-    """AI Agent for customer-related intelligence"""
-    
-    def __init__(self):
-        super().__init__("Customer Agent")
-    
-    async def get_personalized_recommendations(
-        self,
-        customer_id: str,
-        purchase_history: List[Dict],
-        current_time: str,
-        area_id: str
-    ) -> Dict[str, Any]:
-        """
-        Generate personalized product recommendations for customer
-        
-        Args:
-            customer_id: Customer ID
-            purchase_history: List of past purchases
-            current_time: Current time for time-based recommendations
-            area_id: Customer's area for local recommendations
-            
-        Returns:
-            Personalized recommendations
-        """
-        prompt = f"""
+# Compiled once; purchase history is trimmed to its token budget
+RECOMMENDATIONS_PROMPT = PromptTemplate("""
 You are a personalized shopping assistant for The Local Loop hyperlocal platform.
 
-**Customer Profile:**
-- Customer ID: {customer_id}
-- Area: {area_id}
-- Current Time: {current_time}
-
-**Purchase History:**
-{self._format_purchase_history(purchase_history)}
-
 **Task:**
 Generate personalized product recommendations considering:
 1. Past purchase patterns
@@ -65,12 +40,179 @@ Generate personalized product recommendations considering:
   "personalized_message": "friendly message to customer"
 }}
 
+**Customer Profile:**
+- Customer ID: {customer_id}
+- Area: {area_id}
+- Current Time: {current_time}
+
+**Purchase History:**
+{purchase_history}
+
+**Often Bought Together With Recent Purchases (this area):**
+{complements}
+
 Provide helpful, relevant recommendations in JSON format.
-"""
+""",
+    sections=["purchase_history", "complements"],
+    budgets={"purchase_history": 300}
+)
+
+# Only phrases the message; the products come from the recommendation index
+RECOMMENDATION_MESSAGE_PROMPT = PromptTemplate("""
+You write short, friendly home-screen messages for The Local Loop hyperlocal
+marketplace. Write one sentence (at most 20 words) inviting the customer to
+look at the recommended products. Mention one or two of them by name.
+
+**Response Format (JSON):**
+{{"personalized_message": "message"}}
+
+**Current Time:** {current_time}
+**Recommended Products:** {products}
+""")
+
+# Most recent purchases whose complements are suggested
+RECENT_PURCHASES = 5
+
+
+class CustomerAgent(BaseAgent):
+    """AI Agent for customer-related intelligence"""
+    
+    # Answers reused for similarly worded questions asked in the same context
+    query_cache = SemanticCache(
+        threshold=float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.9")),
+        max_entries=int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", "5000")),
+        ttl_seconds=float(os.getenv("SEMANTIC_CACHE_TTL_SECONDS", "900"))
+    )
+    
+    # Co-purchase embeddings of real catalog products (built from order
+    # history through the recommendations index endpoint)
+    recommender = RecommendationEngine(
+        dim=int(os.getenv("RECOMMENDER_DIMENSION", "64")),
+        hnsw_neighbors=int(os.getenv("RECOMMENDER_HNSW_NEIGHBORS", "0"))
+    )
+    
+    # Products bought together, per area, updated as orders come in
+    co_purchase = CoPurchaseMatrix()
+    
+    def __init__(self):
+        super().__init__("Customer Agent")
+    
+    async def get_personalized_recommendations(
+        self,
+        customer_id: str,
+        purchase_history: List[Dict],
+        current_time: str,
+        area_id: str,
+        limit: int = 10,
+        ai_message: Optional[bool] = None
+    ) -> Dict[str, Any]:
+        """
+        Generate personalized product recommendations for customer
+        
+        Once the recommendation index is built, products come from it in
+        milliseconds; until then they are generated by the AI.
         
-        response = await self.generate_response(prompt, temperature=0.8)
+        Args:
+            customer_id: Customer ID
+            purchase_history: List of past purchases, most recent first
+            current_time: Current time for time-based recommendations
+            area_id: Customer's area for local recommendations
+            limit: Products to recommend (index only)
+            ai_message: Let the AI phrase personalized_message (index only;
+                defaults to RECOMMENDATION_AI_MESSAGE)
+            
+        Returns:
+            Personalized recommendations
+        """
+        complements = self.co_purchase.complements(
+            purchase_history[:RECENT_PURCHASES], area_id=area_id
+        )
+        if self.recommender.ready:
+            result = await self._recommend_from_index(
+                purchase_history, current_time, area_id, limit, ai_message
+            )
+            # Nothing indexed for this area yet: let the AI suggest instead
+            if result["products"]:
+                result["complementary_products"] = complements
+                return result
+        
+        prompt = RECOMMENDATIONS_PROMPT.render(
+            customer_id=customer_id,
+            area_id=area_id,
+            current_time=current_time,
+            purchase_history=self._format_purchase_history(purchase_history),
+            complements=self._format_complements(complements)
+        )
+        
+        response = await self.generate_response(
+            prompt,
+            temperature=0.8,
+            use_cache=False,
+            static_prefix=RECOMMENDATIONS_PROMPT.static_prefix
+        )
         return self.parse_json_response(response)
     
+    async def _recommend_from_index(
+        self,
+        purchase_history: List[Dict],
+        current_time: str,
+        area_id: str,
+        limit: int,
+        ai_message: Optional[bool]
+    ) -> Dict[str, Any]:
+        """Recommend catalog products from the recommendation index"""
+        products = self.recommender.recommend(purchase_history, k=limit, area_id=area_id)
+        
+        groups: Dict[str, Dict[str, Any]] = {}
+        for product in products:
+            group = groups.get(product["category"])
+            if group is None:
+                reason = (
+                    f"Often bought with {product['because_of']}"
+                    if product["source"] == "co_purchase"
+                    else "Popular in your area"
+                )
+                group = groups[product["category"]] = {
+                    "category": product["category"],
+                    "products": [],
+                    "reason": reason
+                }
+            group["products"].append(product["name"])
+        
+        names = [product["name"] for product in products]
+        message = self._default_recommendation_message(names, current_time)
+        if ai_message is None:
+            ai_message = os.getenv("RECOMMENDATION_AI_MESSAGE", "false").lower() == "true"
+        if ai_message and names:
+            response = await self.generate_response(
+                RECOMMENDATION_MESSAGE_PROMPT.render(
+                    current_time=current_time, products=", ".join(names[:5])
+                ),
+                temperature=0.7,
+                max_tokens=128,
+                batchable=True
+            )
+            message = self.parse_json_response(response).get("personalized_message") or message
+        
+        return {
+            "recommendations": list(groups.values()),
+            "products": products,
+            "trending_in_area": self.recommender.trending(area_id),
+            "personalized_message": message,
+            "source": "index"
+        }
+    
+    def _default_recommendation_message(self, names: List[str], current_time: str) -> str:
+        """Greeting by time of day, naming the top recommendations"""
+        try:
+            hour = datetime.fromisoformat(current_time).hour
+        except (TypeError, ValueError):
+            hour = datetime.now().hour
+        greeting = "Good morning" if hour < 12 else "Good afternoon" if hour < 17 else "Good evening"
+        if not names:
+            return f"{greeting}! Take a look at what's fresh in your area."
+        return f"{greeting}! Picked for you: {', '.join(names[:3])}."
+    
     async def answer_customer_query(
         self,
         query: str,
@@ -86,7 +228,67 @@ Provide helpful, relevant recommendations in JSON format.
         Returns:
             AI-generated answer
         """
-        prompt = f"""
+        cached = self.query_cache.get(query, context)
+        if cached is not None:
+            return dict(cached)
+        
+        prompt = self._customer_query_prompt(query, context)
+        response = await self.generate_response(prompt, temperature=0.7, use_cache=False)
+        result = self.parse_json_response(response)
+        if "answer" in result:
+            self.query_cache.set(query, context, result)
+        return result
+    
+    def stream_customer_query(
+        self,
+        query: str,
+        context: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """
+        Answer customer questions using AI, streaming the raw response
+        
+        Args:
+            query: Customer's question
+            context: Additional context (order status, products, etc.)
+            
+        Returns:
+            Async iterator of response text chunks; parse the joined text
+            with parse_json_response. A completed answer is cached for
+            later queries, streamed or not.
+        """
+        cached = self.query_cache.get(query, context)
+        if cached is not None:
+            return self._single_chunk(json.dumps(cached))
+        
+        prompt = self._customer_query_prompt(query, context)
+        return self._cache_streamed_answer(
+            query, context, self.stream_response(prompt, temperature=0.7)
+        )
+    
+    async def _cache_streamed_answer(
+        self,
+        query: str,
+        context: Dict[str, Any],
+        chunks: AsyncIterator[str]
+    ) -> AsyncIterator[str]:
+        """Pass chunks through, caching the answer once the stream completes"""
+        parts = []
+        async for chunk in chunks:
+            parts.append(chunk)
+            yield chunk
+        
+        # Streams stopped early (client gone, required fields in) never get here
+        result = self.parse_json_response("".join(parts))
+        if "answer" in result:
+            self.query_cache.set(query, context, result)
+    
+    async def _single_chunk(self, text: str) -> AsyncIterator[str]:
+        """Stream an already known response as one chunk"""
+        yield text
+    
+    def _customer_query_prompt(self, query: str, context: Dict[str, Any]) -> str:
+        """Build the customer query prompt"""
+        return f"""
 You are a helpful customer service assistant for The Local Loop.
 
 **Customer Query:**
@@ -113,9 +315,6 @@ If it's about:
 
 Respond in JSON format.
 """
-        
-        response = await self.generate_response(prompt, temperature=0.7)
-        return self.parse_json_response(response)
     
     async def predict_customer_needs(
         self,
@@ -132,6 +331,9 @@ Respond in JSON format.
         Returns:
             Predicted needs and suggestions
         """
+        cart_complements = self.co_purchase.complements(
+            behavior_data.get('cart_items', []), area_id=behavior_data.get('area_id')
+        )
         prompt = f"""
 You are a predictive analytics agent for customer behavior.
 
@@ -140,6 +342,7 @@ You are a predictive analytics agent for customer behavior.
 **Behavior Data:**
 - Recent searches: {behavior_data.get('recent_searches', [])}
 - Cart items: {behavior_data.get('cart_items', [])}
+- Often bought with the cart: {[product['name'] for product in cart_complements]}
 - Browsing history: {behavior_data.get('browsing_history', [])}
 - Last purchase: {behavior_data.get('last_purchase_date', 'N/A')}
 
@@ -158,22 +361,33 @@ Predict what the customer might need next based on their behavior.
 Provide predictions in JSON format.
 """
         
-        response = await self.generate_response(prompt, temperature=0.6)
-        return self.parse_json_response(response)
+        response = await self.generate_response(prompt, temperature=0.6, batchable=True)
+        result = self.parse_json_response(response)
+        result["cart_complements"] = cart_complements
+        return result
     
-    def _format_purchase_history(self, history: List[Dict]) -> str:
-        """Format purchase history for prompt"""
+    def _format_purchase_history(self, history: List[Dict]) -> List[str]:
+        """Format purchase history for prompt, one line each (most recent first)"""
         if not history:
-            return "No purchase history available"
+            return ["No purchase history available"]
         
-        formatted = []
-        for item in history[:10]:  # Last 10 purchases
-            formatted.append(
-                f"- {item.get('product_name', 'Unknown')} "
-                f"({item.get('category', 'N/A')}) "
-                f"on {item.get('date', 'N/A')}"
-            )
-        return "\n".join(formatted)
+        return [
+            f"- {item.get('product_name', 'Unknown')} "
+            f"({item.get('category', 'N/A')}) "
+            f"on {item.get('date', 'N/A')}"
+            for item in history
+        ]
+    
+    def _format_complements(self, complements: List[Dict]) -> List[str]:
+        """Format complementary products for prompt, one line each"""
+        if not complements:
+            return ["No co-purchase data"]
+        
+        return [
+            f"- {product['name']} ({product['category']}): in "
+            f"{product['confidence']:.0%} of orders with {product['because_of']}"
+            for product in complements
+        ]
     
     def _format_context(self, context: Dict[str, Any]) -> str:
         """Format context for prompt"""
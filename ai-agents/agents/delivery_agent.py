@@ -3,8 +3,11 @@ Delivery Agent
 AI agent for delivery optimization, route planning, and partner management
 """
 
-from typing import Dict, Any, List
+from typing import Dict, Any, List, Optional
+from datetime import datetime
 from .base_agent import BaseAgent
+from .assignment import score_partners, build_assignment, describe_partner, assign_orders
+from .routing import optimize_route
 
 
 class DeliveryAgent(BaseAgent):
@@ -18,125 +21,158 @@ class DeliveryAgent(BaseAgent):
         order_id: str,
         pickup_location: Dict[str, float],
         delivery_location: Dict[str, float],
-        available_partners: List[Dict]
+        available_partners: List[Dict],
+        delivery_priority: Optional[str] = None,
+        explain: bool = False
     ) -> Dict[str, Any]:
         """
-        Assign optimal delivery partner using AI
+        Assign optimal delivery partner
+        
+        Partners are ranked locally by travel time to pickup, current
+        workload, rating and vehicle type, so no AI call is needed on the
+        checkout path. The AI is only asked to explain the choice on request.
         
         Args:
             order_id: Order ID
             pickup_location: Vendor location {lat, lng}
             delivery_location: Customer location {lat, lng}
             available_partners: List of available delivery partners
+            delivery_priority: Order priority (high|medium|low)
+            explain: Ask the AI for a reasoning of the selection
             
         Returns:
             Optimal delivery partner assignment
         """
+        for name, location in (("pickup", pickup_location), ("delivery", delivery_location)):
+            if not location.get('lat') or not location.get('lng'):
+                return {
+                    "error": f"Invalid {name} location",
+                    "selected_partner": None
+                }
+        
+        ranked = score_partners(pickup_location, delivery_location, available_partners)
+        assignment = build_assignment(ranked, delivery_priority)
+        assignment["order_id"] = order_id
+        
+        if explain and ranked:
+            explanation = await self._explain_assignment(order_id, ranked[:3])
+            if explanation.get("reasoning"):
+                assignment["reasoning"] = explanation["reasoning"]
+        
+        return assignment
+    
+    async def batch_assign_orders(
+        self,
+        orders: List[Dict[str, Any]],
+        available_partners: List[Dict],
+        max_orders_per_partner: int = 1
+    ) -> Dict[str, Any]:
+        """
+        Assign a batch of orders to partners jointly (min-cost matching)
+        
+        Solving the batch at once avoids the poor global results of greedy
+        one-order-at-a-time assignment during peaks.
+        
+        Args:
+            orders: [{order_id, pickup_location, delivery_location, delivery_priority?}]
+            available_partners: List of available delivery partners
+            max_orders_per_partner: Orders one partner may take from this batch
+            
+        Returns:
+            Assignments for every order that could be matched
+        """
+        result = assign_orders(orders, available_partners, max_orders_per_partner)
+        result["total_orders"] = len(orders)
+        result["total_assigned"] = len(result["assignments"])
+        return result
+    
+    async def _explain_assignment(
+        self,
+        order_id: str,
+        candidates: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Ask the AI to explain an assignment that was already decided
+        
+        Args:
+            order_id: Order ID
+            candidates: Top scored partners, selected partner first
+            
+        Returns:
+            Parsed AI explanation
+        """
+        formatted = "\n".join(
+            f"{rank}. {c['partner_name']} (ID: {c['partner_id']}) - {describe_partner(c)}, "
+            f"pickup in {c['estimated_pickup_time']} mins"
+            for rank, c in enumerate(candidates, start=1)
+        )
+        
         prompt = f"""
 You are a delivery optimization AI for The Local Loop platform.
 
 **Order ID:** {order_id}
 
-**Pickup Location:** 
-- Latitude: {pickup_location.get('lat')}
-- Longitude: {pickup_location.get('lng')}
-
-**Delivery Location:**
-- Latitude: {delivery_location.get('lat')}
-- Longitude: {delivery_location.get('lng')}
-
-**Available Delivery Partners:**
-{self._format_partners(available_partners)}
+**Ranked Delivery Partners (1 was selected):**
+{formatted}
 
 **Task:**
-Select the optimal delivery partner considering:
-1. Distance from pickup location
-2. Current workload
-3. Performance rating
-4. Vehicle type
-5. Estimated delivery time
+Explain in one or two sentences why partner 1 is the best choice for this
+order compared to the others.
 
 **Response Format (JSON):**
 {{
-  "selected_partner": {{
-    "partner_id": "id",
-    "partner_name": "name",
-    "distance_from_pickup": 1.5,
-    "estimated_pickup_time": 10,
-    "estimated_delivery_time": 25,
-    "confidence_score": 0.92
-  }},
-  "reasoning": "why this partner was selected",
-  "alternative_partners": [
-    {{"partner_id": "id2", "reason": "backup option"}}
-  ],
-  "delivery_priority": "high|medium|low"
+  "reasoning": "why this partner was selected"
 }}
 
-Provide assignment in JSON format.
+Respond in JSON format.
 """
         
-        response = await self.generate_response(prompt, temperature=0.5)
+        response = await self.generate_response(
+            prompt, temperature=0.3, max_tokens=256, priority="critical"
+        )
         return self.parse_json_response(response)
     
     async def optimize_route(
         self,
         partner_id: str,
         current_location: Dict[str, float],
-        pending_deliveries: List[Dict]
+        pending_deliveries: List[Dict],
+        departure_time: Optional[str] = None
     ) -> Dict[str, Any]:
         """
         Optimize delivery route for multiple orders
         
+        Solved locally (nearest neighbour + 2-opt/Or-opt over a haversine
+        distance matrix) honouring each delivery's time_window and priority.
+        
         Args:
             partner_id: Delivery partner ID
             current_location: Current location of partner
-            pending_deliveries: List of pending deliveries
+            pending_deliveries: List of pending deliveries with coordinates
+            departure_time: ISO time the route starts (defaults to now; IST
+                when it has no offset)
             
         Returns:
             Optimized route plan
+            
+        Raises:
+            ValueError: If departure_time is not an ISO time
         """
-        prompt = f"""
-You are a route optimization AI for delivery partners.
-
-**Partner ID:** {partner_id}
-
-**Current Location:**
-- Latitude: {current_location.get('lat')}
-- Longitude: {current_location.get('lng')}
-
-**Pending Deliveries:**
-{self._format_deliveries(pending_deliveries)}
-
-**Task:**
-Create an optimized delivery route that:
-1. Minimizes total distance
-2. Respects delivery time windows
-3. Considers traffic patterns
-4. Prioritizes urgent deliveries
-
-**Response Format (JSON):**
-{{
-  "optimized_route": [
-    {{
-      "order_id": "id",
-      "sequence": 1,
-      "address": "address",
-      "estimated_arrival": "10:30 AM",
-      "priority": "high|medium|low"
-    }}
-  ],
-  "total_distance": 8.5,
-  "estimated_total_time": 45,
-  "fuel_efficiency": "optimized",
-  "route_summary": "brief description of route"
-}}
-
-Provide route in JSON format.
-"""
+        if not current_location.get('lat') or not current_location.get('lng'):
+            return {
+                "error": "Invalid current location",
+                "optimized_route": []
+            }
         
-        response = await self.generate_response(prompt, temperature=0.4)
-        return self.parse_json_response(response)
+        departure = None
+        if departure_time:
+            try:
+                departure = datetime.fromisoformat(str(departure_time))
+            except ValueError:
+                raise ValueError(f"Invalid departure_time: {departure_time!r} (expected ISO format)")
+        route = optimize_route(current_location, pending_deliveries, departure)
+        route["partner_id"] = partner_id
+        return route
     
     async def predict_delivery_time(
         self,
@@ -253,7 +289,7 @@ Analyze performance and provide:
 Provide analysis in JSON format.
 """
         
-        response = await self.generate_response(prompt, temperature=0.6)
+        response = await self.generate_response(prompt, temperature=0.6, priority="background")
         return self.parse_json_response(response)
     
     async def handle_delivery_issue(
@@ -305,40 +341,9 @@ Provide immediate solutions and recommendations:
 Provide solution in JSON format.
 """
         
-        response = await self.generate_response(prompt, temperature=0.7)
+        response = await self.generate_response(prompt, temperature=0.7, use_cache=False)
         return self.parse_json_response(response)
     
-    def _format_partners(self, partners: List[Dict]) -> str:
-        """Format partners for prompt"""
-        if not partners:
-            return "No partners available"
-        
-        formatted = []
-        for partner in partners:
-            formatted.append(
-                f"- {partner.get('name', 'Unknown')} (ID: {partner.get('id', 'N/A')})\n"
-                f"  Location: Lat {partner.get('lat', 0)}, Lng {partner.get('lng', 0)}\n"
-                f"  Rating: {partner.get('rating', 0)}/5\n"
-                f"  Active Orders: {partner.get('active_orders', 0)}\n"
-                f"  Vehicle: {partner.get('vehicle_type', 'bike')}"
-            )
-        return "\n\n".join(formatted)
-    
-    def _format_deliveries(self, deliveries: List[Dict]) -> str:
-        """Format deliveries for prompt"""
-        if not deliveries:
-            return "No pending deliveries"
-        
-        formatted = []
-        for delivery in deliveries:
-            formatted.append(
-                f"- Order {delivery.get('order_id', 'N/A')}\n"
-                f"  Address: {delivery.get('address', 'Unknown')}\n"
-                f"  Priority: {delivery.get('priority', 'normal')}\n"
-                f"  Time Window: {delivery.get('time_window', 'flexible')}"
-            )
-        return "\n\n".join(formatted)
-    
     def _format_issue_details(self, details: Dict[str, Any]) -> str:
         """Format issue details for prompt"""
         formatted = []
@@ -0,0 +1,333 @@
+"""
+Demand Forecast Job
+Nightly batch forecast of every (vendor, product) pair, spread over a
+process pool and saved to a store that demand prediction requests read
+"""
+
+import json
+import multiprocessing
+import os
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .forecasting import forecast_columns, last_complete_day, parse_dates, service_today
+from .routing import SERVICE_TIMEZONE
+
+
+# Separates vendor and product in the keys of one shared sales matrix
+_KEY_SEPARATOR = "\x1f"
+
+# Sales rows per worker process below which starting processes costs more
+# than it saves
+MIN_ROWS_PER_WORKER = 200_000
+
+# Daily units sold per vendor and product over whole IST days (today is
+# still in progress; cancelled orders excluded). Prisma stores created_at
+# as UTC without a timezone
+SALES_QUERY = """
+SELECT o.vendor_id, oi.product_id,
+       DATE(o.created_at AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Kolkata') AS date,
+       SUM(oi.quantity) AS quantity
+FROM order_items oi
+JOIN orders o ON o.id = oi.order_id
+WHERE o.created_at >= :since AND o.created_at < :until AND o.status <> 'CANCELLED'
+GROUP BY o.vendor_id, oi.product_id, DATE(o.created_at AT TIME ZONE 'UTC' AT TIME ZONE 'Asia/Kolkata')
+"""
+
+
+def load_sales_from_database(database_url: str, history_days: int = 365) -> List[Dict[str, Any]]:
+    """
+    Read daily sales of all vendors from the marketplace database
+
+    Args:
+        database_url: SQLAlchemy URL of the backend's PostgreSQL database
+        history_days: Days of history to read
+
+    Returns:
+        Rows with vendor_id, product_id, date and quantity
+    """
+    # Only the batch job needs a database driver
+    from sqlalchemy import create_engine, text
+    from sqlalchemy.engine import make_url
+
+    # Prisma's ?schema= parameter is not a driver option
+    url = make_url(database_url)
+    url = url.difference_update_query(["schema"])
+
+    # IST midnights, as the UTC wall times created_at is stored in
+    midnight = datetime.combine(service_today(), datetime.min.time(), SERVICE_TIMEZONE)
+    until = midnight.astimezone(timezone.utc).replace(tzinfo=None)
+    since = until - timedelta(days=history_days)
+    engine = create_engine(url)
+    try:
+        with engine.connect() as connection:
+            result = connection.execute(text(SALES_QUERY), {"since": since, "until": until})
+            return [
+                {
+                    "vendor_id": str(row.vendor_id),
+                    "product_id": str(row.product_id),
+                    "date": row.date.isoformat(),
+                    "quantity": float(row.quantity),
+                }
+                for row in result
+            ]
+    finally:
+        engine.dispose()
+
+
+def forecast_all_vendors(
+    sales: List[Dict[str, Any]],
+    horizon: int = 7,
+    as_of: Optional[str] = None,
+    workers: int = 1
+) -> Dict[str, Dict[str, Dict[str, Any]]]:
+    """
+    Forecast every (vendor, product) pair
+
+    Vendors are split into chunks of similar size; each chunk is forecast
+    in one vectorized pass, in parallel worker processes when workers > 1
+    and there are enough sales to pay for starting them.
+
+    Args:
+        sales: Rows with vendor_id, product_id, date and quantity
+        horizon: Days to forecast
+        as_of: Last day of history (defaults to the latest sale that is
+            not after today)
+        workers: Worker processes (1 runs in this process)
+
+    Returns:
+        {vendor_id: {product_id: forecast}}
+    """
+    if not sales:
+        return {}
+
+    # Columns are sent to workers; row dicts are much slower to pickle
+    vendor_ids = [str(row.get("vendor_id") or "") for row in sales]
+    keys = np.array([
+        f"{vendor_id}{_KEY_SEPARATOR}{row.get('product_id') or '*'}"
+        for vendor_id, row in zip(vendor_ids, sales)
+    ], dtype=object)
+    dates = np.array([row.get("date") for row in sales], dtype=object)
+    quantities = np.array([row.get("quantity", 0) for row in sales], dtype=object)
+
+    # Every chunk must end on the same day, or quiet vendors would skip
+    # their recent days without sales
+    if as_of is None:
+        parsed = parse_dates(pd.unique(dates))
+        today = np.datetime64(service_today(), "ns")
+        parsed = parsed[~np.isnat(parsed) & (parsed <= today)]
+        if len(parsed):
+            as_of = pd.Timestamp(parsed.max()).date().isoformat()
+
+    # Largest vendors first, each into the currently smallest chunk
+    vendor_codes, vendors = pd.factorize(pd.Series(vendor_ids))
+    vendor_rows = np.bincount(vendor_codes, minlength=len(vendors))
+    parallel = workers > 1 and len(sales) >= MIN_ROWS_PER_WORKER * 2
+    chunk_count = min(len(vendors), workers * 4) if parallel else 1
+    chunk_rows = np.zeros(chunk_count, dtype=np.int64)
+    vendor_chunk = np.zeros(len(vendors), dtype=np.int64)
+    for vendor in np.argsort(-vendor_rows, kind="stable"):
+        chunk = int(np.argmin(chunk_rows))
+        vendor_chunk[vendor] = chunk
+        chunk_rows[chunk] += vendor_rows[vendor]
+
+    row_chunks = vendor_chunk[vendor_codes]
+    columns = []
+    for chunk in range(chunk_count):
+        rows = np.flatnonzero(row_chunks == chunk)
+        columns.append((keys[rows].tolist(), dates[rows].tolist(), quantities[rows].tolist()))
+
+    if parallel:
+        # Spawned, not forked: the service process runs gRPC and executor
+        # threads, which a forked child could deadlock on, and a fresh
+        # worker does not copy the service's memory
+        with ProcessPoolExecutor(
+            max_workers=min(workers, chunk_count),
+            mp_context=multiprocessing.get_context("spawn")
+        ) as pool:
+            futures = [
+                pool.submit(forecast_columns, *chunk_columns, horizon, as_of)
+                for chunk_columns in columns
+            ]
+            results = [future.result() for future in futures]
+    else:
+        results = [forecast_columns(*chunk_columns, horizon, as_of) for chunk_columns in columns]
+
+    forecasts: Dict[str, Dict[str, Dict[str, Any]]] = {}
+    for result in results:
+        for key, forecast in result.items():
+            vendor_id, _, product_id = key.partition(_KEY_SEPARATOR)
+            forecasts.setdefault(vendor_id, {})[product_id] = forecast
+    return forecasts
+
+
+class ForecastStore:
+    """Latest batch forecasts, kept in memory and in a JSON file"""
+
+    def __init__(self, path: str = "", max_age_hours: float = 36.0):
+        """
+        Args:
+            path: JSON file to persist to ('' keeps forecasts in memory only)
+            max_age_hours: Forecasts older than this are not served
+        """
+        self.path = path
+        self.max_age_hours = max_age_hours
+        self._forecasts: Dict[str, Dict[str, Dict[str, Any]]] = {}
+        # When each vendor was last forecast; generated_at is the last full run
+        self._vendor_generated_at: Dict[str, str] = {}
+        self.generated_at: Optional[str] = None
+        self.last_run: Dict[str, Any] = {}
+        self._lock = threading.Lock()
+
+    def _is_fresh(self, generated_at: Optional[str]) -> bool:
+        """Whether forecasts generated at this time may still be served"""
+        if generated_at is None:
+            return False
+        age = datetime.now(timezone.utc) - datetime.fromisoformat(generated_at)
+        return age <= timedelta(hours=self.max_age_hours)
+
+    @property
+    def fresh(self) -> bool:
+        """Whether the last full run is recent enough to serve"""
+        return self._is_fresh(self.generated_at)
+
+    def generated_for(self, vendor_id: str) -> Optional[str]:
+        """When a vendor's stored forecasts were generated"""
+        return self._vendor_generated_at.get(str(vendor_id))
+
+    def get(self, vendor_id: str, product_id: str) -> Optional[Dict[str, Any]]:
+        """Get a product's stored forecast, if fresh"""
+        return self.vendor(vendor_id).get(str(product_id))
+
+    def vendor(self, vendor_id: str) -> Dict[str, Dict[str, Any]]:
+        """Get all stored forecasts of a vendor, if fresh"""
+        if not self._is_fresh(self.generated_for(vendor_id)):
+            return {}
+        return self._forecasts.get(str(vendor_id), {})
+
+    def replace(self, forecasts: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+        """Swap in a full batch of forecasts (all vendors) and persist it"""
+        generated_at = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self._forecasts = forecasts
+            self._vendor_generated_at = {vendor_id: generated_at for vendor_id in forecasts}
+            self.generated_at = generated_at
+            self._save()
+
+    def merge(self, forecasts: Dict[str, Dict[str, Dict[str, Any]]]) -> None:
+        """Replace the forecasts of the given vendors only and persist them"""
+        generated_at = datetime.now(timezone.utc).isoformat()
+        with self._lock:
+            self._forecasts = {**self._forecasts, **forecasts}
+            self._vendor_generated_at = {
+                **self._vendor_generated_at,
+                **{vendor_id: generated_at for vendor_id in forecasts},
+            }
+            self._save()
+
+    def _save(self) -> None:
+        """Write the store to its file (call with the lock held)"""
+        if not self.path:
+            return
+        os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            json.dump({
+                "generated_at": self.generated_at,
+                "vendor_generated_at": self._vendor_generated_at,
+                "vendors": self._forecasts,
+            }, f)
+        os.replace(temp_path, self.path)
+
+    def load(self) -> bool:
+        """Read the persisted forecasts; False if there are none"""
+        if not self.path or not os.path.exists(self.path):
+            return False
+        with open(self.path, encoding="utf-8") as f:
+            data = json.load(f)
+        with self._lock:
+            self._forecasts = data.get("vendors", {})
+            self.generated_at = data.get("generated_at")
+            # Files from before per-vendor times hold one full run
+            self._vendor_generated_at = data.get("vendor_generated_at") or {
+                vendor_id: self.generated_at for vendor_id in self._forecasts
+            }
+        return True
+
+    def stats(self) -> Dict[str, Any]:
+        """Get store contents and the last run"""
+        return {
+            "generated_at": self.generated_at,
+            "fresh": self.fresh,
+            "vendors": len(self._forecasts),
+            "products": sum(len(products) for products in self._forecasts.values()),
+            "last_run": self.last_run,
+        }
+
+
+def run_forecast_job(
+    store: ForecastStore,
+    sales: Optional[List[Dict[str, Any]]] = None,
+    database_url: str = "",
+    history_days: int = 365,
+    horizon: int = 7,
+    workers: int = 1
+) -> Dict[str, Any]:
+    """
+    Forecast all vendors and save the result (blocking; run it in an
+    executor from async code)
+
+    A run over the database replaces the whole store; posted sales only
+    replace the forecasts of the vendors they contain.
+
+    Args:
+        store: Where to save forecasts
+        sales: Sales rows; read from the database when omitted
+        database_url: Database to read sales from
+        history_days: Days of history to read from the database
+        horizon: Days to forecast
+        workers: Worker processes
+
+    Returns:
+        Run summary
+    """
+    started = time.perf_counter()
+    from_database = sales is None
+    if from_database:
+        if not database_url:
+            raise ValueError("No sales given and no DATABASE_URL configured")
+        sales = load_sales_from_database(database_url, history_days)
+    loaded = time.perf_counter()
+
+    # Forecast from yesterday: today's sales are still coming in
+    forecasts = forecast_all_vendors(sales, horizon, last_complete_day(), workers)
+    if from_database:
+        store.replace(forecasts)
+    else:
+        store.merge(forecasts)
+
+    store.last_run = {
+        "finished_at": datetime.now(timezone.utc).isoformat(),
+        "full_run": from_database,
+        "sales_rows": len(sales),
+        "vendors": len(forecasts),
+        "products": sum(len(products) for products in forecasts.values()),
+        "load_seconds": round(loaded - started, 3),
+        "forecast_seconds": round(time.perf_counter() - loaded, 3),
+    }
+    return store.last_run
+
+
+def seconds_until(hour: int, now: Optional[datetime] = None) -> float:
+    """Seconds from now until the next time the IST clock reads hour:00"""
+    now = (now or datetime.now(timezone.utc)).astimezone(SERVICE_TIMEZONE)
+    target = now.replace(hour=hour, minute=0, second=0, microsecond=0)
+    if target <= now:
+        target += timedelta(days=1)
+    return (target - now).total_seconds()
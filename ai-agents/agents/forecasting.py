@@ -0,0 +1,400 @@
+"""
+Demand Forecasting
+Vectorized daily demand forecasts for all products of a vendor: damped
+Holt exponential smoothing on sales adjusted by day-of-week factors
+"""
+
+import math
+import re
+from datetime import date, datetime
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from .routing import SERVICE_TIMEZONE
+
+
+DAY_NAMES = ["Monday", "Tuesday", "Wednesday", "Thursday", "Friday", "Saturday", "Sunday"]
+
+# Smoothing of the level, the trend, and how fast the trend fades (chosen
+# by backtesting 7-day forecasts on flat, weekly and trending series)
+ALPHA = 0.15
+BETA = 0.05
+PHI = 0.98
+
+# History needed before day-of-week factors are used, and weeks they use
+MIN_SEASONAL_DAYS = 14
+SEASONAL_WEEKS = 8
+
+# Weeks of "no pattern" (factor 1) mixed into day-of-week factors, so a
+# few unusual weeks do not dominate
+SEASONAL_SHRINKAGE = 1.0
+
+# Weekly change (relative to the level) reported as a trend
+TREND_THRESHOLD = 0.05
+
+# Service level of recommended stock (z for ~95%)
+SAFETY_Z = 1.65
+
+# Days of history used, ending at as_of; older sales add nothing to the
+# smoothed level and would only lengthen the smoothing loop
+MAX_HISTORY_DAYS = 730
+
+# Numeric dates this large are epoch milliseconds, smaller ones seconds
+EPOCH_MILLISECONDS_FROM = 1e11
+
+# A time of day followed by a UTC offset; other date strings are local
+_UTC_OFFSET = re.compile(r"\d{2}:\d{2}(?::\d{2}(?:\.\d+)?)?\s*(?:[zZ]|[+-]\d{2}(?::?\d{2})?)$")
+
+
+def sales_matrix(
+    sales_history: List[Dict[str, Any]],
+    as_of: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Daily units per product
+
+    Args:
+        sales_history: Rows with date (ISO string or epoch), quantity and
+            product_id (or product_name); rows without a product belong to
+            '*', rows without a valid date are ignored
+        as_of: Last day of history (defaults to the latest sale, but not
+            after today); later sales are ignored, as are sales more than
+            MAX_HISTORY_DAYS before it, and days without sales count as zero
+
+    Returns:
+        DataFrame indexed by product with one column per day
+    """
+    if not sales_history:
+        return pd.DataFrame()
+
+    # Columns are read directly; a DataFrame of dicts is several times slower
+    key = "product_id" if any("product_id" in row for row in sales_history) else "product_name"
+    return columns_matrix(
+        [str(row.get(key) or "*") for row in sales_history],
+        [row.get("date") for row in sales_history],
+        [row.get("quantity", 0) for row in sales_history],
+        as_of
+    )
+
+
+def columns_matrix(
+    products: List[str],
+    dates: List[Any],
+    quantities: List[Any],
+    as_of: Optional[str] = None
+) -> pd.DataFrame:
+    """
+    Daily units per product from parallel columns (see sales_matrix)
+
+    Args:
+        products: Product key of each sale
+        dates: Date of each sale (rows without a valid date are ignored)
+        quantities: Units of each sale
+        as_of: Last day of history (see sales_matrix)
+
+    Returns:
+        DataFrame indexed by product with one column per day
+    """
+    if not len(products):
+        return pd.DataFrame()
+
+    quantities = pd.to_numeric(
+        pd.Series(quantities), errors="coerce"
+    ).fillna(0).to_numpy(dtype=float)
+
+    # Sales repeat the same few hundred dates; parse each once
+    date_codes, unique_dates = pd.factorize(pd.Series(dates, dtype=object))
+    parsed = parse_dates(unique_dates)
+    dates = np.full(len(products), np.datetime64("NaT"), dtype="datetime64[ns]")
+    known = date_codes >= 0
+    dates[known] = parsed[date_codes[known]]
+
+    # A mistyped year must not stretch the matrix over decades
+    if as_of is not None:
+        end = np.datetime64(pd.Timestamp(as_of).normalize().to_datetime64(), "ns")
+    else:
+        today = np.datetime64(service_today(), "ns")
+        before_today = dates[~np.isnat(dates) & (dates <= today)]
+        if not len(before_today):
+            return pd.DataFrame()
+        end = before_today.max()
+    earliest = end - np.timedelta64(MAX_HISTORY_DAYS - 1, "D")
+    valid = ~np.isnat(dates) & (dates <= end) & (dates >= earliest)
+    if not valid.any():
+        return pd.DataFrame()
+
+    start = dates[valid].min()
+    days = pd.date_range(start, end, freq="D")
+
+    product_codes, product_index = pd.factorize(pd.Series(products)[valid])
+    day_offsets = ((dates[valid] - start) // np.timedelta64(1, "D")).astype(np.int64)
+    cells = np.bincount(
+        product_codes * len(days) + day_offsets,
+        weights=quantities[valid],
+        minlength=len(product_index) * len(days)
+    )
+    units = np.maximum(cells.reshape(len(product_index), len(days)), 0)
+    return pd.DataFrame(units, index=pd.Index(product_index, name="product"), columns=days)
+
+
+def service_today() -> date:
+    """Today in the marketplace's timezone, whatever the server clock"""
+    return datetime.now(SERVICE_TIMEZONE).date()
+
+
+def last_complete_day() -> str:
+    """Yesterday (IST) as an ISO date: the last day whose sales are all in"""
+    return (pd.Timestamp(service_today()) - pd.Timedelta(days=1)).date().isoformat()
+
+
+def parse_dates(values: Any) -> np.ndarray:
+    """
+    Parse sale dates to days
+
+    Args:
+        values: ISO strings, datetimes, or epoch seconds/milliseconds
+
+    Returns:
+        datetime64[ns] array of IST days (NaT where unparseable); epochs
+        and timestamps with a UTC offset are converted, others are local
+    """
+    values = pd.Series(values, dtype=object)
+    numeric = values.map(lambda value: isinstance(value, (int, float)) and not isinstance(value, bool))
+    aware = numeric | values.map(
+        lambda value: (isinstance(value, str) and bool(_UTC_OFFSET.search(value.strip())))
+        or (isinstance(value, datetime) and value.tzinfo is not None)
+    )
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns, UTC]")
+    if (~numeric).any():
+        parsed[~numeric] = pd.to_datetime(
+            values[~numeric], errors="coerce", utc=True, format="mixed"
+        )
+    if numeric.any():
+        seconds = values[numeric].astype(float)
+        seconds = seconds.where(seconds.abs() < EPOCH_MILLISECONDS_FROM, seconds / 1000)
+        parsed[numeric] = pd.to_datetime(seconds, errors="coerce", unit="s", utc=True)
+    local = parsed.dt.tz_localize(None)
+    if aware.any():
+        local[aware] = parsed[aware].dt.tz_convert(SERVICE_TIMEZONE).dt.tz_localize(None)
+    return local.dt.normalize().to_numpy()
+
+
+def _weekday_factors(
+    units: np.ndarray,
+    weekdays: np.ndarray,
+    first_day: np.ndarray
+) -> np.ndarray:
+    """Multiplicative day-of-week factors per product, shape (products, 7)"""
+    products, days = units.shape
+    window = min(days, 7 * SEASONAL_WEEKS)
+    recent, recent_days = units[:, -window:], weekdays[-window:]
+    # Days before a product's first sale say nothing about its pattern
+    active = np.arange(days - window, days)[None, :] >= first_day[:, None]
+    active_days = active.sum(axis=1)
+    overall = np.divide(
+        (recent * active).sum(axis=1), active_days,
+        out=np.zeros(products), where=active_days > 0
+    )
+    weeks = active_days / 7
+
+    factors = np.ones((products, 7))
+    for day in range(7):
+        on_day = active & (recent_days == day)[None, :]
+        count = on_day.sum(axis=1)
+        mean = np.divide((recent * on_day).sum(axis=1), count, out=np.zeros(products), where=count > 0)
+        raw = np.divide(mean, overall, out=np.ones(products), where=(overall > 0) & (count > 0))
+        factors[:, day] = (weeks * raw + SEASONAL_SHRINKAGE) / (weeks + SEASONAL_SHRINKAGE)
+    factors /= factors.mean(axis=1, keepdims=True)
+
+    factors[days - first_day < MIN_SEASONAL_DAYS] = 1.0
+    return factors
+
+
+def forecast_matrix(daily: pd.DataFrame, horizon: int = 7) -> Dict[str, np.ndarray]:
+    """
+    Forecast every product of a sales matrix at once
+
+    Each product's history starts at its first sale, so products added
+    recently are not dragged down by the zeros before it.
+
+    Args:
+        daily: Output of sales_matrix
+        horizon: Days to forecast after the last column
+
+    Returns:
+        Arrays with one row per product: 'forecast' (products, horizon),
+        'factors' (products, 7), 'level', 'trend', 'rmse', 'history_days'
+    """
+    units = daily.to_numpy(dtype=float)
+    products, days = units.shape
+    weekdays = daily.columns.dayofweek.to_numpy()
+    sold = units > 0
+    first_day = np.where(sold.any(axis=1), sold.argmax(axis=1), 0)
+
+    factors = _weekday_factors(units, weekdays, first_day)
+    seasonal = np.maximum(factors[:, weekdays], 0.1)
+    adjusted = units / seasonal
+
+    # Start from the mean of each product's first week of sales
+    totals = np.concatenate([np.zeros((products, 1)), np.cumsum(adjusted, axis=1)], axis=1)
+    warm_up_end = np.minimum(first_day + 7, days)
+    rows = np.arange(products)
+    level = (totals[rows, warm_up_end] - totals[rows, first_day]) / (warm_up_end - first_day)
+
+    trend = np.zeros(products)
+    squared_error = np.zeros(products)
+    for t in range(days):
+        active = t >= first_day
+        expected = level + PHI * trend
+        scored = t >= first_day + 7
+        squared_error += np.where(scored, (units[:, t] - expected * seasonal[:, t]) ** 2, 0.0)
+        previous = level
+        level = np.where(active, ALPHA * adjusted[:, t] + (1 - ALPHA) * expected, level)
+        trend = np.where(active, BETA * (level - previous) + (1 - BETA) * PHI * trend, trend)
+
+    steps = np.arange(1, horizon + 1)
+    damping = np.cumsum(PHI ** steps)
+    future_days = (weekdays[-1] + steps) % 7
+    forecast = (level[:, None] + trend[:, None] * damping) * factors[:, future_days]
+
+    history_days = days - first_day
+    scored_days = np.maximum(history_days - 7, 0)
+    # Too short to measure: assume Poisson-like noise
+    rmse = np.where(
+        scored_days > 0,
+        np.sqrt(squared_error / np.maximum(scored_days, 1)),
+        np.sqrt(np.maximum(level, 0))
+    )
+    return {
+        "forecast": np.maximum(forecast, 0),
+        "factors": factors,
+        "level": level,
+        "trend": trend,
+        "rmse": rmse,
+        "history_days": history_days,
+    }
+
+
+def _describe(
+    daily: pd.DataFrame,
+    result: Dict[str, np.ndarray],
+    row: int
+) -> Dict[str, Any]:
+    """One product's forecast in the demand prediction response format"""
+    start = daily.columns[-1]
+    forecast = result["forecast"][row]
+    level, trend, rmse = result["level"][row], result["trend"][row], result["rmse"][row]
+    history_days = int(result["history_days"][row])
+
+    scale = max(level, forecast.mean(), 1e-9)
+    base_confidence = float(1 / (1 + rmse / scale)) if forecast.any() else 0.5
+    if history_days < MIN_SEASONAL_DAYS:
+        base_confidence *= 0.7
+
+    predictions = []
+    for step, units in enumerate(forecast, start=1):
+        day = start + pd.Timedelta(days=step)
+        confidence = min(0.95, max(0.05, base_confidence * 0.98 ** (step - 1)))
+        predictions.append({
+            "day": DAY_NAMES[day.dayofweek],
+            "date": day.date().isoformat(),
+            "predicted_units": round(float(units), 1),
+            "confidence": round(float(confidence), 2),
+        })
+
+    weekly_change = 7 * trend / level if level > 0 else 0.0
+    if weekly_change > TREND_THRESHOLD:
+        direction = "increasing"
+    elif weekly_change < -TREND_THRESHOLD:
+        direction = "decreasing"
+    else:
+        direction = "stable"
+
+    weekly_total = float(forecast[:7].sum())
+    recommended = math.ceil(weekly_total + SAFETY_Z * rmse * math.sqrt(min(7, len(forecast))))
+
+    factors = result["factors"][row]
+    if history_days < MIN_SEASONAL_DAYS:
+        insights = (
+            f"Only {history_days} days of sales history, so no day-of-week "
+            f"pattern is used yet. "
+        )
+    elif factors.max() < 1.1:
+        insights = "Sales are spread evenly over the week. "
+    else:
+        busiest = int(np.argmax(factors))
+        insights = f"Busiest day is {DAY_NAMES[busiest]} ({factors[busiest]:.1f}x an average day). "
+    insights += f"Demand is {direction} ({weekly_change:+.0%} per week)."
+
+    return {
+        "predictions": predictions,
+        "weekly_total": round(weekly_total, 1),
+        "trend": direction,
+        "recommended_stock_level": recommended,
+        "insights": insights,
+        "history_days": history_days,
+        "method": "exponential_smoothing",
+    }
+
+
+def forecast_demand(
+    sales_history: List[Dict[str, Any]],
+    horizon: int = 7,
+    as_of: Optional[str] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Forecast daily demand of every product in a sales history
+
+    Args:
+        sales_history: Rows with date, quantity and product_id (or
+            product_name)
+        horizon: Days to forecast
+        as_of: Last day of history (see sales_matrix)
+
+    Returns:
+        Forecast per product, in the demand prediction response format
+    """
+    return _forecast_daily(sales_matrix(sales_history, as_of), horizon)
+
+
+def forecast_columns(
+    products: List[str],
+    dates: List[Any],
+    quantities: List[Any],
+    horizon: int = 7,
+    as_of: Optional[str] = None
+) -> Dict[str, Dict[str, Any]]:
+    """
+    Forecast daily demand of every product in parallel sales columns (see
+    columns_matrix); cheaper to send to worker processes than row dicts
+
+    Returns:
+        Forecast per product, in the demand prediction response format
+    """
+    return _forecast_daily(columns_matrix(products, dates, quantities, as_of), horizon)
+
+
+def _forecast_daily(daily: pd.DataFrame, horizon: int) -> Dict[str, Dict[str, Any]]:
+    """Forecast and describe every product of a sales matrix"""
+    if daily.empty:
+        return {}
+    result = forecast_matrix(daily, horizon)
+    return {str(product): _describe(daily, result, row) for row, product in enumerate(daily.index)}
+
+
+def forecast_product(
+    sales_history: List[Dict[str, Any]],
+    horizon: int = 7,
+    as_of: Optional[str] = None
+) -> Optional[Dict[str, Any]]:
+    """
+    Forecast all rows of a sales history as one product
+
+    Returns:
+        Forecast in the demand prediction response format, or None if no
+        row has a valid date within the history window
+    """
+    rows = [{"date": row.get("date"), "quantity": row.get("quantity", 0)} for row in sales_history]
+    return forecast_demand(rows, horizon, as_of).get("*")
@@ -0,0 +1,117 @@
+"""
+Geo Utilities
+Vectorized distance computation shared by the location-aware agents
+"""
+
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+import numpy as np
+
+
+# Earth's radius in kilometers
+EARTH_RADIUS_KM = 6371.0
+
+
+def haversine_distances(
+    lat: float,
+    lng: float,
+    lats: Any,
+    lngs: Any
+) -> np.ndarray:
+    """
+    Calculate distances from one point to many points in a single vectorized pass
+
+    Args:
+        lat, lng: Origin coordinates in degrees
+        lats, lngs: Array-likes of target coordinates in degrees
+
+    Returns:
+        Distances in kilometers as a float array (unrounded)
+    """
+    lats_rad = np.radians(np.asarray(lats, dtype=np.float64))
+    lngs_rad = np.radians(np.asarray(lngs, dtype=np.float64))
+    lat_rad = np.radians(lat)
+    lng_rad = np.radians(lng)
+
+    dlat = lats_rad - lat_rad
+    dlng = lngs_rad - lng_rad
+
+    a = (np.sin(dlat / 2) ** 2 +
+         np.cos(lat_rad) * np.cos(lats_rad) *
+         np.sin(dlng / 2) ** 2)
+
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+
+def haversine_matrix(
+    lats_a: Any,
+    lngs_a: Any,
+    lats_b: Any,
+    lngs_b: Any
+) -> np.ndarray:
+    """
+    Calculate distances between every point of one set and every point of another
+
+    Args:
+        lats_a, lngs_a: Array-likes of N coordinates in degrees
+        lats_b, lngs_b: Array-likes of M coordinates in degrees
+
+    Returns:
+        N x M distance matrix in kilometers
+    """
+    lats_a = np.radians(np.asarray(lats_a, dtype=np.float64))[:, None]
+    lngs_a = np.radians(np.asarray(lngs_a, dtype=np.float64))[:, None]
+    lats_b = np.radians(np.asarray(lats_b, dtype=np.float64))[None, :]
+    lngs_b = np.radians(np.asarray(lngs_b, dtype=np.float64))[None, :]
+
+    a = (np.sin((lats_b - lats_a) / 2) ** 2 +
+         np.cos(lats_a) * np.cos(lats_b) *
+         np.sin((lngs_b - lngs_a) / 2) ** 2)
+
+    c = 2 * np.arctan2(np.sqrt(a), np.sqrt(1 - a))
+    return EARTH_RADIUS_KM * c
+
+
+def extract_coordinates(entity: Dict[str, Any]) -> Tuple[Optional[float], Optional[float]]:
+    """
+    Read coordinates from an entity payload
+
+    Supports both 'lat'/'lng' and 'latitude'/'longitude' formats, either at
+    the top level or nested under 'location'.
+
+    Args:
+        entity: Vendor, customer or delivery partner payload
+
+    Returns:
+        (lat, lng) tuple, with None for missing values
+    """
+    location = entity.get('location') or {}
+    lat = location.get('lat') or location.get('latitude') or entity.get('latitude') or entity.get('lat')
+    lng = location.get('lng') or location.get('longitude') or entity.get('longitude') or entity.get('lng')
+    return lat, lng
+
+
+def coordinate_arrays(
+    entities: Iterable[Dict[str, Any]]
+) -> Tuple[List[Dict[str, Any]], np.ndarray, np.ndarray]:
+    """
+    Split entities into those with coordinates and their coordinate arrays
+
+    Args:
+        entities: Entity payloads
+
+    Returns:
+        (located_entities, lats, lngs) - entities without coordinates are dropped
+    """
+    located = []
+    lats = []
+    lngs = []
+    for entity in entities:
+        lat, lng = extract_coordinates(entity)
+        if not lat or not lng:
+            continue
+        located.append(entity)
+        lats.append(float(lat))
+        lngs.append(float(lng))
+
+    return located, np.asarray(lats, dtype=np.float64), np.asarray(lngs, dtype=np.float64)
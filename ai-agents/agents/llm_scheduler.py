@@ -0,0 +1,181 @@
+"""
+LLM Scheduler
+Bounded-concurrency scheduling of Vertex AI calls with per-agent quotas and
+priority lanes, so checkout-critical calls are not queued behind analytics
+"""
+
+import asyncio
+import math
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Deque, Dict, Optional
+
+
+# Lanes in the order they are served
+PRIORITY_LANES = ('critical', 'normal', 'background')
+
+# Wait times kept per lane for percentile metrics
+WAIT_SAMPLE_SIZE = 500
+
+
+class _Waiter:
+    """A queued request for a slot"""
+
+    __slots__ = ('agent_name', 'future', 'enqueued_at')
+
+    def __init__(self, agent_name: str, future: "asyncio.Future[None]"):
+        self.agent_name = agent_name
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+
+class LLMScheduler:
+    """Grants model-call slots under a global cap and per-agent quotas"""
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        agent_quotas: Optional[Dict[str, int]] = None
+    ):
+        """
+        Initialize the scheduler
+
+        Args:
+            max_concurrency: Model calls allowed in flight across all agents
+            agent_quotas: Optional per-agent caps, by agent name
+        """
+        self.max_concurrency = max_concurrency
+        self.agent_quotas = agent_quotas or {}
+        self.running = 0
+        self._running_by_agent: Dict[str, int] = {}
+        self._queues: Dict[str, Deque[_Waiter]] = {lane: deque() for lane in PRIORITY_LANES}
+        self._waits: Dict[str, Deque[float]] = {
+            lane: deque(maxlen=WAIT_SAMPLE_SIZE) for lane in PRIORITY_LANES
+        }
+        self._granted: Dict[str, int] = {lane: 0 for lane in PRIORITY_LANES}
+
+    @classmethod
+    def from_env(cls, env: Dict[str, str]) -> "LLMScheduler":
+        """
+        Build a scheduler from environment settings
+
+        LLM_MAX_CONCURRENCY sets the global cap and LLM_AGENT_QUOTAS the
+        per-agent caps as 'Agent Name:limit' pairs separated by commas.
+        """
+        quotas = {}
+        for pair in env.get("LLM_AGENT_QUOTAS", "").split(","):
+            if ":" in pair:
+                agent_name, limit = pair.rsplit(":", 1)
+                quotas[agent_name.strip()] = int(limit)
+        return cls(int(env.get("LLM_MAX_CONCURRENCY", "8")), quotas)
+
+    @property
+    def saturated(self) -> bool:
+        """Whether every slot is taken or calls are queued"""
+        return self.running >= self.max_concurrency or any(self._queues.values())
+
+    def _has_capacity(self, agent_name: str) -> bool:
+        if self.running >= self.max_concurrency:
+            return False
+        quota = self.agent_quotas.get(agent_name)
+        return quota is None or self._running_by_agent.get(agent_name, 0) < quota
+
+    def _grant(self, agent_name: str, lane: str, waited: float) -> None:
+        self.running += 1
+        self._running_by_agent[agent_name] = self._running_by_agent.get(agent_name, 0) + 1
+        self._waits[lane].append(waited)
+        self._granted[lane] += 1
+
+    def _queued_ahead(self, lane: str) -> bool:
+        """Whether anything is queued in this lane or a more urgent one"""
+        for other in PRIORITY_LANES:
+            if self._queues[other]:
+                return True
+            if other == lane:
+                return False
+        return False
+
+    async def acquire(self, agent_name: str, priority: str = 'normal') -> None:
+        """
+        Wait for a slot
+
+        Args:
+            agent_name: Agent making the call (for quotas)
+            priority: One of 'critical', 'normal', 'background'
+        """
+        lane = priority if priority in self._queues else 'normal'
+
+        if not self._queued_ahead(lane) and self._has_capacity(agent_name):
+            self._grant(agent_name, lane, 0.0)
+            return
+
+        waiter = _Waiter(agent_name, asyncio.get_running_loop().create_future())
+        self._queues[lane].append(waiter)
+        # Slots may be free for this agent even if other agents' waiters are stuck on quota
+        self._dispatch()
+        try:
+            await waiter.future
+        except asyncio.CancelledError:
+            if waiter.future.done() and not waiter.future.cancelled():
+                # Granted just as the caller went away: hand the slot on
+                self.release(agent_name)
+            elif waiter in self._queues[lane]:
+                # (a cancelled waiter may already have been dropped by _dispatch)
+                self._queues[lane].remove(waiter)
+            raise
+
+    def release(self, agent_name: str) -> None:
+        """Return a slot and wake the next eligible waiters"""
+        self.running -= 1
+        self._running_by_agent[agent_name] -= 1
+        self._dispatch()
+
+    def _dispatch(self) -> None:
+        """Grant free slots to waiters, most urgent lane first"""
+        now = time.monotonic()
+        for lane in PRIORITY_LANES:
+            queue = self._queues[lane]
+            for waiter in list(queue):
+                if waiter.future.done():
+                    # Cancelled but its acquire() has not run yet; never grant it
+                    queue.remove(waiter)
+                    continue
+                if self.running >= self.max_concurrency:
+                    return
+                if not self._has_capacity(waiter.agent_name):
+                    # Over its agent quota; let other agents' calls through
+                    continue
+                queue.remove(waiter)
+                self._grant(waiter.agent_name, lane, now - waiter.enqueued_at)
+                waiter.future.set_result(None)
+
+    @asynccontextmanager
+    async def slot(self, agent_name: str, priority: str = 'normal') -> AsyncIterator[None]:
+        """Hold a slot for the duration of a model call"""
+        await self.acquire(agent_name, priority)
+        try:
+            yield
+        finally:
+            self.release(agent_name)
+
+    def metrics(self) -> Dict[str, Any]:
+        """Get queue depth, in-flight calls and wait times per lane"""
+        lanes = {}
+        for lane in PRIORITY_LANES:
+            waits = sorted(self._waits[lane])
+            lanes[lane] = {
+                "queue_depth": len(self._queues[lane]),
+                "granted": self._granted[lane],
+                "avg_wait_ms": round(1000 * sum(waits) / len(waits), 2) if waits else 0.0,
+                "p95_wait_ms": round(1000 * waits[math.ceil(0.95 * len(waits)) - 1], 2) if waits else 0.0,
+                "max_wait_ms": round(1000 * waits[-1], 2) if waits else 0.0
+            }
+
+        return {
+            "max_concurrency": self.max_concurrency,
+            "in_flight": self.running,
+            "in_flight_by_agent": {k: v for k, v in self._running_by_agent.items() if v},
+            "agent_quotas": self.agent_quotas,
+            "lanes": lanes
+        }
@@ -4,9 +4,25 @@ Matches customers, vendors, and delivery partners based on geographic proximity
 Uses 5km radius for service area matching
 """
 
-from typing import Dict, Any, List, Tuple
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime
 import math
+import numpy as np
 from .base_agent import BaseAgent
+from .geo import haversine_distances, coordinate_arrays, extract_coordinates
+from .spatial_index import SpatialGridIndex
+
+
+# Entity types kept in the matcher's spatial indexes
+ENTITY_TYPES = ('vendor', 'customer', 'delivery_partner')
+
+# Numeric ping timestamps this large are epoch milliseconds (seconds would
+# be after the year 5000)
+EPOCH_MILLISECONDS_FROM = 1e11
+
+# Added to the service radius so entities whose distance rounds down onto
+# the boundary (to 2 decimals) are still found
+BOUNDARY_PAD_KM = 0.005
 
 
 class LocationMatcherAgent(BaseAgent):
@@ -15,6 +31,15 @@ class LocationMatcherAgent(BaseAgent):
     def __init__(self):
         super().__init__("Location Matcher Agent")
         self.service_radius_km = 5.0  # 5km radius
+        
+        # Grid cells sized to the padded query radius so a query scans 3 rows
+        self.spatial_indexes = {
+            entity_type: SpatialGridIndex(cell_size_km=self.service_radius_km + BOUNDARY_PAD_KM)
+            for entity_type in ENTITY_TYPES
+        }
+        
+        # Latest ping time per delivery partner, used to drop out-of-order pings
+        self._last_ping_at: Dict[str, float] = {}
     
     def calculate_distance(
         self,
@@ -78,10 +103,262 @@ class LocationMatcherAgent(BaseAgent):
         )
         return distance <= self.service_radius_km
     
+    def calculate_distances(
+        self,
+        lat: float,
+        lng: float,
+        entities: List[Dict[str, Any]]
+    ) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """
+        Calculate distances from one location to many entities in one vectorized pass
+        
+        Args:
+            lat, lng: Origin coordinates
+            entities: Vendors, customers or partners with their locations
+            
+        Returns:
+            (located_entities, distances) - distances in km rounded to 2 decimals,
+            entities without coordinates are skipped
+        """
+        located, lats, lngs = coordinate_arrays(entities)
+        if not located:
+            return [], np.empty(0)
+        
+        distances = np.round(haversine_distances(lat, lng, lats, lngs), 2)
+        return located, distances
+    
+    def _get_index(self, entity_type: str) -> SpatialGridIndex:
+        """Get the spatial index for an entity type"""
+        if entity_type not in self.spatial_indexes:
+            raise ValueError(
+                f"Unknown entity type '{entity_type}', expected one of {', '.join(ENTITY_TYPES)}"
+            )
+        return self.spatial_indexes[entity_type]
+    
+    def upsert_entities(
+        self,
+        entity_type: str,
+        entities: List[Dict[str, Any]]
+    ) -> Dict[str, Any]:
+        """
+        Register entities (or update registered ones) in the matcher's store
+        
+        Updates are merged into the registered payload, so partial updates
+        such as {id, active_orders} keep the previously registered location.
+        
+        Args:
+            entity_type: One of 'vendor', 'customer', 'delivery_partner'
+            entities: Entities with 'id' and, for new entities, a location
+            
+        Returns:
+            Upserted count and the entities that were skipped
+        """
+        index = self._get_index(entity_type)
+        upserted = 0
+        skipped = []
+        
+        for entity in entities:
+            entity_id = entity.get('id')
+            if entity_id is None:
+                skipped.append({"entity": entity, "reason": "missing id"})
+                continue
+            
+            entity_id = str(entity_id)
+            existing = index.get(entity_id)
+            payload = {**existing, **entity} if existing else dict(entity)
+            
+            lat, lng = extract_coordinates(entity)
+            if not lat or not lng:
+                lat, lng = extract_coordinates(payload)
+            if not lat or not lng:
+                skipped.append({"id": entity_id, "reason": "missing location"})
+                continue
+            
+            index.upsert(entity_id, float(lat), float(lng), payload)
+            upserted += 1
+        
+        return {
+            "entity_type": entity_type,
+            "upserted": upserted,
+            "skipped": skipped,
+            "total_registered": len(index)
+        }
+    
+    def delete_entities(
+        self,
+        entity_type: str,
+        entity_ids: List[str]
+    ) -> Dict[str, Any]:
+        """
+        Remove registered entities from the matcher's store
+        
+        Args:
+            entity_type: One of 'vendor', 'customer', 'delivery_partner'
+            entity_ids: IDs to remove
+            
+        Returns:
+            Deleted count and IDs that were not registered
+        """
+        index = self._get_index(entity_type)
+        deleted = 0
+        not_found = []
+        
+        for entity_id in entity_ids:
+            if entity_type == 'delivery_partner':
+                self._last_ping_at.pop(str(entity_id), None)
+            if index.remove(str(entity_id)):
+                deleted += 1
+            else:
+                not_found.append(entity_id)
+        
+        return {
+            "entity_type": entity_type,
+            "deleted": deleted,
+            "not_found": not_found,
+            "total_registered": len(index)
+        }
+    
+    def get_registered_counts(self) -> Dict[str, int]:
+        """Get the number of registered entities per type"""
+        return {
+            entity_type: len(index)
+            for entity_type, index in self.spatial_indexes.items()
+        }
+    
+    def ingest_location_pings(self, pings: List[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Apply a batch of live position pings from delivery partners
+        
+        Each ping moves the partner within the spatial index in place, so
+        assignment sees fresh positions without re-registering the fleet.
+        Unknown partners are registered from the ping itself.
+        
+        Args:
+            pings: [{id, lat, lng, timestamp?}] - timestamp as ISO string or
+                epoch seconds/milliseconds; pings older than the last applied
+                one are dropped, malformed ones are reported as invalid
+            
+        Returns:
+            Counts of applied, stale and invalid pings
+        """
+        index = self.spatial_indexes['delivery_partner']
+        applied = 0
+        stale = 0
+        invalid = []
+        
+        for ping in pings:
+            partner_id = ping.get('id') if isinstance(ping, dict) else None
+            try:
+                if partner_id is None:
+                    raise ValueError("missing partner id")
+                partner_id = str(partner_id)
+                lat, lng = extract_coordinates(ping)
+                if not lat or not lng:
+                    raise ValueError("missing coordinates")
+                lat, lng = float(lat), float(lng)
+                if not (-90 <= lat <= 90 and -180 <= lng <= 180):
+                    raise ValueError("coordinates out of range")
+                pinged_at = self._ping_timestamp(ping.get('timestamp'))
+                updated_at = datetime.fromtimestamp(pinged_at).isoformat()
+            except (TypeError, ValueError, OverflowError, OSError):
+                invalid.append(partner_id)
+                continue
+            
+            if pinged_at < self._last_ping_at.get(partner_id, float('-inf')):
+                stale += 1
+                continue
+            
+            payload = index.get(partner_id)
+            if payload is None:
+                index.upsert(partner_id, lat, lng, {'id': partner_id, 'lat': lat, 'lng': lng})
+                payload = index.get(partner_id)
+            else:
+                index.upsert(partner_id, lat, lng)
+                self._apply_location(payload, lat, lng)
+            
+            self._last_ping_at[partner_id] = pinged_at
+            payload['location_updated_at'] = updated_at
+            applied += 1
+        
+        return {
+            "applied": applied,
+            "stale": stale,
+            "invalid": invalid,
+            "total_registered": len(index)
+        }
+    
+    def _ping_timestamp(self, value: Any) -> float:
+        """
+        Convert a ping timestamp (ISO string, epoch seconds or milliseconds,
+        or None for now) to epoch seconds
+        """
+        if value is None:
+            return datetime.now().timestamp()
+        if isinstance(value, bool):
+            raise TypeError("timestamp must be a number or ISO string")
+        if isinstance(value, (int, float)):
+            seconds = float(value)
+            # JavaScript clients send Date.now() milliseconds
+            if abs(seconds) >= EPOCH_MILLISECONDS_FROM:
+                seconds /= 1000
+            return seconds
+        return datetime.fromisoformat(value).timestamp()
+    
+    def _apply_location(self, payload: Dict[str, Any], lat: float, lng: float) -> None:
+        """Overwrite every coordinate field present in a registered payload"""
+        location = payload.get('location')
+        if isinstance(location, dict):
+            location = dict(location)
+            for lat_key, lng_key in (('lat', 'lng'), ('latitude', 'longitude')):
+                if lat_key in location or lng_key in location:
+                    location[lat_key] = lat
+                    location[lng_key] = lng
+            payload['location'] = location
+        
+        if 'latitude' in payload or 'longitude' in payload:
+            payload['latitude'] = lat
+            payload['longitude'] = lng
+        payload['lat'] = lat
+        payload['lng'] = lng
+    
+    def find_within_radius(
+        self,
+        lat: float,
+        lng: float,
+        entities: Optional[List[Dict[str, Any]]],
+        entity_type: str
+    ) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """
+        Find entities within the service radius of a location
+        
+        Queries the registered entity store through its spatial index, so only
+        neighbouring grid cells are touched. An entity list sent with the
+        request takes precedence and is scanned instead.
+        
+        Args:
+            lat, lng: Center coordinates
+            entities: Entities from the request (even an empty list), or None
+                to use the store
+            entity_type: Store to query when no entities are given
+            
+        Returns:
+            (entities, distances) within radius, distances rounded to 2 decimals
+        """
+        if entities is not None:
+            located, distances = self.calculate_distances(lat, lng, entities)
+        else:
+            located, distances = self._get_index(entity_type).query_radius(
+                lat, lng, self.service_radius_km + BOUNDARY_PAD_KM
+            )
+            distances = np.round(distances, 2)
+        
+        within = np.flatnonzero(distances <= self.service_radius_km)
+        return [located[i] for i in within], distances[within]
+    
     async def get_nearby_vendors(
         self,
         customer_location: Dict[str, float],
-        all_vendors: List[Dict[str, Any]]
+        all_vendors: Optional[List[Dict[str, Any]]] = None
     ) -> Dict[str, Any]:
         """
         Get vendors within 5km radius of customer
@@ -89,6 +366,7 @@ class LocationMatcherAgent(BaseAgent):
         Args:
             customer_location: {lat, lng} of customer
             all_vendors: List of all vendors with their locations
+                (registered vendors are used when omitted)
             
         Returns:
             Filtered vendors with distance information
@@ -102,29 +380,18 @@ class LocationMatcherAgent(BaseAgent):
                 "nearby_vendors": []
             }
         
-        nearby_vendors = []
+        vendors, distances = self.find_within_radius(
+            customer_lat, customer_lng, all_vendors, 'vendor'
+        )
         
-        for vendor in all_vendors:
-            # Support both 'lat'/'lng' and 'latitude'/'longitude' formats
-            vendor_location = vendor.get('location', {})
-            vendor_lat = vendor_location.get('lat') or vendor_location.get('latitude') or vendor.get('latitude') or vendor.get('lat')
-            vendor_lng = vendor_location.get('lng') or vendor_location.get('longitude') or vendor.get('longitude') or vendor.get('lng')
-            
-            if not vendor_lat or not vendor_lng:
-                continue
-            
-            distance = self.calculate_distance(
-                customer_lat, customer_lng,
-                vendor_lat, vendor_lng
-            )
-            
-            if distance <= self.service_radius_km:
-                vendor_info = {
-                    **vendor,
-                    'distance_km': distance,
-                    'within_service_area': True
-                }
-                nearby_vendors.append(vendor_info)
+        nearby_vendors = [
+            {
+                **vendor,
+                'distance_km': float(distance),
+                'within_service_area': True
+            }
+            for vendor, distance in zip(vendors, distances)
+        ]
         
         # Sort by distance (closest first)
         nearby_vendors.sort(key=lambda x: x['distance_km'])
@@ -171,7 +438,7 @@ Respond in JSON format.
     async def get_nearby_delivery_partners(
         self,
         pickup_location: Dict[str, float],
-        all_partners: List[Dict[str, Any]]
+        all_partners: Optional[List[Dict[str, Any]]] = None
     ) -> Dict[str, Any]:
         """
         Get delivery partners within 5km radius of pickup location
@@ -179,6 +446,7 @@ Respond in JSON format.
         Args:
             pickup_location: {lat, lng} of pickup point
             all_partners: List of all delivery partners
+                (registered partners are used when omitted)
             
         Returns:
             Filtered partners with distance and ETA
@@ -192,33 +460,23 @@ Respond in JSON format.
                 "nearby_partners": []
             }
         
-        nearby_partners = []
+        partners, distances = self.find_within_radius(
+            pickup_lat, pickup_lng, all_partners, 'delivery_partner'
+        )
         
-        for partner in all_partners:
-            # Support both 'lat'/'lng' and 'latitude'/'longitude' formats
-            partner_location = partner.get('location', {})
-            partner_lat = partner_location.get('lat') or partner_location.get('latitude') or partner.get('latitude') or partner.get('lat')
-            partner_lng = partner_location.get('lng') or partner_location.get('longitude') or partner.get('longitude') or partner.get('lng')
-            
-            if not partner_lat or not partner_lng:
-                continue
-            
-            distance = self.calculate_distance(
-                pickup_lat, pickup_lng,
-                partner_lat, partner_lng
-            )
+        nearby_partners = []
+        for partner, distance in zip(partners, distances):
+            distance = float(distance)
+            # Estimate pickup time (assuming 20 km/h average speed)
+            estimated_pickup_time = int((distance / 20) * 60)  # minutes
             
-            if distance <= self.service_radius_km:
-                # Estimate pickup time (assuming 20 km/h average speed)
-                estimated_pickup_time = int((distance / 20) * 60)  # minutes
-                
-                partner_info = {
-                    **partner,
-                    'distance_km': distance,
-                    'estimated_pickup_time_mins': estimated_pickup_time,
-                    'within_service_area': True
-                }
-                nearby_partners.append(partner_info)
+            partner_info = {
+                **partner,
+                'distance_km': distance,
+                'estimated_pickup_time_mins': estimated_pickup_time,
+                'within_service_area': True
+            }
+            nearby_partners.append(partner_info)
         
         # Sort by distance and availability
         nearby_partners.sort(key=lambda x: (
@@ -303,18 +561,19 @@ Respond in JSON format.
     async def get_area_statistics(
         self,
         center_location: Dict[str, float],
-        all_vendors: List[Dict],
-        all_customers: List[Dict],
-        all_delivery_partners: List[Dict]
+        all_vendors: Optional[List[Dict]] = None,
+        all_customers: Optional[List[Dict]] = None,
+        all_delivery_partners: Optional[List[Dict]] = None
     ) -> Dict[str, Any]:
         """
         Get statistics about a specific area
         
         Args:
             center_location: Center point of area
-            all_vendors: All vendors in system
-            all_customers: All customers in system
+            all_vendors: All vendors in system (registered vendors if omitted)
+            all_customers: All customers in system (registered customers if omitted)
             all_delivery_partners: All delivery partners in system
+                (registered partners if omitted)
             
         Returns:
             Area statistics and insights
@@ -323,29 +582,15 @@ Respond in JSON format.
         center_lng = center_location['lng']
         
         # Count entities within 5km radius
-        vendors_in_area = sum(
-            1 for v in all_vendors
-            if self.is_within_service_area(
-                center_lat, center_lng,
-                v.get('latitude', 0), v.get('longitude', 0)
-            )
-        )
-        
-        customers_in_area = sum(
-            1 for c in all_customers
-            if self.is_within_service_area(
-                center_lat, center_lng,
-                c.get('latitude', 0), c.get('longitude', 0)
-            )
-        )
-        
-        partners_in_area = sum(
-            1 for p in all_delivery_partners
-            if self.is_within_service_area(
-                center_lat, center_lng,
-                p.get('latitude', 0), p.get('longitude', 0)
-            )
-        )
+        vendors_in_area = len(self.find_within_radius(
+            center_lat, center_lng, all_vendors, 'vendor'
+        )[0])
+        customers_in_area = len(self.find_within_radius(
+            center_lat, center_lng, all_customers, 'customer'
+        )[0])
+        partners_in_area = len(self.find_within_radius(
+            center_lat, center_lng, all_delivery_partners, 'delivery_partner'
+        )[0])
         
         # Use AI for insights
         prompt = f"""
@@ -0,0 +1,225 @@
+"""
+Micro Batcher
+Collects small, compatible prompts over a short window and sends them to
+the model as one multi-item request, fanning the answers back to callers
+"""
+
+import asyncio
+import contextvars
+import json
+import time
+from typing import Any, Awaitable, Callable, Dict, Hashable, List, Optional, Tuple
+
+from .call_policy import deadline, remaining_time
+
+
+# Output token ceiling for a combined request
+MAX_BATCH_OUTPUT_TOKENS = 8192
+
+# Sends (prompt, max_tokens) to the model and returns the text; raises on error
+SendFn = Callable[[str, int], Awaitable[str]]
+
+
+class _Batch:
+    """Prompts waiting to be sent together"""
+
+    __slots__ = ('send', 'max_tokens', 'items', 'timer')
+
+    def __init__(self, send: SendFn, max_tokens: int):
+        self.send = send
+        self.max_tokens = max_tokens
+        # (prompt, caller's future, caller's monotonic deadline or None)
+        self.items: List[Tuple[str, "asyncio.Future[str]", Optional[float]]] = []
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+
+def build_batch_prompt(prompts: List[str]) -> str:
+    """
+    Combine independent prompts into one request for a JSON array of answers
+
+    Args:
+        prompts: Prompts that each ask for a JSON object
+
+    Returns:
+        Combined prompt
+    """
+    tasks = "\n\n".join(
+        f"### Task {i}\n{prompt.strip()}" for i, prompt in enumerate(prompts, 1)
+    )
+    return f"""You will be given {len(prompts)} independent tasks.
+Complete each task on its own, exactly as instructed in it.
+
+{tasks}
+
+**Response Format:**
+Respond with a single JSON array of exactly {len(prompts)} elements, where
+element i is the JSON response to Task i. Do not add any other text.
+"""
+
+
+def split_batch_response(response: str, expected: int) -> Optional[List[str]]:
+    """
+    Split a combined response into per-task JSON strings
+
+    Args:
+        response: Model output for a build_batch_prompt request
+        expected: Number of tasks in the batch
+
+    Returns:
+        One JSON string per task, or None if the output is not a JSON array
+        of the expected length
+    """
+    text = response.strip()
+    if "```" in text:
+        text = text.split("```")[1]
+        if text.startswith("json"):
+            text = text[4:]
+    try:
+        items = json.loads(text)
+    except ValueError:
+        return None
+
+    if not isinstance(items, list) or len(items) != expected:
+        return None
+    return [json.dumps(item) for item in items]
+
+
+class MicroBatcher:
+    """Groups concurrent prompts by compatibility key and sends them together"""
+
+    def __init__(self, window_ms: float = 0.0, max_batch_size: int = 8):
+        """
+        Initialize the batcher
+
+        Args:
+            window_ms: How long the first prompt of a batch waits for others
+                (0 disables batching)
+            max_batch_size: Prompts sent in one request at most
+        """
+        self.window_ms = window_ms
+        self.max_batch_size = max_batch_size
+        self._pending: Dict[Hashable, _Batch] = {}
+        self.batches_sent = 0
+        self.prompts_batched = 0
+        self.fallbacks = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.window_ms > 0 and self.max_batch_size > 1
+
+    async def submit(
+        self,
+        key: Hashable,
+        prompt: str,
+        max_tokens: int,
+        send: SendFn
+    ) -> str:
+        """
+        Queue a prompt and wait for its answer
+
+        Args:
+            key: Prompts are only combined with others under the same key
+                (same model, temperature and priority)
+            prompt: Prompt asking for a JSON response
+            max_tokens: Output tokens for this prompt alone
+            send: Coroutine function sending a prompt to the model
+
+        Returns:
+            Response text for this prompt
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        batch = self._pending.get(key)
+        if batch is None:
+            batch = _Batch(send, max_tokens)
+            batch.timer = loop.call_later(self.window_ms / 1000, self._flush, key)
+            self._pending[key] = batch
+        # Each caller's own deadline also bounds the individual fallback
+        left = remaining_time()
+        expires_at = None if left is None else time.monotonic() + left
+        batch.items.append((prompt, future, expires_at))
+
+        if len(batch.items) >= self.max_batch_size:
+            self._flush(key)
+
+        return await future
+
+    def _flush(self, key: Hashable) -> None:
+        """Send the pending batch for a key"""
+        batch = self._pending.pop(key, None)
+        if batch is None:
+            return
+        if batch.timer is not None:
+            batch.timer.cancel()
+        # Start from an empty context so no single caller's deadline leaks
+        # into the batch; _send_batch applies the callers' deadlines itself
+        contextvars.Context().run(asyncio.ensure_future, self._send_batch(batch))
+
+    async def _send_batch(self, batch: _Batch) -> None:
+        """Send a batch and resolve each caller's future"""
+        prompts = [prompt for prompt, _, _ in batch.items]
+        futures = [future for _, future, _ in batch.items]
+
+        if len(prompts) == 1:
+            await self._send_each(batch)
+            return
+
+        # The combined request must finish within every caller's deadline
+        deadlines = [expires_at for _, _, expires_at in batch.items if expires_at is not None]
+        try:
+            with deadline(min(deadlines) - time.monotonic() if deadlines else None):
+                response = await batch.send(
+                    build_batch_prompt(prompts),
+                    min(batch.max_tokens * len(prompts), MAX_BATCH_OUTPUT_TOKENS)
+                )
+            answers = split_batch_response(response, len(prompts))
+        except Exception as e:
+            print(f"Error sending batched prompts: {e}")
+            answers = None
+
+        if answers is None:
+            # Malformed combined output: answer every prompt on its own
+            self.fallbacks += 1
+            await self._send_each(batch)
+            return
+
+        self.batches_sent += 1
+        self.prompts_batched += len(prompts)
+        for future, answer in zip(futures, answers):
+            if not future.done():
+                future.set_result(answer)
+
+    async def _send_one(
+        self,
+        batch: _Batch,
+        prompt: str,
+        expires_at: Optional[float]
+    ) -> str:
+        """Send one prompt within what is left of its caller's deadline"""
+        with deadline(None if expires_at is None else expires_at - time.monotonic()):
+            return await batch.send(prompt, batch.max_tokens)
+
+    async def _send_each(self, batch: _Batch) -> None:
+        """Send prompts individually, passing errors to their callers"""
+        results = await asyncio.gather(
+            *(self._send_one(batch, prompt, expires_at) for prompt, _, expires_at in batch.items),
+            return_exceptions=True
+        )
+        for (_, future, _), result in zip(batch.items, results):
+            if future.done():
+                continue
+            if isinstance(result, BaseException):
+                future.set_exception(result)
+            else:
+                future.set_result(result)
+
+    def stats(self) -> Dict[str, Any]:
+        """Get batching statistics"""
+        return {
+            "window_ms": self.window_ms,
+            "max_batch_size": self.max_batch_size,
+            "batches_sent": self.batches_sent,
+            "prompts_batched": self.prompts_batched,
+            "fallbacks": self.fallbacks
+        }
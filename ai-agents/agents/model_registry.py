@@ -0,0 +1,81 @@
+"""
+Model Registry
+Shared, lazily-initialized Vertex AI client and generative models
+"""
+
+import os
+import threading
+from typing import Any, Dict, Optional
+
+
+class ModelRegistry:
+    """Initializes Vertex AI once and shares one model instance per model name"""
+
+    def __init__(self):
+        self.project_id = os.getenv("GCP_PROJECT_ID", "the-local-loop")
+        self.location = os.getenv("GCP_LOCATION", "us-central1")
+        self._lock = threading.Lock()
+        self._initialized = False
+        self._init_error: Optional[Exception] = None
+        self._models: Dict[str, Any] = {}
+
+    @property
+    def available(self) -> bool:
+        """Whether Vertex AI initialized successfully (False until first use)"""
+        return self._initialized and self._init_error is None
+
+    def _ensure_initialized(self) -> bool:
+        """Import and initialize Vertex AI on first use"""
+        if self._initialized:
+            return self._init_error is None
+
+        with self._lock:
+            if not self._initialized:
+                try:
+                    # Imported here: the SDK import alone adds seconds to cold start
+                    import vertexai
+                    vertexai.init(project=self.project_id, location=self.location)
+                    print(f"✅ Vertex AI initialized ({self.project_id}, {self.location})")
+                except Exception as e:
+                    self._init_error = e
+                    print(f"⚠️  Warning: Could not initialize Vertex AI: {e}")
+                    print(f"   Agents will run in mock mode")
+                self._initialized = True
+
+        return self._init_error is None
+
+    def get_model(self, model_name: str) -> Optional[Any]:
+        """
+        Get the shared GenerativeModel for a model name
+
+        Args:
+            model_name: Vertex AI model name
+
+        Returns:
+            GenerativeModel, or None if Vertex AI is unavailable (mock mode)
+        """
+        if model_name in self._models:
+            return self._models[model_name]
+
+        if not self._ensure_initialized():
+            return None
+
+        with self._lock:
+            if model_name not in self._models:
+                try:
+                    from vertexai.generative_models import GenerativeModel
+                    self._models[model_name] = GenerativeModel(model_name)
+                except Exception as e:
+                    # Remember the failure so every call does not retry and warn
+                    print(f"⚠️  Warning: Could not load model {model_name}: {e}")
+                    self._models[model_name] = None
+            return self._models[model_name]
+
+    def generation_config(self, **kwargs: Any) -> Any:
+        """Build a GenerationConfig without importing the SDK at module load"""
+        from vertexai.generative_models import GenerationConfig
+        return GenerationConfig(**kwargs)
+
+
+# Shared by every agent in the process
+model_registry = ModelRegistry()
@@ -0,0 +1,123 @@
+"""
+Prompt Templates
+Prompts compiled once at import, with list sections trimmed to a token budget
+"""
+
+import os
+from string import Formatter
+from typing import Any, Dict, Iterable, List, Optional, Sequence, Tuple
+
+
+# Token budget for each list section (products, sales history, ...) of a prompt
+DEFAULT_SECTION_BUDGET = int(os.getenv("PROMPT_SECTION_TOKEN_BUDGET", "600"))
+
+# Average characters per token for Gemini on English/JSON-like text
+CHARS_PER_TOKEN = 4
+
+
+def estimate_tokens(text: str) -> int:
+    """Fast token estimate (no tokenizer call)"""
+    return -(-len(text) // CHARS_PER_TOKEN)
+
+
+def fit_lines(
+    lines: Iterable[str],
+    budget_tokens: int,
+    overflow: str = "- ... {count} more not shown"
+) -> str:
+    """
+    Join lines until the token budget is used up
+
+    Args:
+        lines: Formatted lines, most important first
+        budget_tokens: Tokens the section may use
+        overflow: Line appended when lines are dropped ({count} is filled in)
+
+    Returns:
+        The lines that fit, newline-joined, plus the overflow line if any
+        were dropped
+    """
+    lines = list(lines)
+    kept: List[str] = []
+    used = 0
+    for line in lines:
+        cost = estimate_tokens(line) + 1
+        if used + cost > budget_tokens:
+            break
+        kept.append(line)
+        used += cost
+
+    dropped = len(lines) - len(kept)
+    if dropped:
+        kept.append(overflow.format(count=dropped))
+    return "\n".join(kept)
+
+
+class PromptTemplate:
+    """
+    A prompt parsed once into literal text and named fields
+
+    Fields use str.format syntax ({name}; literal braces as {{ and }}).
+    Values for section fields may be sequences of lines, which are trimmed
+    to the section's token budget when rendering.
+    """
+
+    def __init__(
+        self,
+        template: str,
+        sections: Iterable[str] = (),
+        budgets: Optional[Dict[str, int]] = None
+    ):
+        """
+        Compile a template
+
+        Args:
+            template: Prompt text with {field} placeholders
+            sections: Fields holding lists of lines
+            budgets: Token budgets for sections that should not use
+                PROMPT_SECTION_TOKEN_BUDGET
+        """
+        self._parts: List[Tuple[str, Optional[str]]] = []
+        for literal, field, spec, conversion in Formatter().parse(template):
+            if spec or conversion:
+                raise ValueError(f"Unsupported format spec in prompt field {field!r}")
+            self._parts.append((literal, field))
+
+        self.fields = {field for _, field in self._parts if field is not None}
+        self.budgets = {name: DEFAULT_SECTION_BUDGET for name in sections}
+        self.budgets.update(budgets or {})
+        unknown = set(self.budgets) - self.fields
+        if unknown:
+            raise ValueError(f"Budgeted sections not in template: {sorted(unknown)}")
+
+        # Text before the first field never changes between calls
+        prefix = []
+        for literal, field in self._parts:
+            prefix.append(literal)
+            if field is not None:
+                break
+        self.static_prefix = "".join(prefix)
+        self.static_tokens = estimate_tokens(
+            "".join(literal for literal, _ in self._parts)
+        )
+
+    def render(self, **values: Any) -> str:
+        """
+        Fill in the template
+
+        Args:
+            **values: One value per field; section fields may be line lists
+
+        Returns:
+            Prompt text
+        """
+        out = []
+        for literal, field in self._parts:
+            out.append(literal)
+            if field is None:
+                continue
+            value = values[field]
+            if field in self.budgets and isinstance(value, Sequence) and not isinstance(value, str):
+                value = fit_lines(value, self.budgets[field])
+            out.append(str(value))
+        return "".join(out)
@@ -0,0 +1,401 @@
+"""
+Recommendation Engine
+Product recommendations from co-purchase embeddings held in a vector index,
+so every suggestion is a real catalog product
+"""
+
+from collections import Counter
+from itertools import combinations
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .vector_index import VectorIndex, normalize_rows
+
+
+# Items of one order, and most recent distinct items of one customer,
+# considered for co-purchase pairs; more add little signal and
+# quadratically many pairs
+MAX_BASKET_ITEMS = 50
+MAX_CUSTOMER_ITEMS = 20
+
+# Pairs with less total weight are dropped as coincidence (one shared
+# order is enough; customer-level pairs need several customers)
+MIN_PAIR_WEIGHT = 1.0
+
+# Weight of a history item relative to the one bought just after it
+# (history is most recent first)
+RECENCY_DECAY = 0.85
+
+# Weaker matches are unrelated products; popular ones are used instead
+MIN_SIMILARITY = 0.05
+
+
+def _product_id(item: Dict[str, Any]) -> Optional[str]:
+    value = item.get("product_id") or item.get("productId") or item.get("id")
+    return str(value) if value is not None else None
+
+
+class RecommendationIndex:
+    """Item embeddings and popularity built from one snapshot of order history"""
+
+    def __init__(
+        self,
+        orders: List[Dict[str, Any]],
+        products: Optional[List[Dict[str, Any]]] = None,
+        dim: int = 64,
+        customer_weight: float = 0.25,
+        hnsw_neighbors: int = 0,
+        seed: int = 0
+    ):
+        """
+        Build the index
+
+        Args:
+            orders: Orders as {"order_id", "customer_id", "area_id"?,
+                "items": [{"product_id", "product_name"?, "category"?}]}
+            products: Catalog as {"id", "name", "category", "price",
+                "area_id"?, "is_available"?, "stock"?}; products only seen
+                in orders are added with what the order items say
+            dim: Embedding dimension
+            customer_weight: Weight of two items bought by the same customer
+                in different orders, relative to the same order
+            hnsw_neighbors: Use an approximate HNSW index (see VectorIndex)
+            seed: Seed of the random projection
+        """
+        self.products: Dict[str, Dict[str, Any]] = {}
+        for product in products or []:
+            product_id = _product_id(product)
+            if product_id is not None:
+                self.products[product_id] = self._catalog_entry(product_id, product)
+
+        popularity: Counter = Counter()
+        area_popularity: Dict[str, Counter] = {}
+        baskets: List[List[str]] = []
+        customer_items: Dict[str, Dict[str, None]] = {}
+        for order in orders:
+            basket = []
+            for item in order.get("items", []):
+                product_id = _product_id(item)
+                if product_id is None:
+                    continue
+                if product_id not in self.products:
+                    self.products[product_id] = self._catalog_entry(product_id, item)
+                if product_id not in basket:
+                    basket.append(product_id)
+            if not basket:
+                continue
+
+            popularity.update(basket)
+            if order.get("area_id"):
+                area_popularity.setdefault(str(order["area_id"]), Counter()).update(basket)
+            baskets.append(basket[:MAX_BASKET_ITEMS])
+            if order.get("customer_id"):
+                seen = customer_items.setdefault(str(order["customer_id"]), {})
+                seen.update(dict.fromkeys(basket))
+
+        self.ids = sorted(self.products)
+        self.positions = {product_id: i for i, product_id in enumerate(self.ids)}
+        self.popularity = popularity
+        self.area_popularity = area_popularity
+        self.order_count = len(baskets)
+
+        pairs, weights = self._co_purchase_pairs(
+            baskets, customer_items.values(), customer_weight
+        )
+        self.vectors = self._embed(pairs, weights, dim, seed)
+        self.name_positions = {
+            self.products[product_id]["name"].lower(): i
+            for i, product_id in enumerate(self.ids)
+            if self.products[product_id]["name"]
+        }
+
+        embedded = np.flatnonzero(np.abs(self.vectors).sum(axis=1) > 0)
+        self.index = VectorIndex(dim, hnsw_neighbors=hnsw_neighbors)
+        if len(embedded):
+            self.index.add(embedded.tolist(), self.vectors[embedded])
+        self.pair_count = len(pairs)
+
+    @staticmethod
+    def _catalog_entry(product_id: str, source: Dict[str, Any]) -> Dict[str, Any]:
+        stock = source.get("stock")
+        return {
+            "product_id": product_id,
+            "name": source.get("name") or source.get("product_name") or "",
+            "category": source.get("category") or "Other",
+            "price": source.get("price"),
+            "vendor_id": source.get("vendor_id") or source.get("vendorId"),
+            "area_id": source.get("area_id") or source.get("areaId"),
+            "available": bool(source.get("is_available", source.get("isAvailable", True)))
+            and (stock is None or stock > 0),
+        }
+
+    def _co_purchase_pairs(
+        self,
+        baskets: List[List[str]],
+        customer_baskets: Iterable[Dict[str, None]],
+        customer_weight: float
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Weighted counts of item pairs bought together
+
+        Returns:
+            (pairs, weights): (m, 2) positions with a < b, and their weights
+        """
+        n = len(self.ids)
+        triangles: Dict[int, Tuple[np.ndarray, np.ndarray]] = {}
+        codes: List[np.ndarray] = []
+        code_weights: List[np.ndarray] = []
+
+        def add(items: List[str], weight: float) -> None:
+            if len(items) < 2:
+                return
+            positions = np.sort(np.fromiter((self.positions[i] for i in items), dtype=np.int64))
+            if len(positions) not in triangles:
+                triangles[len(positions)] = np.triu_indices(len(positions), 1)
+            first, second = triangles[len(positions)]
+            codes.append(positions[first] * n + positions[second])
+            code_weights.append(np.full(len(first), weight))
+
+        for basket in baskets:
+            add(basket, 1.0)
+        if customer_weight > 0:
+            for items in customer_baskets:
+                add(list(items)[-MAX_CUSTOMER_ITEMS:], customer_weight)
+        if not codes:
+            return np.zeros((0, 2), dtype=np.int64), np.zeros(0)
+
+        unique, inverse = np.unique(np.concatenate(codes), return_inverse=True)
+        weights = np.bincount(inverse, weights=np.concatenate(code_weights))
+        keep = weights >= MIN_PAIR_WEIGHT
+        unique, weights = unique[keep], weights[keep]
+        return np.stack([unique // n, unique % n], axis=1), weights
+
+    def _embed(
+        self,
+        pairs: np.ndarray,
+        weights: np.ndarray,
+        dim: int,
+        seed: int
+    ) -> np.ndarray:
+        """
+        Item vectors: positive PMI co-purchase rows, randomly projected
+
+        Each item's vector is the PPMI-weighted sum of fixed random vectors
+        of the items bought with it, plus its own random vector (weighted by
+        its strongest PPMI). Items bought together, or with the same
+        things, therefore point the same way. This never builds the dense
+        item x item matrix.
+        """
+        n = len(self.ids)
+        vectors = np.zeros((n, dim), dtype=np.float32)
+        if not len(pairs):
+            return vectors
+
+        rows = np.concatenate([pairs[:, 0], pairs[:, 1]])
+        cols = np.concatenate([pairs[:, 1], pairs[:, 0]])
+        values = np.concatenate([weights, weights])
+
+        totals = np.bincount(rows, weights=values, minlength=n)
+        pmi = np.log(values * values.sum() / (totals[rows] * totals[cols]))
+        keep = pmi > 0
+        rows, cols, pmi = rows[keep], cols[keep], pmi[keep].astype(np.float32)
+
+        rng = np.random.default_rng(seed)
+        if n <= dim:
+            # Small catalogs fit exactly: orthonormal rows add no noise
+            projection = np.linalg.qr(rng.standard_normal((dim, dim)))[0][:n]
+        else:
+            projection = rng.standard_normal((n, dim)) / np.sqrt(dim)
+        projection = projection.astype(np.float32)
+        chunk = 100_000
+        for start in range(0, len(rows), chunk):
+            end = start + chunk
+            np.add.at(vectors, rows[start:end], pmi[start:end, None] * projection[cols[start:end]])
+
+        strongest = np.zeros(n, dtype=np.float32)
+        np.maximum.at(strongest, rows, pmi)
+        vectors += strongest[:, None] * projection
+        return vectors
+
+    def position(self, item: Dict[str, Any]) -> Optional[int]:
+        """Find a purchased item in the index by product id, then by name"""
+        product_id = _product_id(item)
+        if product_id is not None and product_id in self.positions:
+            return self.positions[product_id]
+        name = item.get("product_name") or item.get("name")
+        return self.name_positions.get(str(name).lower()) if name else None
+
+    def eligible(self, position: int, area_id: Optional[str]) -> bool:
+        product = self.products[self.ids[position]]
+        if not product["available"]:
+            return False
+        return not area_id or not product["area_id"] or str(product["area_id"]) == str(area_id)
+
+    def popular(
+        self,
+        k: int,
+        area_id: Optional[str] = None,
+        exclude: Iterable[int] = ()
+    ) -> List[Tuple[int, float]]:
+        """Most ordered products (in the area, when it has orders of its own)"""
+        counts = self.area_popularity.get(str(area_id)) if area_id else None
+        counts = counts or self.popularity
+        excluded = set(exclude)
+        results = []
+        for product_id, count in counts.most_common():
+            position = self.positions[product_id]
+            if position in excluded or not self.eligible(position, area_id):
+                continue
+            results.append((position, count / max(1, self.order_count)))
+            if len(results) == k:
+                break
+        return results
+
+
+class RecommendationEngine:
+    """Serves top-k products for a customer from the current RecommendationIndex"""
+
+    def __init__(self, dim: int = 64, customer_weight: float = 0.25, hnsw_neighbors: int = 0):
+        """
+        Args:
+            dim: Embedding dimension
+            customer_weight: See RecommendationIndex
+            hnsw_neighbors: See VectorIndex (0 for exact search)
+        """
+        self.dim = dim
+        self.customer_weight = customer_weight
+        self.hnsw_neighbors = hnsw_neighbors
+        self._index: Optional[RecommendationIndex] = None
+
+    @property
+    def ready(self) -> bool:
+        return self._index is not None
+
+    def build(
+        self,
+        orders: List[Dict[str, Any]],
+        products: Optional[List[Dict[str, Any]]] = None
+    ) -> Dict[str, Any]:
+        """
+        Rebuild the index from order history and swap it in
+
+        CPU-bound; run it in an executor from async code.
+
+        Args:
+            orders: Order history (see RecommendationIndex)
+            products: Product catalog (see RecommendationIndex)
+
+        Returns:
+            Index statistics
+
+        Raises:
+            ValueError: If the orders embed no products (the current index,
+                if any, is kept)
+        """
+        index = RecommendationIndex(
+            orders,
+            products,
+            dim=self.dim,
+            customer_weight=self.customer_weight,
+            hnsw_neighbors=self.hnsw_neighbors
+        )
+        if not len(index.index):
+            raise ValueError("No products were bought together in these orders; index not replaced")
+        self._index = index
+        return self.stats()
+
+    def recommend(
+        self,
+        purchase_history: List[Dict[str, Any]],
+        k: int = 10,
+        area_id: Optional[str] = None,
+        include_purchased: bool = False
+    ) -> List[Dict[str, Any]]:
+        """
+        Get the products a customer is most likely to want next
+
+        Args:
+            purchase_history: Past purchases, most recent first, with
+                product_id (or product_name matching the catalog)
+            k: Products to return
+            area_id: Only products available in this area
+            include_purchased: Allow products already in the history
+
+        Returns:
+            Products with score and, for co-purchase matches, the history
+            product that led to them ('because_of')
+        """
+        index = self._index
+        if index is None:
+            return []
+
+        history: List[int] = []
+        for item in purchase_history:
+            position = index.position(item)
+            if position is not None and position not in history:
+                history.append(position)
+
+        weights = np.array([RECENCY_DECAY ** i for i in range(len(history))], dtype=np.float32)
+        history_vectors = normalize_rows(index.vectors[history]) if history else None
+        picked: List[Tuple[int, float]] = []
+        if history_vectors is not None and len(index.index):
+            profile = (weights[:, None] * history_vectors).sum(axis=0)
+            if np.any(profile):
+                excluded = set() if include_purchased else set(history)
+                wanted = k + len(excluded)
+                # Over-fetch to leave room for filtered-out products
+                for position, score in index.index.search(profile, k=4 * wanted + 10)[0]:
+                    if position in excluded or not index.eligible(position, area_id):
+                        continue
+                    if score < MIN_SIMILARITY:
+                        break
+                    picked.append((position, score))
+                    if len(picked) == k:
+                        break
+
+        # Customers with no (known) history, or too few neighbours: popular items
+        source_of = {position: "co_purchase" for position, _ in picked}
+        if len(picked) < k:
+            taken = {position for position, _ in picked}
+            if not include_purchased:
+                taken.update(history)
+            for position, score in index.popular(k - len(picked), area_id, exclude=taken):
+                picked.append((position, score))
+                source_of[position] = "popular"
+
+        results = []
+        for position, score in picked:
+            product = dict(index.products[index.ids[position]])
+            del product["available"]
+            product["score"] = round(float(score), 4)
+            product["source"] = source_of[position]
+            if source_of[position] == "co_purchase":
+                similarities = history_vectors @ normalize_rows(index.vectors[position])[0]
+                closest = history[int(np.argmax(similarities))]
+                product["because_of"] = index.products[index.ids[closest]]["name"]
+            results.append(product)
+        return results
+
+    def trending(self, area_id: Optional[str] = None, k: int = 5) -> List[str]:
+        """Names of the most ordered products in an area"""
+        index = self._index
+        if index is None:
+            return []
+        return [index.products[index.ids[position]]["name"] for position, _ in index.popular(k, area_id)]
+
+    def stats(self) -> Dict[str, Any]:
+        """Get index size"""
+        index = self._index
+        if index is None:
+            return {"ready": False}
+        return {
+            "ready": True,
+            "products": len(index.ids),
+            "embedded_products": len(index.index),
+            "orders": index.order_count,
+            "co_purchase_pairs": index.pair_count,
+            "dimension": self.dim,
+            "backend": index.index.backend,
+            "approximate": index.index.approximate
+        }
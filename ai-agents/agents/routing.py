@@ -0,0 +1,464 @@
+"""
+Route Optimization
+Local heuristic solver for sequencing a delivery partner's pending drops
+(nearest neighbour construction improved with 2-opt and Or-opt moves)
+"""
+
+from typing import Dict, Any, List, Optional, Tuple
+from datetime import datetime, timedelta
+from zoneinfo import ZoneInfo
+import re
+import numpy as np
+from .geo import haversine_matrix, extract_coordinates
+
+
+AVERAGE_SPEED_KMH = 20.0     # matches the location matcher's estimates
+SERVICE_TIME_MINS = 3.0      # handover time at each drop
+
+# Time windows are local to the marketplace, whatever the server clock
+SERVICE_TIMEZONE = ZoneInfo('Asia/Kolkata')
+
+# Penalties expressed in km so they trade off directly against distance
+LATENESS_KM_PER_MIN = 1.0    # per minute past the end of a time window
+PRIORITY_KM_PER_MIN = {      # per minute until an urgent drop is reached
+    'urgent': 0.2,
+    'high': 0.1,
+}
+
+MAX_IMPROVEMENT_PASSES = 50
+NEIGHBOUR_COUNT = 10         # candidate list size for time-window-aware moves
+EPSILON = 1e-9
+
+_TIME_PATTERN = re.compile(r'(\d{1,2})(?::(\d{2}))?\s*([ap]\.?m\.?)?', re.IGNORECASE)
+
+
+def _clock_minutes(hours: int, minutes: int, meridiem: str) -> Optional[int]:
+    """Minutes after midnight of a clock time, None if it is not one"""
+    if meridiem == 'pm' and hours < 12:
+        hours += 12
+    elif meridiem == 'am' and hours == 12:
+        hours = 0
+    if hours > 23 or minutes > 59:
+        return None
+    return hours * 60 + minutes
+
+
+def parse_time_window(
+    window: Any,
+    departure: datetime
+) -> Tuple[float, float]:
+    """
+    Convert a time window into minutes after departure
+
+    A trailing AM/PM applies to both ends ('1-2pm' is 13:00-14:00, but
+    '11-1pm' is 11:00-13:00), and a window whose end is not after its
+    start runs past midnight ('22:00-01:00').
+
+    Args:
+        window: 'HH:MM-HH:MM' (optionally with AM/PM), or anything else
+            such as 'flexible' for no constraint
+        departure: Route start time
+
+    Returns:
+        (earliest, latest) minutes after departure, unbounded if unparseable
+    """
+    if not isinstance(window, str):
+        return 0.0, float('inf')
+
+    times = _TIME_PATTERN.findall(window)
+    if len(times) < 2:
+        return 0.0, float('inf')
+
+    (start_h, start_m, start_meridiem), (end_h, end_m, end_meridiem) = times[:2]
+    start_h, start_m, end_h, end_m = int(start_h), int(start_m or 0), int(end_h), int(end_m or 0)
+    start_meridiem = start_meridiem.lower().replace('.', '')
+    end_meridiem = end_meridiem.lower().replace('.', '')
+
+    end = _clock_minutes(end_h, end_m, end_meridiem)
+    start = _clock_minutes(start_h, start_m, start_meridiem or end_meridiem)
+    if start is None or end is None:
+        return 0.0, float('inf')
+    if end_meridiem and not start_meridiem and start > end:
+        # '11-1pm': the start is in the other half of the day
+        start = _clock_minutes(start_h, start_m, 'am' if end_meridiem == 'pm' else 'pm')
+
+    midnight = departure.replace(hour=0, minute=0, second=0, microsecond=0)
+    offset = (midnight - departure).total_seconds() / 60
+    earliest, latest = offset + start, offset + end
+    if end <= start:
+        latest += 24 * 60
+        # Departing after midnight inside last night's window
+        if latest - 24 * 60 > 0:
+            earliest -= 24 * 60
+            latest -= 24 * 60
+
+    return max(earliest, 0.0), latest
+
+
+class RoutePlan:
+    """Schedule of a visiting sequence: distances, arrival times and penalties"""
+
+    def __init__(self, sequence: List[int], distance: float, arrivals: List[float],
+                 late: List[int], cost: float):
+        self.sequence = sequence
+        self.distance = distance
+        self.arrivals = arrivals
+        self.late = late
+        self.cost = cost
+        # (departure time, distance, penalty) after each position, for resuming
+        self.states: List[Tuple[float, float, float]] = []
+
+
+class RouteSolver:
+    """Open-path route solver starting at the partner's current location"""
+
+    def __init__(
+        self,
+        distances: np.ndarray,
+        windows: List[Tuple[float, float]],
+        weights: List[float],
+        speed_kmh: float = AVERAGE_SPEED_KMH
+    ):
+        """
+        Args:
+            distances: (N+1) x (N+1) matrix, node 0 is the start location
+            windows: (earliest, latest) minutes per node, node 0 ignored
+            weights: Priority penalty in km per minute of arrival per node
+            speed_kmh: Average travel speed
+        """
+        self.dist = distances.tolist()
+        self.windows = windows
+        self.weights = weights
+        self.mins_per_km = 60.0 / speed_kmh
+        self.size = len(self.dist)
+
+        # Without windows or priority weights the objective is pure distance,
+        # which allows constant-time move evaluation
+        self.distance_only = (
+            all(w == 0 for w in weights)
+            and all(latest == float('inf') for _, latest in windows[1:])
+        )
+
+        # With windows or priorities every move needs a schedule evaluation,
+        # so moves are limited to reconnecting nearby drops
+        order = np.argsort(distances, axis=1)[:, 1:NEIGHBOUR_COUNT + 1]
+        self.neighbours = [set(row) for row in order.tolist()]
+
+    def evaluate(self, sequence: List[int]) -> RoutePlan:
+        """Schedule a sequence (starting with node 0) and compute its cost"""
+        dist = self.dist
+        time = 0.0
+        distance = 0.0
+        penalty = 0.0
+        arrivals = []
+        late = []
+        states = [(0.0, 0.0, 0.0)]
+        previous = 0
+
+        for node in sequence[1:]:
+            leg = dist[previous][node]
+            distance += leg
+            time += leg * self.mins_per_km
+
+            earliest, latest = self.windows[node]
+            if time < earliest:
+                time = earliest
+            if time > latest:
+                penalty += (time - latest) * LATENESS_KM_PER_MIN
+                late.append(node)
+            penalty += self.weights[node] * time
+
+            arrivals.append(time)
+            time += SERVICE_TIME_MINS
+            states.append((time, distance, penalty))
+            previous = node
+
+        plan = RoutePlan(sequence, distance, arrivals, late, distance + penalty)
+        plan.states = states
+        return plan
+
+    def cost_from(
+        self,
+        sequence: List[int],
+        start: int,
+        end: int,
+        base: RoutePlan
+    ) -> float:
+        """
+        Cost bound of a candidate that differs from base only in positions [start, end)
+
+        Resumes from the base plan's schedule at position start - 1. Costs
+        only grow along a route and lateness only grows with arrival time, so
+        once the candidate has travelled the first unchanged leg (into
+        position end) it can often be decided against the base schedule
+        instead of scheduling the whole tail.
+
+        Returns:
+            inf if the candidate cannot beat base, otherwise its cost or an
+            upper bound on it
+        """
+        dist = self.dist
+        time, distance, penalty = base.states[start - 1]
+        bound = base.cost - EPSILON
+        previous = sequence[start - 1]
+
+        for position in range(start, len(sequence)):
+            if position == end + 1:
+                base_time, base_distance, base_penalty = base.states[end]
+                partial = distance + penalty
+                base_partial = base_distance + base_penalty
+                if time >= base_time and partial >= base_partial - EPSILON:
+                    return float('inf')
+                if time <= base_time and partial < base_partial - EPSILON:
+                    return partial + (base.cost - base_partial)
+
+            node = sequence[position]
+            leg = dist[previous][node]
+            distance += leg
+            time += leg * self.mins_per_km
+
+            earliest, latest = self.windows[node]
+            if time < earliest:
+                time = earliest
+            if time > latest:
+                penalty += (time - latest) * LATENESS_KM_PER_MIN
+            penalty += self.weights[node] * time
+
+            if distance + penalty >= bound:
+                return float('inf')
+
+            time += SERVICE_TIME_MINS
+            previous = node
+
+        return distance + penalty
+
+    def nearest_neighbour(self) -> List[int]:
+        """Build an initial sequence by always driving to the closest unvisited drop"""
+        dist = self.dist
+        unvisited = set(range(1, self.size))
+        sequence = [0]
+        while unvisited:
+            current = sequence[-1]
+            nearest = min(unvisited, key=lambda node: (dist[current][node], node))
+            sequence.append(nearest)
+            unvisited.remove(nearest)
+        return sequence
+
+    def solve(self) -> RoutePlan:
+        """Construct and locally improve a route"""
+        sequence = self.nearest_neighbour()
+        best = self.evaluate(sequence)
+
+        for _ in range(MAX_IMPROVEMENT_PASSES):
+            improved = self._two_opt(best)
+            improved = self._or_opt(improved)
+            if improved.cost >= best.cost - EPSILON:
+                break
+            best = improved
+
+        return best
+
+    def _accept(
+        self,
+        candidate: List[int],
+        start: int,
+        end: int,
+        delta: Optional[float],
+        best: RoutePlan
+    ) -> Optional[RoutePlan]:
+        """Return the candidate plan if it improves on the best one"""
+        if self.distance_only:
+            return self.evaluate(candidate) if delta < -EPSILON else None
+
+        if self.cost_from(candidate, start, end, best) < best.cost - EPSILON:
+            return self.evaluate(candidate)
+        return None
+
+    def _near_insertion(self, segment: List[int], rest: List[int], k: int) -> bool:
+        """Whether inserting a segment before rest[k] creates an edge between neighbours"""
+        if rest[k - 1] in self.neighbours[segment[0]]:
+            return True
+        return k < len(rest) and rest[k] in self.neighbours[segment[-1]]
+
+    def _two_opt(self, best: RoutePlan) -> RoutePlan:
+        """Reverse sub-sequences while doing so reduces cost"""
+        dist = self.dist
+        last = self.size - 1
+        improved = True
+
+        while improved:
+            improved = False
+            seq = best.sequence
+            for i in range(1, last):
+                for j in range(i + 1, last + 1):
+                    delta = None
+                    if self.distance_only:
+                        a, b, c = seq[i - 1], seq[i], seq[j]
+                        delta = dist[a][c] - dist[a][b]
+                        if j < last:
+                            e = seq[j + 1]
+                            delta += dist[b][e] - dist[c][e]
+                        if delta >= -EPSILON:
+                            continue
+                    elif seq[j] not in self.neighbours[seq[i - 1]]:
+                        continue
+
+                    candidate = seq[:i] + seq[i:j + 1][::-1] + seq[j + 1:]
+                    plan = self._accept(candidate, i, j + 1, delta, best)
+                    if plan:
+                        best = plan
+                        seq = best.sequence
+                        improved = True
+        return best
+
+    def _or_opt(self, best: RoutePlan) -> RoutePlan:
+        """Move segments of up to three drops to a better position"""
+        dist = self.dist
+        improved = True
+
+        while improved:
+            improved = False
+            for length in (1, 2, 3):
+                seq = best.sequence
+                i = 1
+                while i + length <= len(seq):
+                    segment = seq[i:i + length]
+                    rest = seq[:i] + seq[i + length:]
+
+                    removal_gain = 0.0
+                    if self.distance_only:
+                        p, first, tail = seq[i - 1], segment[0], segment[-1]
+                        removal_gain = dist[p][first]
+                        if i + length < len(seq):
+                            nxt = seq[i + length]
+                            removal_gain += dist[tail][nxt] - dist[p][nxt]
+
+                    # Late or prioritised drops may need to move far forward
+                    free_move = length == 1 and (
+                        segment[0] in best.late or self.weights[segment[0]] > 0
+                    )
+
+                    moved = False
+                    for k in range(1, len(rest) + 1):
+                        if k == i:
+                            continue
+
+                        delta = None
+                        if self.distance_only:
+                            u = rest[k - 1]
+                            delta = dist[u][segment[0]] - removal_gain
+                            if k < len(rest):
+                                w = rest[k]
+                                delta += dist[segment[-1]][w] - dist[u][w]
+                            if delta >= -EPSILON:
+                                continue
+                        elif not (free_move or self._near_insertion(segment, rest, k)):
+                            continue
+
+                        candidate = rest[:k] + segment + rest[k:]
+                        plan = self._accept(candidate, min(i, k), max(i, k) + length, delta, best)
+                        if plan:
+                            best = plan
+                            seq = best.sequence
+                            improved = True
+                            moved = True
+                            break
+
+                    if not moved:
+                        i += 1
+        return best
+
+
+def optimize_route(
+    current_location: Dict[str, float],
+    deliveries: List[Dict[str, Any]],
+    departure_time: Optional[datetime] = None,
+    speed_kmh: float = AVERAGE_SPEED_KMH
+) -> Dict[str, Any]:
+    """
+    Sequence pending deliveries to minimise distance within time windows
+
+    Args:
+        current_location: Partner's location {lat, lng}
+        deliveries: [{order_id, lat/lng or location, address?, priority?, time_window?}]
+        departure_time: Route start time (defaults to now); naive times
+            are taken as service-area (IST) time
+        speed_kmh: Average travel speed
+
+    Returns:
+        Route plan with optimized_route, total_distance and estimated_total_time.
+        Deliveries without coordinates are appended unsequenced at the end.
+    """
+    if departure_time is None:
+        departure = datetime.now(SERVICE_TIMEZONE)
+    elif departure_time.tzinfo is None:
+        departure = departure_time.replace(tzinfo=SERVICE_TIMEZONE)
+    else:
+        departure = departure_time.astimezone(SERVICE_TIMEZONE)
+
+    routable = []
+    unroutable = []
+    for delivery in deliveries:
+        lat, lng = extract_coordinates(delivery)
+        if lat and lng:
+            routable.append((delivery, float(lat), float(lng)))
+        else:
+            unroutable.append(delivery)
+
+    lats = [current_location['lat']] + [lat for _, lat, _ in routable]
+    lngs = [current_location['lng']] + [lng for _, _, lng in routable]
+    distances = haversine_matrix(lats, lngs, lats, lngs)
+
+    windows = [(0.0, float('inf'))] + [
+        parse_time_window(d.get('time_window'), departure) for d, _, _ in routable
+    ]
+    weights = [0.0] + [
+        PRIORITY_KM_PER_MIN.get(str(d.get('priority', 'normal')).lower(), 0.0)
+        for d, _, _ in routable
+    ]
+
+    solver = RouteSolver(distances, windows, weights, speed_kmh)
+    plan = solver.solve()
+
+    route = []
+    previous = 0
+    for position, (node, arrival) in enumerate(zip(plan.sequence[1:], plan.arrivals), start=1):
+        delivery = routable[node - 1][0]
+        route.append({
+            "order_id": delivery.get('order_id'),
+            "sequence": position,
+            "address": delivery.get('address', 'Unknown'),
+            "estimated_arrival": (departure + timedelta(minutes=arrival)).strftime('%I:%M %p'),
+            "priority": delivery.get('priority', 'normal'),
+            "distance_from_previous_km": round(float(distances[previous][node]), 2),
+            "on_time": node not in plan.late
+        })
+        previous = node
+
+    for delivery in unroutable:
+        route.append({
+            "order_id": delivery.get('order_id'),
+            "sequence": len(route) + 1,
+            "address": delivery.get('address', 'Unknown'),
+            "estimated_arrival": None,
+            "priority": delivery.get('priority', 'normal'),
+            "on_time": None
+        })
+
+    total_time = plan.arrivals[-1] + SERVICE_TIME_MINS if plan.arrivals else 0.0
+    late_orders = [routable[node - 1][0].get('order_id') for node in plan.late]
+
+    summary = f"{len(plan.arrivals)} stops over {round(plan.distance, 2)} km"
+    if late_orders:
+        summary += f", {len(late_orders)} outside their time window"
+    if unroutable:
+        summary += f", {len(unroutable)} without coordinates appended at the end"
+
+    return {
+        "optimized_route": route,
+        "total_distance": round(plan.distance, 2),
+        "estimated_total_time": int(round(total_time)),
+        "fuel_efficiency": "optimized",
+        "late_deliveries": late_orders,
+        "route_summary": summary
+    }
@@ -0,0 +1,237 @@
+"""
+Semantic Cache
+Reuses AI answers for questions that are worded differently but mean the
+same thing, looked up by embedding similarity
+"""
+
+import hashlib
+import json
+import re
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from .vector_index import VectorIndex
+
+
+_NON_WORD = re.compile(r"[^a-z0-9\s]+")
+_SPACES = re.compile(r"\s+")
+# Spelled-out forms, so "where's my order" matches "where is my order"
+_CONTRACTIONS = [
+    (re.compile(r"\bcan'?t\b"), "can not"),
+    (re.compile(r"\bwon'?t\b"), "will not"),
+    (re.compile(r"\b(\w+)n't\b"), r"\1 not"),
+    (re.compile(r"\b(where|what|when|how|who|it|that|there)'s\b"), r"\1 is"),
+    (re.compile(r"\bi'm\b"), "i am"),
+    (re.compile(r"\b(\w+)'ll\b"), r"\1 will"),
+    (re.compile(r"\b(\w+)'ve\b"), r"\1 have"),
+    (re.compile(r"\b(\w+)'re\b"), r"\1 are"),
+]
+
+
+def normalize_query(text: str) -> str:
+    """Lower-case a query, expand contractions and strip punctuation"""
+    text = (text or "").lower().replace("\u2019", "'")
+    for pattern, replacement in _CONTRACTIONS:
+        text = pattern.sub(replacement, text)
+    text = _NON_WORD.sub("", text.replace("'", ""))
+    return _SPACES.sub(" ", text).strip()
+
+
+class HashingEmbedder:
+    """
+    Deterministic offline text embedder
+
+    Hashes words, word pairs and character trigrams into a fixed number of
+    signed buckets. No model or network access is needed, and the same text
+    always gives the same vector in every process.
+    """
+
+    def __init__(self, dim: int = 512):
+        """
+        Args:
+            dim: Vector dimension
+        """
+        self.dim = dim
+
+    def _features(self, text: str) -> Iterable[Tuple[str, float]]:
+        words = text.split()
+        for word in words:
+            yield "w:" + word, 1.0
+            padded = f" {word} "
+            for i in range(len(padded) - 2):
+                yield "c:" + padded[i:i + 3], 0.5
+        for first, second in zip(words, words[1:]):
+            yield f"b:{first} {second}", 1.0
+
+    def embed(self, texts: List[str]) -> np.ndarray:
+        """
+        Embed normalized texts
+
+        Args:
+            texts: Texts to embed
+
+        Returns:
+            Array of shape (len(texts), dim)
+        """
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            for feature, weight in self._features(text):
+                digest = hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest()
+                value = int.from_bytes(digest, "little")
+                sign = 1.0 if value & 1 else -1.0
+                vectors[row, (value >> 1) % self.dim] += sign * weight
+        return vectors
+
+
+class SemanticCache:
+    """
+    TTL/LRU cache looked up by query similarity
+
+    Entries are grouped by a fingerprint of their context, so an answer is
+    only reused for the same context (same order status, same products, ...).
+    Within a group the most similar cached query wins if it reaches the
+    threshold.
+    """
+
+    def __init__(
+        self,
+        threshold: float = 0.9,
+        max_entries: int = 5000,
+        ttl_seconds: float = 900.0,
+        embedder: Optional[Any] = None
+    ):
+        """
+        Initialize the cache
+
+        Args:
+            threshold: Cosine similarity needed to reuse an answer
+            max_entries: Entries kept before least recently used ones are evicted
+            ttl_seconds: Seconds an entry stays valid (0 disables caching)
+            embedder: Object with `dim` and `embed(texts) -> np.ndarray`
+                (HashingEmbedder by default)
+        """
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl_seconds = ttl_seconds
+        self.embedder = embedder or HashingEmbedder()
+        # id -> (expires_at, context fingerprint, normalized query, value)
+        self._entries: "OrderedDict[int, Tuple[float, str, str, Any]]" = OrderedDict()
+        self._indexes: Dict[str, VectorIndex] = {}
+        self._next_id = 0
+        self.hits = 0
+        self.misses = 0
+
+    @property
+    def enabled(self) -> bool:
+        return self.max_entries > 0 and self.ttl_seconds > 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    @staticmethod
+    def context_fingerprint(context: Optional[Dict[str, Any]]) -> str:
+        """Stable hash of a context dict"""
+        encoded = json.dumps(context or {}, sort_keys=True, default=str)
+        return hashlib.sha256(encoded.encode("utf-8")).hexdigest()
+
+    def _embed(self, query: str) -> np.ndarray:
+        return self.embedder.embed([query])
+
+    def _remove(self, entry_id: int) -> None:
+        _, fingerprint, _, _ = self._entries.pop(entry_id)
+        index = self._indexes[fingerprint]
+        index.remove([entry_id])
+        if len(index) == 0:
+            del self._indexes[fingerprint]
+
+    def get(self, query: str, context: Optional[Dict[str, Any]] = None) -> Optional[Any]:
+        """
+        Get the answer cached for a similar query in the same context
+
+        Args:
+            query: Question as asked
+            context: Context the answer depends on
+
+        Returns:
+            Cached value, or None if no similar query is cached
+        """
+        normalized = normalize_query(query)
+        index = self._indexes.get(self.context_fingerprint(context))
+        if not self.enabled or not normalized or index is None:
+            self.misses += 1
+            return None
+
+        now = time.monotonic()
+        for entry_id, score in index.search(self._embed(normalized), k=4)[0]:
+            if score < self.threshold:
+                break
+            expires_at, _, _, value = self._entries[entry_id]
+            if expires_at <= now:
+                self._remove(entry_id)
+                continue
+            self._entries.move_to_end(entry_id)
+            self.hits += 1
+            return value
+
+        self.misses += 1
+        return None
+
+    def set(self, query: str, context: Optional[Dict[str, Any]], value: Any) -> None:
+        """
+        Store an answer, evicting the least recently used entries if full
+
+        Args:
+            query: Question as asked
+            context: Context the answer depends on
+            value: Answer to cache
+        """
+        normalized = normalize_query(query)
+        if not self.enabled or not normalized:
+            return
+
+        fingerprint = self.context_fingerprint(context)
+        vector = self._embed(normalized)
+
+        # Replace an entry for the same query rather than storing it twice
+        index = self._indexes.get(fingerprint)
+        if index is not None:
+            for entry_id, _ in index.search(vector, k=4)[0]:
+                if self._entries[entry_id][2] == normalized:
+                    self._remove(entry_id)
+                    break
+
+        index = self._indexes.get(fingerprint)
+        if index is None:
+            index = self._indexes[fingerprint] = VectorIndex(self.embedder.dim)
+        entry_id = self._next_id
+        self._next_id += 1
+        index.add([entry_id], vector)
+        self._entries[entry_id] = (
+            time.monotonic() + self.ttl_seconds, fingerprint, normalized, value
+        )
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+
+    def clear(self) -> None:
+        """Remove all entries and reset statistics"""
+        self._entries.clear()
+        self._indexes.clear()
+        self.hits = 0
+        self.misses = 0
+
+    def stats(self) -> Dict[str, Any]:
+        """Get cache size and hit statistics"""
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "contexts": len(self._indexes),
+            "max_entries": self.max_entries,
+            "ttl_seconds": self.ttl_seconds,
+            "threshold": self.threshold,
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 3) if lookups else 0.0
+        }
@@ -0,0 +1,224 @@
+"""
+Service Areas
+Lookup table of serviceable areas and the rule-based address scoring used
+for area validation
+"""
+
+import re
+from difflib import SequenceMatcher
+from typing import Any, Dict, List, Optional
+
+from .address_parser import load_gazetteer
+
+
+# Serviceable areas with the pincodes delivered to; spelling variants and
+# centroids come from the gazetteer so address parsing and validation agree
+# on where a locality is. Pincodes are listed here because the service
+# coverage is wider than the gazetteer's single pincode per locality
+_SERVICE_LOCALITIES = [
+    (1, "Gota", ["382481"]),
+    (2, "Chandkheda", ["382424", "382470"]),
+    (3, "Satellite", ["380015"]),
+    (4, "Bodakdev", ["380052"]),
+    (5, "Vastrapur", ["380015"]),
+]
+
+
+def _build_service_areas() -> List[Dict[str, Any]]:
+    """Expand the serviceable localities with their gazetteer entries"""
+    gazetteer = load_gazetteer()
+    areas = []
+    for area_id, name, pincodes in _SERVICE_LOCALITIES:
+        locality = gazetteer.lookup(name)
+        if locality is None:
+            raise ValueError(f"Service locality {name!r} is missing from the gazetteer")
+        areas.append({
+            "area_id": area_id,
+            "area_name": f"{gazetteer.city} - {locality['name']}",
+            "locality": locality["name"],
+            "aliases": list(dict.fromkeys([locality["name"].lower(), *locality.get("aliases", [])])),
+            "pincodes": list(pincodes),
+            "latitude": locality["latitude"],
+            "longitude": locality["longitude"],
+        })
+    return areas
+
+
+SERVICE_AREAS = _build_service_areas()
+
+SERVICE_CITIES = set(load_gazetteer().city_aliases)
+
+# Scoring weights
+PINCODE_WEIGHT = 0.4
+LOCALITY_WEIGHT = 0.3
+CITY_WEIGHT = 0.2
+FORMAT_WEIGHT = 0.1
+
+# Decision thresholds
+APPROVE_THRESHOLD = 0.8
+REVIEW_THRESHOLD = 0.5
+
+# Similarity above which a misspelt word still counts as the locality
+FUZZY_LOCALITY_RATIO = 0.85
+
+# Indexes over SERVICE_AREAS
+AREAS_BY_PINCODE: Dict[str, List[Dict[str, Any]]] = {}
+AREAS_BY_ALIAS: Dict[str, Dict[str, Any]] = {}
+for _area in SERVICE_AREAS:
+    for _pincode in _area["pincodes"]:
+        AREAS_BY_PINCODE.setdefault(_pincode, []).append(_area)
+    for _alias in _area["aliases"]:
+        AREAS_BY_ALIAS[_alias] = _area
+
+_WORD = re.compile(r"[a-z]+")
+_PINCODE = re.compile(r"\b(\d{6})\b")
+
+
+def normalize_pincode(pincode: Optional[str], address: str = "") -> str:
+    """Get a 6-digit pincode from the field, or from the address if missing"""
+    digits = re.sub(r"\D", "", str(pincode or ""))
+    if len(digits) == 6:
+        return digits
+    found = _PINCODE.findall(address or "")
+    return found[-1] if found else digits
+
+
+def find_locality(address: str) -> Optional[Dict[str, Any]]:
+    """
+    Find the serviceable area whose locality is named in an address
+
+    Args:
+        address: Free-form address
+
+    Returns:
+        {"area": area, "exact": bool} or None. Misspellings close to a
+        locality name match with exact=False.
+    """
+    text = (address or "").lower()
+    words = _WORD.findall(text)
+    padded = f" {' '.join(words)} "
+
+    for alias, area in AREAS_BY_ALIAS.items():
+        if f" {alias} " in padded:
+            return {"area": area, "exact": True}
+
+    best_ratio, best_area = 0.0, None
+    for word in words:
+        if len(word) < 4:
+            continue
+        for alias, area in AREAS_BY_ALIAS.items():
+            ratio = SequenceMatcher(None, word, alias).ratio()
+            if ratio > best_ratio:
+                best_ratio, best_area = ratio, area
+    if best_ratio >= FUZZY_LOCALITY_RATIO:
+        return {"area": best_area, "exact": False}
+    return None
+
+
+def address_format_score(address: str, pincode: str) -> float:
+    """
+    Score address quality between 0 and 1
+
+    Full marks need a house/flat number, at least two comma-separated parts
+    and a valid pincode.
+    """
+    address = address or ""
+    checks = [
+        bool(re.search(r"\d", address.split(",")[0] if address else "")),
+        len([part for part in address.split(",") if part.strip()]) >= 2,
+        len(pincode) == 6,
+    ]
+    return sum(checks) / len(checks)
+
+
+def score_address(address: str, pincode: str, city: str) -> Dict[str, Any]:
+    """
+    Score an address against the service areas
+
+    Weights: pincode 40%, locality 30%, city 20%, address format 10%.
+    When a locality is named, the pincode only counts if it belongs to
+    that locality's area.
+
+    Args:
+        address: Full address
+        pincode: Postal code (taken from the address if blank)
+        city: City name (matched in the address if blank)
+
+    Returns:
+        Validation result in the area agent's response format
+    """
+    pincode = normalize_pincode(pincode, address)
+    pincode_areas = AREAS_BY_PINCODE.get(pincode, [])
+
+    locality = find_locality(address)
+    if locality is None:
+        locality_score = 0.0
+        pincode_match = bool(pincode_areas)
+    else:
+        locality_score = 1.0 if locality["exact"] else 0.7
+        # A serviceable pincode of another area contradicts the locality
+        pincode_match = locality["area"] in pincode_areas
+    pincode_conflict = bool(pincode_areas) and not pincode_match
+
+    city_text = (city or "").strip().lower()
+    if city_text:
+        city_match = city_text in SERVICE_CITIES
+    else:
+        city_match = any(name in (address or "").lower() for name in SERVICE_CITIES)
+
+    format_score = address_format_score(address, pincode)
+
+    score = round(
+        PINCODE_WEIGHT * pincode_match
+        + LOCALITY_WEIGHT * locality_score
+        + CITY_WEIGHT * city_match
+        + FORMAT_WEIGHT * format_score,
+        2
+    )
+
+    # Prefer the named locality; otherwise the only area for the pincode
+    area = None
+    if locality is not None:
+        area = locality["area"]
+    elif len(pincode_areas) == 1:
+        area = pincode_areas[0]
+
+    if score >= APPROVE_THRESHOLD:
+        status = "approved"
+        message = "Address validated successfully"
+    elif score >= REVIEW_THRESHOLD:
+        status = "pending"
+        message = "Address needs manual review"
+    else:
+        status = "rejected"
+        message = "Address is outside our service area"
+
+    if not pincode:
+        pincode_reason = "pincode missing"
+    elif pincode_conflict:
+        pincode_reason = (f"pincode {pincode} belongs to "
+                          f"{', '.join(a['locality'] for a in pincode_areas)}, not {area['locality']}")
+    else:
+        pincode_reason = f"pincode {pincode} {'is' if pincode_match else 'is not'} serviceable"
+
+    reasons = [
+        pincode_reason,
+        f"locality {area['locality'] if locality else 'not recognised'}"
+        + ("" if locality is None or locality["exact"] else " (approximate spelling)"),
+        f"city {'matches' if city_match else 'does not match'}",
+        f"address format {int(format_score * 100)}%",
+    ]
+
+    return {
+        "status": status,
+        "area_id": area["area_id"] if area and status != "rejected" else None,
+        "area_name": area["area_name"] if area and status != "rejected" else None,
+        "locality": area["locality"] if locality else None,
+        "latitude": area["latitude"] if area else None,
+        "longitude": area["longitude"] if area else None,
+        "confidence_score": score,
+        "pincode_match": pincode_match,
+        "city_match": city_match,
+        "message": message,
+        "reasoning": "; ".join(reasons),
+    }
@@ -0,0 +1,182 @@
+"""
+Spatial Index
+Uniform lat/lng grid index so radius queries only touch neighbouring cells
+"""
+
+from typing import Dict, Any, List, Optional, Set, Tuple
+from collections import defaultdict
+import math
+import numpy as np
+from .geo import EARTH_RADIUS_KM, haversine_distances
+
+
+# Kilometers per degree of latitude (and of longitude at the equator)
+KM_PER_DEGREE = EARTH_RADIUS_KM * math.pi / 180
+
+Cell = Tuple[int, int]
+
+
+class SpatialGridIndex:
+    """Grid of square-degree cells bucketing entities by location"""
+
+    def __init__(self, cell_size_km: float = 5.0):
+        """
+        Initialize an empty grid
+
+        Args:
+            cell_size_km: Cell edge length along the latitude axis, usually
+                the (padded) query radius so a query scans 3 rows of cells;
+                longitude cells narrow away from the equator, so it may
+                scan up to 5 columns
+        """
+        self.cell_size_km = cell_size_km
+        self.cell_size_deg = cell_size_km / KM_PER_DEGREE
+        self._cells: Dict[Cell, Set[str]] = defaultdict(set)
+        self._entries: Dict[str, Tuple[float, float, Cell]] = {}
+        self._payloads: Dict[str, Dict[str, Any]] = {}
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, entity_id: str) -> bool:
+        return entity_id in self._entries
+
+    def _cell_for(self, lat: float, lng: float) -> Cell:
+        """Get the grid cell containing a coordinate"""
+        return (
+            math.floor(lat / self.cell_size_deg),
+            math.floor(lng / self.cell_size_deg)
+        )
+
+    def upsert(
+        self,
+        entity_id: str,
+        lat: float,
+        lng: float,
+        payload: Optional[Dict[str, Any]] = None
+    ) -> None:
+        """
+        Insert an entity or update its location
+
+        Args:
+            entity_id: Unique entity ID
+            lat, lng: Entity coordinates
+            payload: Entity data returned by queries (kept if None)
+        """
+        cell = self._cell_for(lat, lng)
+        previous = self._entries.get(entity_id)
+
+        if previous is not None and previous[2] != cell:
+            self._discard_from_cell(entity_id, previous[2])
+
+        self._cells[cell].add(entity_id)
+        self._entries[entity_id] = (lat, lng, cell)
+
+        if payload is not None:
+            self._payloads[entity_id] = payload
+        else:
+            self._payloads.setdefault(entity_id, {'id': entity_id})
+
+    def remove(self, entity_id: str) -> bool:
+        """
+        Remove an entity from the index
+
+        Args:
+            entity_id: Entity ID
+
+        Returns:
+            True if the entity was indexed
+        """
+        entry = self._entries.pop(entity_id, None)
+        if entry is None:
+            return False
+
+        self._discard_from_cell(entity_id, entry[2])
+        self._payloads.pop(entity_id, None)
+        return True
+
+    def get(self, entity_id: str) -> Optional[Dict[str, Any]]:
+        """Get the payload stored for an entity"""
+        return self._payloads.get(entity_id)
+
+    def payloads(self) -> List[Dict[str, Any]]:
+        """Get all indexed payloads"""
+        return list(self._payloads.values())
+
+    def candidates(self, lat: float, lng: float, radius_km: float) -> List[str]:
+        """
+        Get IDs of entities in cells overlapping a radius around a point
+
+        Args:
+            lat, lng: Query center
+            radius_km: Query radius
+
+        Returns:
+            Candidate entity IDs (a superset of those within the radius)
+        """
+        lat_span = math.ceil(radius_km / self.cell_size_km)
+
+        # Longitude degrees shrink towards the poles, so widen the scan using
+        # the latitude in the query band that is furthest from the equator
+        max_abs_lat = min(abs(lat) + radius_km / KM_PER_DEGREE, 90.0)
+        km_per_lng_cell = self.cell_size_km * math.cos(math.radians(max_abs_lat))
+        if km_per_lng_cell <= radius_km / 180:
+            return list(self._entries)
+        lng_span = math.ceil(radius_km / km_per_lng_cell)
+
+        center_row, center_col = self._cell_for(lat, lng)
+        cols = set(range(center_col - lng_span, center_col + lng_span + 1))
+
+        # Longitudes wrap at ±180°: a scan reaching past it also covers the
+        # columns around the query's copy 360° away
+        west = (center_col - lng_span) * self.cell_size_deg
+        east = (center_col + lng_span + 1) * self.cell_size_deg
+        for shift, crosses in ((360.0, west < -180.0), (-360.0, east > 180.0)):
+            if crosses:
+                shifted_col = self._cell_for(lat, lng + shift)[1]
+                cols.update(range(shifted_col - lng_span, shifted_col + lng_span + 1))
+
+        ids: List[str] = []
+        for row in range(center_row - lat_span, center_row + lat_span + 1):
+            for col in sorted(cols):
+                cell = self._cells.get((row, col))
+                if cell:
+                    ids.extend(cell)
+        return ids
+
+    def query_radius(
+        self,
+        lat: float,
+        lng: float,
+        radius_km: float
+    ) -> Tuple[List[Dict[str, Any]], np.ndarray]:
+        """
+        Find entities within a radius of a point
+
+        Args:
+            lat, lng: Query center
+            radius_km: Query radius
+
+        Returns:
+            (payloads, distances) for entities within the radius, distances
+            in km and unrounded
+        """
+        ids = self.candidates(lat, lng, radius_km)
+        if not ids:
+            return [], np.empty(0)
+
+        lats = np.fromiter((self._entries[i][0] for i in ids), dtype=np.float64, count=len(ids))
+        lngs = np.fromiter((self._entries[i][1] for i in ids), dtype=np.float64, count=len(ids))
+        distances = haversine_distances(lat, lng, lats, lngs)
+
+        within = np.flatnonzero(distances <= radius_km)
+        return [self._payloads[ids[i]] for i in within], distances[within]
+
+    def _discard_from_cell(self, entity_id: str, cell: Cell) -> None:
+        """Remove an entity ID from a cell, dropping empty cells"""
+        members = self._cells.get(cell)
+        if members is None:
+            return
+        members.discard(entity_id)
+        if not members:
+            del self._cells[cell]
@@ -0,0 +1,153 @@
+"""
+Streaming JSON Parser
+Incrementally parses a JSON object from streamed model output, emitting
+top-level fields and array items as soon as each one is complete
+"""
+
+import json
+from typing import Any, Dict, Iterable, List, Optional
+
+
+class StreamingJSONParser:
+    """
+    Consumes text chunks of a model response and reports completed parts
+
+    Text before the first '{' (such as a ```json fence) and anything after
+    the matching '}' are ignored. Events are dicts:
+
+    - {"type": "item", "field": key, "index": i, "value": v} for each
+      element of a top-level array field, as soon as it is complete
+    - {"type": "field", "field": key, "value": v} for each top-level field
+    """
+
+    def __init__(self, required_fields: Optional[Iterable[str]] = None):
+        """
+        Initialize the parser
+
+        Args:
+            required_fields: Fields the caller needs; once all are parsed,
+                satisfied is True and generation can be stopped
+        """
+        self.required_fields = set(required_fields or [])
+        self.fields: Dict[str, Any] = {}
+        self.done = False
+        self.error: Optional[str] = None
+
+        self._buffer = ""
+        self._started = False
+        self._stack: List[str] = []
+        self._in_string = False
+        self._escape = False
+
+        self._member_start = 0
+        self._key: Optional[str] = None
+        self._value_start = 0
+        self._item_start = 0
+        self._item_index = 0
+
+    @property
+    def satisfied(self) -> bool:
+        """Whether every required field has been parsed"""
+        return bool(self.required_fields) and self.required_fields.issubset(self.fields)
+
+    def feed(self, chunk: str) -> List[Dict[str, Any]]:
+        """
+        Consume the next chunk of text
+
+        Args:
+            chunk: Next piece of the streamed response
+
+        Returns:
+            Events for fields and array items completed by this chunk
+        """
+        if self.done or self.error:
+            return []
+
+        if not self._started:
+            start = chunk.find("{")
+            if start < 0:
+                return []
+            chunk = chunk[start:]
+            self._started = True
+
+        offset = len(self._buffer)
+        self._buffer += chunk
+        events: List[Dict[str, Any]] = []
+
+        try:
+            for i in range(offset, len(self._buffer)):
+                self._consume(i, events)
+                if self.done:
+                    break
+        except ValueError as e:
+            self.error = f"Invalid JSON in response: {e}"
+
+        return events
+
+    def result(self) -> Dict[str, Any]:
+        """Get the fields parsed so far (the whole object once done)"""
+        return dict(self.fields)
+
+    def _consume(self, i: int, events: List[Dict[str, Any]]) -> None:
+        """Advance the state machine over the character at buffer index i"""
+        char = self._buffer[i]
+
+        if self._in_string:
+            if self._escape:
+                self._escape = False
+            elif char == "\\":
+                self._escape = True
+            elif char == '"':
+                self._in_string = False
+            return
+
+        depth = len(self._stack)
+        if char == '"':
+            self._in_string = True
+        elif char in "{[":
+            self._stack.append(char)
+            if depth == 0:
+                self._member_start = i + 1
+            elif depth == 1 and char == "[":
+                self._item_start = i + 1
+                self._item_index = 0
+        elif char in "}]":
+            if depth == 2 and self._stack[1] == "[":
+                self._emit_item(i, events)
+            self._stack.pop()
+            if depth == 1:
+                self._emit_field(i, events)
+                self.done = True
+        elif char == ":" and depth == 1:
+            self._key = json.loads(self._buffer[self._member_start:i])
+            self._value_start = i + 1
+        elif char == ",":
+            if depth == 1:
+                self._emit_field(i, events)
+                self._member_start = i + 1
+            elif depth == 2 and self._stack[1] == "[":
+                self._emit_item(i, events)
+                self._item_start = i + 1
+
+    def _emit_field(self, end: int, events: List[Dict[str, Any]]) -> None:
+        """Parse the top-level member ending at index end"""
+        text = self._buffer[self._value_start:end].strip()
+        if self._key is None or not text:
+            return
+        value = json.loads(text)
+        self.fields[self._key] = value
+        events.append({"type": "field", "field": self._key, "value": value})
+        self._key = None
+
+    def _emit_item(self, end: int, events: List[Dict[str, Any]]) -> None:
+        """Parse the array element ending at index end"""
+        text = self._buffer[self._item_start:end].strip()
+        if not text:
+            return
+        events.append({
+            "type": "item",
+            "field": self._key,
+            "index": self._item_index,
+            "value": json.loads(text)
+        })
+        self._item_index += 1
@@ -0,0 +1,134 @@
+"""
+Vector Index
+Inner-product nearest-neighbour search over unit vectors, using FAISS when
+it is installed and numpy otherwise
+"""
+
+from typing import Dict, Iterable, List, Tuple
+
+import numpy as np
+
+try:
+    import faiss
+except ImportError:  # faiss-cpu is optional
+    faiss = None
+
+
+def normalize_rows(vectors: np.ndarray) -> np.ndarray:
+    """Scale each row to unit length (zero rows stay zero)"""
+    vectors = np.atleast_2d(np.asarray(vectors, dtype=np.float32))
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    return vectors / np.where(norms == 0, 1.0, norms)
+
+
+class VectorIndex:
+    """
+    Nearest-neighbour index keyed by integer ids
+
+    Vectors are L2-normalized on insert, so scores are cosine similarities.
+    Search is exact unless an HNSW graph is requested and FAISS is installed.
+    """
+
+    def __init__(self, dim: int, use_faiss: bool = True, hnsw_neighbors: int = 0):
+        """
+        Create an empty index
+
+        Args:
+            dim: Vector dimension
+            use_faiss: Use FAISS if available (numpy is used otherwise)
+            hnsw_neighbors: Build an approximate HNSW graph with this many
+                links per vector (FAISS only; 0 for exact search). HNSW
+                indexes do not support remove().
+        """
+        self.dim = dim
+        self.backend = "faiss" if use_faiss and faiss is not None else "numpy"
+        self.approximate = self.backend == "faiss" and hnsw_neighbors > 0
+        if self.approximate:
+            graph = faiss.IndexHNSWFlat(dim, hnsw_neighbors, faiss.METRIC_INNER_PRODUCT)
+            graph.hnsw.efSearch = max(64, 2 * hnsw_neighbors)
+            self._index = faiss.IndexIDMap2(graph)
+        elif self.backend == "faiss":
+            self._index = faiss.IndexIDMap2(faiss.IndexFlatIP(dim))
+        else:
+            self._vectors = np.zeros((0, dim), dtype=np.float32)
+            self._ids = np.zeros(0, dtype=np.int64)
+            self._rows: Dict[int, int] = {}
+
+    def __len__(self) -> int:
+        if self.backend == "faiss":
+            return self._index.ntotal
+        return len(self._rows)
+
+    def add(self, ids: Iterable[int], vectors: np.ndarray) -> None:
+        """
+        Add vectors under the given ids (ids must not already be present)
+
+        Args:
+            ids: One integer id per vector
+            vectors: Array of shape (n, dim)
+        """
+        ids = np.asarray(list(ids), dtype=np.int64)
+        vectors = normalize_rows(vectors)
+        if len(ids) != len(vectors) or vectors.shape[1] != self.dim:
+            raise ValueError(f"Expected {len(ids)} vectors of dimension {self.dim}")
+
+        if self.backend == "faiss":
+            self._index.add_with_ids(vectors, ids)
+            return
+
+        start = len(self._ids)
+        self._vectors = np.vstack([self._vectors, vectors])
+        self._ids = np.concatenate([self._ids, ids])
+        for offset, vector_id in enumerate(ids.tolist()):
+            self._rows[vector_id] = start + offset
+
+    def remove(self, ids: Iterable[int]) -> None:
+        """Remove vectors by id (unknown ids are ignored)"""
+        ids = list(ids)
+        if not ids:
+            return
+        if self.approximate:
+            raise NotImplementedError("HNSW indexes do not support removal")
+        if self.backend == "faiss":
+            self._index.remove_ids(np.asarray(ids, dtype=np.int64))
+            return
+
+        keep = np.ones(len(self._ids), dtype=bool)
+        for vector_id in ids:
+            row = self._rows.pop(vector_id, None)
+            if row is not None:
+                keep[row] = False
+        self._vectors = self._vectors[keep]
+        self._ids = self._ids[keep]
+        self._rows = {vector_id: row for row, vector_id in enumerate(self._ids.tolist())}
+
+    def search(self, queries: np.ndarray, k: int = 1) -> List[List[Tuple[int, float]]]:
+        """
+        Find the k most similar vectors for each query
+
+        Args:
+            queries: Array of shape (n, dim) or a single vector
+            k: Neighbours per query
+
+        Returns:
+            For each query, (id, cosine similarity) pairs, best first
+        """
+        queries = normalize_rows(queries)
+        k = min(k, len(self))
+        if k == 0:
+            return [[] for _ in range(len(queries))]
+
+        if self.backend == "faiss":
+            scores, ids = self._index.search(queries, k)
+        else:
+            similarities = queries @ self._vectors.T
+            top = np.argpartition(-similarities, k - 1, axis=1)[:, :k]
+            top_scores = np.take_along_axis(similarities, top, axis=1)
+            order = np.argsort(-top_scores, axis=1)
+            scores = np.take_along_axis(top_scores, order, axis=1)
+            ids = self._ids[np.take_along_axis(top, order, axis=1)]
+
+        return [
+            [(int(i), float(s)) for i, s in zip(row_ids, row_scores) if i != -1]
+            for row_ids, row_scores in zip(ids, scores)
+        ]
@@ -3,47 +3,20 @@ Vendor Agent
 AI agent for vendor optimization, inventory management, and business insights
 """
 
-from typing import Dict, Any, List
+import asyncio
+import os
+from typing import Dict, Any, AsyncIterator, List, Optional
+import pandas as pd
 from .base_agent import BaseAgent
+from .prompt_templates import PromptTemplate
+from .forecasting import forecast_demand, forecast_product, last_complete_day, parse_dates
+from .forecast_job import ForecastStore
 
 
-class VendorAgent(BaseAgent):
-    """AI Agent for vendor-related intelligence"""
-    
-    def __init__(self):
-        super().__init__("Vendor Agent")
-    
-    async def optimize_pricing(
-        self,
-        vendor_id: str,
-        products: List[Dict],
-        market_data: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        """
-        Provide AI-powered pricing recommendations
-        
-        Args:
-            vendor_id: Vendor ID
-            products: List of vendor's products
-            market_data: Market trends and competitor data
-            
-        Returns:
-            Pricing optimization suggestions
-        """
-        prompt = f"""
+# Prompts are compiled once; list sections are trimmed to a token budget
+PRICING_PROMPT = PromptTemplate("""
 You are a pricing optimization expert for The Local Loop hyperlocal marketplace.
 
-**Vendor ID:** {vendor_id}
-
-**Current Products:**
-{self._format_products(products)}
-
-**Market Data:**
-- Average market price: {market_data.get('avg_price', 'N/A')}
-- Competitor prices: {market_data.get('competitor_prices', [])}
-- Demand trend: {market_data.get('demand_trend', 'stable')}
-- Season: {market_data.get('season', 'regular')}
-
 **Task:**
 Analyze and provide pricing recommendations to:
 1. Maximize profit while staying competitive
@@ -68,39 +41,22 @@ Analyze and provide pricing recommendations to:
   "confidence_score": 0.85
 }}
 
-Provide recommendations in JSON format.
-"""
-        
-        response = await self.generate_response(prompt, temperature=0.6)
-        return self.parse_json_response(response)
-    
-    async def inventory_management(
-        self,
-        vendor_id: str,
-        inventory: List[Dict],
-        sales_history: List[Dict]
-    ) -> Dict[str, Any]:
-        """
-        AI-powered inventory management suggestions
-        
-        Args:
-            vendor_id: Vendor ID
-            inventory: Current inventory levels
-            sales_history: Historical sales data
-            
-        Returns:
-            Inventory optimization suggestions
-        """
-        prompt = f"""
-You are an inventory management AI for The Local Loop platform.
-
 **Vendor ID:** {vendor_id}
 
-**Current Inventory:**
-{self._format_inventory(inventory)}
+**Current Products:**
+{products}
 
-**Sales History (Last 30 days):**
-{self._format_sales_history(sales_history)}
+**Market Data:**
+- Average market price: {avg_price}
+- Competitor prices: {competitor_prices}
+- Demand trend: {demand_trend}
+- Season: {season}
+
+Provide recommendations in JSON format.
+""", sections=["products"])
+
+INVENTORY_PROMPT = PromptTemplate("""
+You are an inventory management AI for The Local Loop platform.
 
 **Task:**
 Analyze inventory and provide actionable recommendations:
@@ -135,39 +91,19 @@ Analyze inventory and provide actionable recommendations:
   "overall_health": "good|needs_attention|critical"
 }}
 
-Provide analysis in JSON format.
-"""
-        
-        response = await self.generate_response(prompt, temperature=0.5)
-        return self.parse_json_response(response)
-    
-    async def business_insights(
-        self,
-        vendor_id: str,
-        performance_data: Dict[str, Any]
-    ) -> Dict[str, Any]:
-        """
-        Generate business insights and growth recommendations
-        
-        Args:
-            vendor_id: Vendor ID
-            performance_data: Sales, revenue, customer data
-            
-        Returns:
-            Business insights and recommendations
-        """
-        prompt = f"""
-You are a business intelligence advisor for The Local Loop vendors.
-
 **Vendor ID:** {vendor_id}
 
-**Performance Metrics:**
-- Total Revenue: ₹{performance_data.get('revenue', 0)}
-- Total Orders: {performance_data.get('orders', 0)}
-- Average Order Value: ₹{performance_data.get('avg_order_value', 0)}
-- Customer Rating: {performance_data.get('rating', 0)}/5
-- Repeat Customer Rate: {performance_data.get('repeat_rate', 0)}%
-- Top Products: {performance_data.get('top_products', [])}
+**Current Inventory:**
+{inventory}
+
+**Sales History (Last 30 days):**
+{sales_history}
+
+Provide analysis in JSON format.
+""", sections=["inventory", "sales_history"])
+
+BUSINESS_INSIGHTS_PROMPT = PromptTemplate("""
+You are a business intelligence advisor for The Local Loop vendors.
 
 **Task:**
 Provide strategic business insights and actionable recommendations:
@@ -192,37 +128,21 @@ Provide strategic business insights and actionable recommendations:
   "competitive_positioning": "market leader|strong|average|needs work"
 }}
 
-Provide insights in JSON format.
-"""
-        
-        response = await self.generate_response(prompt, temperature=0.7)
-        return self.parse_json_response(response)
-    
-    async def demand_prediction(
-        self,
-        vendor_id: str,
-        product_id: str,
-        historical_data: List[Dict]
-    ) -> Dict[str, Any]:
-        """
-        Predict future demand for specific products
-        
-        Args:
-            vendor_id: Vendor ID
-            product_id: Product to predict demand for
-            historical_data: Historical sales data
-            
-        Returns:
-            Demand predictions
-        """
-        prompt = f"""
-You are a demand forecasting AI for The Local Loop.
-
 **Vendor ID:** {vendor_id}
-**Product ID:** {product_id}
 
-**Historical Sales Data:**
-{self._format_sales_history(historical_data)}
+**Performance Metrics:**
+- Total Revenue: ₹{revenue}
+- Total Orders: {orders}
+- Average Order Value: ₹{avg_order_value}
+- Customer Rating: {rating}/5
+- Repeat Customer Rate: {repeat_rate}%
+- Top Products: {top_products}
+
+Provide insights in JSON format.
+""")
+
+DEMAND_PREDICTION_PROMPT = PromptTemplate("""
+You are a demand forecasting AI for The Local Loop.
 
 **Task:**
 Predict demand for the next 7 days considering:
@@ -243,51 +163,269 @@ Predict demand for the next 7 days considering:
   "insights": "key insights about demand pattern"
 }}
 
+**Vendor ID:** {vendor_id}
+**Product ID:** {product_id}
+
+**Historical Sales Data:**
+{sales_history}
+
 Provide predictions in JSON format.
-"""
+""", sections=["sales_history"])
+
+
+class VendorAgent(BaseAgent):
+    """AI Agent for vendor-related intelligence"""
+    
+    # Forecasts of all vendors' products, refreshed by the nightly batch job
+    forecast_store = ForecastStore(
+        path=os.getenv("DEMAND_FORECAST_STORE", ""),
+        max_age_hours=float(os.getenv("DEMAND_FORECAST_MAX_AGE_HOURS", "36"))
+    )
+    
+    def __init__(self):
+        super().__init__("Vendor Agent")
+    
+    async def optimize_pricing(
+        self,
+        vendor_id: str,
+        products: List[Dict],
+        market_data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Provide AI-powered pricing recommendations
+        
+        Args:
+            vendor_id: Vendor ID
+            products: List of vendor's products
+            market_data: Market trends and competitor data
+            
+        Returns:
+            Pricing optimization suggestions
+        """
+        prompt = PRICING_PROMPT.render(
+            vendor_id=vendor_id,
+            products=self._format_products(products),
+            avg_price=market_data.get('avg_price', 'N/A'),
+            competitor_prices=market_data.get('competitor_prices', []),
+            demand_trend=market_data.get('demand_trend', 'stable'),
+            season=market_data.get('season', 'regular')
+        )
+        
+        response = await self.generate_response(
+            prompt, temperature=0.6, static_prefix=PRICING_PROMPT.static_prefix
+        )
+        return self.parse_json_response(response)
+    
+    async def inventory_management(
+        self,
+        vendor_id: str,
+        inventory: List[Dict],
+        sales_history: List[Dict]
+    ) -> Dict[str, Any]:
+        """
+        AI-powered inventory management suggestions
+        
+        Args:
+            vendor_id: Vendor ID
+            inventory: Current inventory levels
+            sales_history: Historical sales data
+            
+        Returns:
+            Inventory optimization suggestions
+        """
+        prompt = INVENTORY_PROMPT.render(
+            vendor_id=vendor_id,
+            inventory=self._format_inventory(inventory),
+            sales_history=self._format_sales_history(sales_history)
+        )
+        
+        response = await self.generate_response(
+            prompt, temperature=0.5, static_prefix=INVENTORY_PROMPT.static_prefix
+        )
+        return self.parse_json_response(response)
+    
+    async def business_insights(
+        self,
+        vendor_id: str,
+        performance_data: Dict[str, Any]
+    ) -> Dict[str, Any]:
+        """
+        Generate business insights and growth recommendations
+        
+        Args:
+            vendor_id: Vendor ID
+            performance_data: Sales, revenue, customer data
+            
+        Returns:
+            Business insights and recommendations
+        """
+        prompt = self._business_insights_prompt(vendor_id, performance_data)
+        response = await self.generate_response(
+            prompt,
+            temperature=0.7,
+            use_cache=False,
+            priority="background",
+            static_prefix=BUSINESS_INSIGHTS_PROMPT.static_prefix
+        )
+        return self.parse_json_response(response)
+    
+    def stream_business_insights(
+        self,
+        vendor_id: str,
+        performance_data: Dict[str, Any]
+    ) -> AsyncIterator[str]:
+        """
+        Generate business insights, streaming the raw response
+        
+        Args:
+            vendor_id: Vendor ID
+            performance_data: Sales, revenue, customer data
+            
+        Returns:
+            Async iterator of response text chunks; parse the joined text
+            with parse_json_response
+        """
+        prompt = self._business_insights_prompt(vendor_id, performance_data)
+        return self.stream_response(prompt, temperature=0.7, priority="background")
+    
+    def _business_insights_prompt(
+        self,
+        vendor_id: str,
+        performance_data: Dict[str, Any]
+    ) -> str:
+        """Build the business insights prompt"""
+        return BUSINESS_INSIGHTS_PROMPT.render(
+            vendor_id=vendor_id,
+            revenue=performance_data.get('revenue', 0),
+            orders=performance_data.get('orders', 0),
+            avg_order_value=performance_data.get('avg_order_value', 0),
+            rating=performance_data.get('rating', 0),
+            repeat_rate=performance_data.get('repeat_rate', 0),
+            top_products=performance_data.get('top_products', [])
+        )
+    
+    async def demand_prediction(
+        self,
+        vendor_id: str,
+        product_id: str,
+        historical_data: List[Dict]
+    ) -> Dict[str, Any]:
+        """
+        Predict future demand for specific products
+        
+        A fresh forecast from the nightly batch job is served as is;
+        otherwise one is computed locally from the given history, and the AI
+        is only asked when there is no dated sales history to forecast from.
+        
+        Args:
+            vendor_id: Vendor ID
+            product_id: Product to predict demand for
+            historical_data: Historical sales data (rows of other products
+                are ignored when rows carry a product_id)
+            
+        Returns:
+            Demand predictions
+        """
+        stored = self.forecast_store.get(vendor_id, product_id)
+        if stored is not None:
+            return {
+                "vendor_id": vendor_id,
+                "product_id": product_id,
+                **stored,
+                "generated_at": self.forecast_store.generated_for(vendor_id),
+                "source": "precomputed"
+            }
+        
+        rows = [
+            row for row in historical_data
+            if not row.get('product_id') or str(row['product_id']) == str(product_id)
+        ]
+        # Forecast from yesterday, so days since the last sale count as zero
+        loop = asyncio.get_running_loop()
+        forecast = await loop.run_in_executor(
+            None, forecast_product, rows, 7, last_complete_day()
+        )
+        if forecast is not None:
+            return {"vendor_id": vendor_id, "product_id": product_id, **forecast}
         
-        response = await self.generate_response(prompt, temperature=0.5)
+        prompt = DEMAND_PREDICTION_PROMPT.render(
+            vendor_id=vendor_id,
+            product_id=product_id,
+            sales_history=self._format_sales_history(historical_data)
+        )
+        
+        response = await self.generate_response(
+            prompt, temperature=0.5, static_prefix=DEMAND_PREDICTION_PROMPT.static_prefix
+        )
         return self.parse_json_response(response)
     
-    def _format_products(self, products: List[Dict]) -> str:
-        """Format products for prompt"""
+    async def demand_forecast_batch(
+        self,
+        vendor_id: str,
+        sales_history: List[Dict],
+        horizon: int = 7,
+        as_of: Optional[str] = None
+    ) -> Dict[str, Any]:
+        """
+        Forecast demand for every product of a vendor in one call
+        
+        Args:
+            vendor_id: Vendor ID
+            sales_history: Sales rows of all products (date, product_id,
+                quantity)
+            horizon: Days to forecast
+            as_of: Last day of history (defaults to yesterday; later
+                sales are ignored)
+            
+        Returns:
+            Forecasts keyed by product ID
+        """
+        loop = asyncio.get_running_loop()
+        forecasts = await loop.run_in_executor(
+            None, forecast_demand, sales_history, horizon, as_of or last_complete_day()
+        )
+        return {
+            "vendor_id": vendor_id,
+            "products": len(forecasts),
+            "forecasts": forecasts
+        }
+    
+    def _format_products(self, products: List[Dict]) -> List[str]:
+        """Format products for prompt, one line each"""
         if not products:
-            return "No products available"
+            return ["No products available"]
         
-        formatted = []
-        for product in products[:20]:  # Limit to 20 products
-            formatted.append(
-                f"- {product.get('name', 'Unknown')}: "
-                f"₹{product.get('price', 0)} "
-                f"(Stock: {product.get('stock', 0)})"
-            )
-        return "\n".join(formatted)
+        return [
+            f"- {product.get('name', 'Unknown')}: "
+            f"₹{product.get('price', 0)} "
+            f"(Stock: {product.get('stock', 0)})"
+            for product in products
+        ]
     
-    def _format_inventory(self, inventory: List[Dict]) -> str:
-        """Format inventory for prompt"""
+    def _format_inventory(self, inventory: List[Dict]) -> List[str]:
+        """Format inventory for prompt, one line each"""
         if not inventory:
-            return "No inventory data"
+            return ["No inventory data"]
         
-        formatted = []
-        for item in inventory[:20]:
-            formatted.append(
-                f"- {item.get('product_name', 'Unknown')}: "
-                f"{item.get('quantity', 0)} units "
-                f"(Min: {item.get('min_stock', 0)})"
-            )
-        return "\n".join(formatted)
+        return [
+            f"- {item.get('product_name', 'Unknown')}: "
+            f"{item.get('quantity', 0)} units "
+            f"(Min: {item.get('min_stock', 0)})"
+            for item in inventory
+        ]
     
-    def _format_sales_history(self, history: List[Dict]) -> str:
-        """Format sales history for prompt"""
+    def _format_sales_history(self, history: List[Dict]) -> List[str]:
+        """Format sales history for prompt, one line each (most recent first)"""
         if not history:
-            return "No sales history"
+            return ["No sales history"]
         
-        formatted = []
-        for sale in history[:30]:  # Last 30 entries
-            formatted.append(
-                f"- {sale.get('date', 'N/A')}: "
-                f"{sale.get('product_name', 'Unknown')} - "
-                f"{sale.get('quantity', 0)} units"
-            )
-        return "\n".join(formatted)
-
+        # Newest first, so trimming to the token budget drops the oldest
+        # sales; rows without a readable date go last
+        days = pd.Series(parse_dates([sale.get('date') for sale in history]))
+        order = days.sort_values(ascending=False, na_position="last", kind="stable").index
+        return [
+            f"- {history[i].get('date', 'N/A')}: "
+            f"{history[i].get('product_name', 'Unknown')} - "
+            f"{history[i].get('quantity', 0)} units"
+            for i in order
+        ]
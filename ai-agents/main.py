@@ -4,11 +4,14 @@ Main entry point for the AI autonomous agents system
 Powered by Google Vertex AI (Gemini 2.0 Flash)
 """
 
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
-from typing import Optional, List, Dict, Any
+from typing import Optional, List, Dict, Any, AsyncIterator
 import os
+import json
+import asyncio
 from dotenv import load_dotenv
 from datetime import datetime
 
@@ -21,6 +24,12 @@ from agents.vendor_agent import VendorAgent
 from agents.delivery_agent import DeliveryAgent
 from agents.area_intelligence_agent import AreaIntelligenceAgent
 from agents.location_matcher_agent import LocationMatcherAgent
+from agents.base_agent import BaseAgent
+from agents.model_registry import model_registry
+from agents.call_policy import deadline
+from agents.bulk import read_csv_records
+from agents.co_purchase import CoPurchaseMatrix
+from agents.forecast_job import run_forecast_job, seconds_until
 
 # Initialize FastAPI app
 app = FastAPI(
@@ -44,13 +53,107 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Initialize AI Agents
+# Time budgets in seconds for AI calls made while serving an endpoint; when a
+# budget runs out the agent answers with its fallback response. Streaming
+# endpoints apply it to the first chunk and to each gap between chunks.
+# Other endpoints use LLM_TIMEOUT_SECONDS.
+ENDPOINT_DEADLINES = {
+    "/agents/area-validation": 5.0,
+    "/agents/area/parse-address": 5.0,
+    "/agents/delivery/assignment": 5.0,
+    "/agents/delivery/issue-resolution": 10.0,
+    "/agents/customer/query": 10.0,
+    "/agents/customer/query/stream": 10.0,
+    "/agents/vendor/business-insights/stream": 15.0,
+    "/agents/customer/recommendations": 10.0,
+    "/agents/customer/predict-needs": 10.0,
+    "/agents/delivery/time-prediction": 8.0,
+}
+
+@app.middleware("http")
+async def apply_endpoint_deadline(request: Request, call_next):
+    """Set the AI call deadline for the endpoint being served"""
+    with deadline(ENDPOINT_DEADLINES.get(request.url.path)):
+        return await call_next(request)
+
+# Initialize AI Agents (Vertex AI itself is initialized lazily and shared)
 customer_agent = CustomerAgent()
 vendor_agent = VendorAgent()
 delivery_agent = DeliveryAgent()
 area_agent = AreaIntelligenceAgent()
 location_matcher = LocationMatcherAgent()
 
+@app.on_event("startup")
+async def warm_up_model():
+    """
+    Load the shared Vertex AI model in the background so the service accepts
+    requests immediately and the first AI call does not pay the SDK import
+    """
+    loop = asyncio.get_running_loop()
+    loop.run_in_executor(None, model_registry.get_model, customer_agent.model_name)
+
+# Co-purchase counts survive restarts when a snapshot path is configured
+CO_PURCHASE_PATH = os.getenv("CO_PURCHASE_PATH", "")
+
+@app.on_event("startup")
+async def load_co_purchase_matrix():
+    """Restore the co-purchase matrix saved at the last shutdown"""
+    if CO_PURCHASE_PATH and os.path.exists(CO_PURCHASE_PATH):
+        loop = asyncio.get_running_loop()
+        CustomerAgent.co_purchase = await loop.run_in_executor(
+            None, CoPurchaseMatrix.load, CO_PURCHASE_PATH
+        )
+        print(f"✅ Co-purchase matrix loaded ({len(CustomerAgent.co_purchase)} orders)")
+
+@app.on_event("shutdown")
+async def save_co_purchase_matrix():
+    """Save the co-purchase matrix so it need not be rebuilt on restart"""
+    if CO_PURCHASE_PATH:
+        CustomerAgent.co_purchase.save(CO_PURCHASE_PATH)
+
+# Nightly demand forecasts of every vendor's products (read from the
+# backend database), so dashboards do not forecast on each request
+DEMAND_FORECAST_HOUR = int(os.getenv("DEMAND_FORECAST_HOUR", "3"))
+DEMAND_FORECAST_WORKERS = int(os.getenv("DEMAND_FORECAST_WORKERS", str(os.cpu_count() or 1)))
+DEMAND_FORECAST_HISTORY_DAYS = int(os.getenv("DEMAND_FORECAST_HISTORY_DAYS", "365"))
+forecast_job_lock = asyncio.Lock()
+
+async def run_demand_forecasts(sales: Optional[List[Dict[str, Any]]] = None) -> Dict[str, Any]:
+    """Run the batch forecast job off the event loop (one run at a time)"""
+    async with forecast_job_lock:
+        loop = asyncio.get_running_loop()
+        summary = await loop.run_in_executor(
+            None, run_forecast_job, VendorAgent.forecast_store, sales,
+            os.getenv("DATABASE_URL", ""), DEMAND_FORECAST_HISTORY_DAYS, 7,
+            DEMAND_FORECAST_WORKERS
+        )
+        print(f"✅ Demand forecasts refreshed ({summary['products']} products, "
+              f"{summary['forecast_seconds']}s)")
+        return summary
+
+async def schedule_demand_forecasts():
+    """Refresh forecasts now if they are stale, then every night"""
+    if not VendorAgent.forecast_store.fresh:
+        try:
+            await run_demand_forecasts()
+        except Exception as e:
+            print(f"⚠️ Demand forecast job failed: {e}")
+    while True:
+        await asyncio.sleep(seconds_until(DEMAND_FORECAST_HOUR))
+        try:
+            await run_demand_forecasts()
+        except Exception as e:
+            print(f"⚠️ Demand forecast job failed: {e}")
+
+@app.on_event("startup")
+async def start_demand_forecasts():
+    """Load saved forecasts and start the nightly job when a database is configured"""
+    store = VendorAgent.forecast_store
+    if store.load():
+        print(f"✅ Demand forecasts loaded (generated {store.generated_at})")
+    if os.getenv("DATABASE_URL"):
+        app.state.forecast_task = asyncio.create_task(schedule_demand_forecasts())
+
 # Pydantic models
 class OrderRequest(BaseModel):
     order_id: str
@@ -90,9 +193,57 @@ async def health_check():
             "delivery_agent": "active",
             "area_intelligence": "active"
         },
-        "ai_backend": "Google Vertex AI"
+        "ai_backend": "Google Vertex AI",
+        "llm_cache": {
+            **BaseAgent.response_cache.stats(),
+            "coalesced_requests": BaseAgent.coalesced_requests
+        }
     }
 
+@app.get("/metrics/llm")
+async def llm_metrics():
+    """
+    AI call scheduling and caching metrics
+    """
+    return {
+        "scheduler": BaseAgent.scheduler.metrics(),
+        "cache": BaseAgent.response_cache.stats(),
+        "coalesced_requests": BaseAgent.coalesced_requests,
+        "micro_batching": BaseAgent.micro_batcher.stats(),
+        "call_policy": BaseAgent.call_policy.stats(),
+        "context_cache": BaseAgent.context_cache.stats(),
+        "semantic_cache": CustomerAgent.query_cache.stats()
+    }
+
+def sse_response(
+    agent: BaseAgent,
+    chunks: AsyncIterator[str],
+    required_fields: Optional[List[str]] = None
+) -> StreamingResponse:
+    """
+    Stream an agent response as server-sent events
+    
+    Sends a 'token' event per text chunk, 'item' and 'field' events as
+    top-level array items and fields of the JSON response complete, then a
+    'result' event with the parsed response (or an 'error' event if
+    generation fails). Generation stops early once required_fields are in.
+    """
+    async def events():
+        try:
+            async for event in agent.stream_json_events(chunks, required_fields):
+                event_type = event.pop("type")
+                if event_type == "result":
+                    event = {"success": True, "data": event["data"]}
+                yield f"event: {event_type}\ndata: {json.dumps(event)}\n\n"
+        except Exception as e:
+            yield f"event: error\ndata: {json.dumps({'success': False, 'detail': str(e)})}\n\n"
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 # ============================================================================
 # CUSTOMER AGENT ENDPOINTS
 # ============================================================================
@@ -107,12 +258,66 @@ async def get_customer_recommendations(request: Dict[str, Any]):
             customer_id=request.get("customer_id"),
             purchase_history=request.get("purchase_history", []),
             current_time=request.get("current_time", datetime.now().isoformat()),
-            area_id=request.get("area_id", "")
+            area_id=request.get("area_id", ""),
+            limit=int(request.get("limit", 10)),
+            ai_message=request.get("ai_message")
         )
         return {"success": True, "data": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/agents/customer/recommendations/index")
+async def build_recommendation_index(request: Dict[str, Any]):
+    """
+    Rebuild the recommendation index from order history and the catalog
+    """
+    try:
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(
+            None,
+            CustomerAgent.recommender.build,
+            request.get("orders", []),
+            request.get("products", [])
+        )
+        return {"success": True, "data": result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/agents/customer/orders")
+async def record_customer_orders(request: Dict[str, Any]):
+    """
+    Add new (or historical) orders to the co-purchase matrix
+    
+    Orders already recorded (same order_id) are skipped.
+    """
+    try:
+        orders = request.get("orders") or [request.get("order", {})]
+        loop = asyncio.get_running_loop()
+        added = await loop.run_in_executor(None, CustomerAgent.co_purchase.add_orders, orders)
+        return {
+            "success": True,
+            "data": {"added": added, **CustomerAgent.co_purchase.stats()}
+        }
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/agents/customer/complements")
+async def get_cart_complements(request: Dict[str, Any]):
+    """
+    Products often bought together with a cart (no AI call)
+    """
+    try:
+        result = customer_agent.co_purchase.complements(
+            request.get("cart_items", []),
+            area_id=request.get("area_id"),
+            k=int(request.get("limit", 5))
+        )
+        return {"success": True, "data": {"complements": result}}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/agents/customer/query")
 async def answer_customer_query(request: Dict[str, Any]):
     """
@@ -127,6 +332,17 @@ async def answer_customer_query(request: Dict[str, Any]):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/agents/customer/query/stream")
+async def stream_customer_query(request: Dict[str, Any]):
+    """
+    Answer customer questions using AI, streamed as server-sent events
+    """
+    chunks = customer_agent.stream_customer_query(
+        query=request.get("query"),
+        context=request.get("context", {})
+    )
+    return sse_response(customer_agent, chunks, request.get("required_fields"))
+
 @app.post("/agents/customer/predict-needs")
 async def predict_customer_needs(request: Dict[str, Any]):
     """
@@ -189,6 +405,17 @@ async def get_vendor_insights(request: Dict[str, Any]):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/agents/vendor/business-insights/stream")
+async def stream_vendor_insights(request: Dict[str, Any]):
+    """
+    Generate business insights for vendors, streamed as server-sent events
+    """
+    chunks = vendor_agent.stream_business_insights(
+        vendor_id=request.get("vendor_id", ""),
+        performance_data=request.get("performance_data", {})
+    )
+    return sse_response(vendor_agent, chunks, request.get("required_fields"))
+
 @app.post("/agents/vendor/demand-prediction")
 async def predict_product_demand(request: Dict[str, Any]):
     """
@@ -204,6 +431,42 @@ async def predict_product_demand(request: Dict[str, Any]):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/agents/vendor/demand-prediction/batch")
+async def predict_vendor_demand(request: Dict[str, Any]):
+    """
+    Forecast demand for all products of a vendor (no AI call)
+    """
+    try:
+        result = await vendor_agent.demand_forecast_batch(
+            vendor_id=request.get("vendor_id", ""),
+            sales_history=request.get("sales_history", []),
+            horizon=int(request.get("horizon", 7)),
+            as_of=request.get("as_of")
+        )
+        return {"success": True, "data": result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/agents/vendor/demand-forecasts/run")
+async def refresh_demand_forecasts(request: Dict[str, Any]):
+    """
+    Run the batch forecast job now, from posted sales rows (vendor_id,
+    product_id, date, quantity; only those vendors are replaced) or from
+    the database
+    """
+    try:
+        result = await run_demand_forecasts(request.get("sales_history"))
+        return {"success": True, "data": result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/agents/vendor/demand-forecasts/status")
+async def demand_forecasts_status():
+    """
+    Get the age and size of the precomputed forecasts
+    """
+    return {"success": True, "data": VendorAgent.forecast_store.stats()}
+
 # ============================================================================
 # DELIVERY AGENT ENDPOINTS
 # ============================================================================
@@ -211,19 +474,62 @@ async def predict_product_demand(request: Dict[str, Any]):
 @app.post("/agents/delivery/assignment")
 async def assign_delivery_partner(request: Dict[str, Any]):
     """
-    AI-powered delivery partner assignment
+    Delivery partner assignment
+    (uses registered partners near the pickup unless available_partners is sent)
     """
     try:
+        pickup_location = request.get("pickup_location", {})
+        available_partners = request.get("available_partners")
+        if available_partners is None and pickup_location.get("lat") and pickup_location.get("lng"):
+            available_partners, _ = location_matcher.find_within_radius(
+                pickup_location["lat"], pickup_location["lng"], None, "delivery_partner"
+            )
+        
         result = await delivery_agent.optimize_delivery_assignment(
             order_id=request.get("order_id", ""),
-            pickup_location=request.get("pickup_location", {}),
+            pickup_location=pickup_location,
             delivery_location=request.get("delivery_location", {}),
-            available_partners=request.get("available_partners", [])
+            available_partners=available_partners or [],
+            delivery_priority=request.get("delivery_priority"),
+            explain=request.get("explain", False)
         )
         return {"success": True, "data": result}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.post("/agents/delivery/batch-assignment")
+async def batch_assign_delivery_partners(request: Dict[str, Any]):
+    """
+    Assign many orders to many delivery partners in one solve
+    (uses registered partners near the pickups unless available_partners is sent)
+    """
+    try:
+        orders = request.get("orders", [])
+        available_partners = request.get("available_partners")
+        if available_partners is None:
+            nearby = {}
+            for order in orders:
+                pickup = order.get("pickup_location") or {}
+                if not pickup.get("lat") or not pickup.get("lng"):
+                    continue
+                partners, _ = location_matcher.find_within_radius(
+                    pickup["lat"], pickup["lng"], None, "delivery_partner"
+                )
+                for partner in partners:
+                    nearby[partner["id"]] = partner
+            available_partners = list(nearby.values())
+        
+        result = await delivery_agent.batch_assign_orders(
+            orders=orders,
+            available_partners=available_partners,
+            max_orders_per_partner=request.get("max_orders_per_partner", 1)
+        )
+        return {"success": True, "data": result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
 @app.post("/agents/delivery/route-optimization")
 async def optimize_delivery_route(request: Dict[str, Any]):
     """
@@ -233,9 +539,12 @@ async def optimize_delivery_route(request: Dict[str, Any]):
         result = await delivery_agent.optimize_route(
             partner_id=request.get("partner_id", ""),
             current_location=request.get("current_location", {}),
-            pending_deliveries=request.get("pending_deliveries", [])
+            pending_deliveries=request.get("pending_deliveries", []),
+            departure_time=request.get("departure_time")
         )
         return {"success": True, "data": result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -329,6 +638,80 @@ async def parse_address(request: Dict[str, Any]):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+# Limits for bulk address endpoints
+BULK_MAX_ADDRESSES = int(os.getenv("BULK_MAX_ADDRESSES", "20000"))
+BULK_MAX_CONCURRENCY = int(os.getenv("BULK_MAX_CONCURRENCY", "32"))
+
+def bulk_records(request: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """
+    Get address records from a bulk request
+    
+    Accepts either "addresses" (a list of objects, or of plain address
+    strings) or "csv" (CSV text with a header row naming an address column).
+    """
+    if request.get("csv"):
+        records = read_csv_records(request["csv"])
+    else:
+        addresses = request.get("addresses") or []
+        if not isinstance(addresses, list):
+            raise HTTPException(status_code=400, detail='"addresses" must be a list')
+        records = [
+            {"address": item} if isinstance(item, str) else item
+            for item in addresses
+        ]
+        invalid = [index for index, record in enumerate(records) if not isinstance(record, dict)]
+        if invalid:
+            raise HTTPException(
+                status_code=400,
+                detail=f"Addresses must be objects or strings (invalid at index {invalid[0]})"
+            )
+    
+    if len(records) > BULK_MAX_ADDRESSES:
+        raise HTTPException(
+            status_code=400,
+            detail=f"At most {BULK_MAX_ADDRESSES} addresses per request"
+        )
+    return records
+
+def ndjson_response(results: AsyncIterator[Dict[str, Any]], total: int) -> StreamingResponse:
+    """
+    Stream bulk results as newline-delimited JSON
+    
+    One line per address as it completes, then a summary line.
+    """
+    async def lines():
+        started = datetime.now()
+        succeeded = 0
+        async for result in results:
+            succeeded += result["success"]
+            yield json.dumps(result) + "\n"
+        yield json.dumps({"summary": {
+            "total": total,
+            "succeeded": succeeded,
+            "failed": total - succeeded,
+            "elapsed_seconds": round((datetime.now() - started).total_seconds(), 2)
+        }}) + "\n"
+    
+    return StreamingResponse(lines(), media_type="application/x-ndjson")
+
+@app.post("/agents/area-validation/bulk")
+async def validate_service_areas_bulk(request: Dict[str, Any]):
+    """
+    Validate many addresses, streaming results as NDJSON
+    """
+    records = bulk_records(request)
+    concurrency = min(int(request.get("concurrency", 16)), BULK_MAX_CONCURRENCY)
+    return ndjson_response(area_agent.validate_areas_bulk(records, concurrency), len(records))
+
+@app.post("/agents/area/parse-address/bulk")
+async def parse_addresses_bulk(request: Dict[str, Any]):
+    """
+    Parse many addresses, streaming results as NDJSON
+    """
+    records = bulk_records(request)
+    concurrency = min(int(request.get("concurrency", 16)), BULK_MAX_CONCURRENCY)
+    return ndjson_response(area_agent.parse_addresses_bulk(records, concurrency), len(records))
+
 # ============================================================================
 # LOCATION MATCHER AGENT ENDPOINTS (5KM RADIUS MATCHING)
 # ============================================================================
@@ -337,11 +720,12 @@ async def parse_address(request: Dict[str, Any]):
 async def get_nearby_vendors(request: Dict[str, Any]):
     """
     Get vendors within 5km radius of customer location
+    (uses registered vendors unless all_vendors is sent)
     """
     try:
         result = await location_matcher.get_nearby_vendors(
             customer_location=request.get("customer_location", {}),
-            all_vendors=request.get("all_vendors", [])
+            all_vendors=request.get("all_vendors")
         )
         return {"success": True, "data": result}
     except Exception as e:
@@ -351,11 +735,12 @@ async def get_nearby_vendors(request: Dict[str, Any]):
 async def get_nearby_delivery_partners(request: Dict[str, Any]):
     """
     Get delivery partners within 5km radius of pickup location
+    (uses registered partners unless all_partners is sent)
     """
     try:
         result = await location_matcher.get_nearby_delivery_partners(
             pickup_location=request.get("pickup_location", {}),
-            all_partners=request.get("all_partners", [])
+            all_partners=request.get("all_partners")
         )
         return {"success": True, "data": result}
     except Exception as e:
@@ -380,13 +765,14 @@ async def validate_service_coverage(request: Dict[str, Any]):
 async def get_area_statistics(request: Dict[str, Any]):
     """
     Get statistics about vendors, customers, and delivery partners in an area
+    (uses registered entities for any list that is not sent)
     """
     try:
         result = await location_matcher.get_area_statistics(
             center_location=request.get("center_location", {}),
-            all_vendors=request.get("all_vendors", []),
-            all_customers=request.get("all_customers", []),
-            all_delivery_partners=request.get("all_delivery_partners", [])
+            all_vendors=request.get("all_vendors"),
+            all_customers=request.get("all_customers"),
+            all_delivery_partners=request.get("all_delivery_partners")
         )
         return {"success": True, "data": result}
     except Exception as e:
@@ -422,6 +808,60 @@ async def calculate_distance(request: Dict[str, Any]):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@app.post("/agents/location/entities/upsert")
+async def upsert_location_entities(request: Dict[str, Any]):
+    """
+    Register vendors, customers or delivery partners with their locations
+    so radius queries no longer need the full list in every request
+    """
+    try:
+        result = location_matcher.upsert_entities(
+            entity_type=request.get("entity_type", ""),
+            entities=request.get("entities", [])
+        )
+        return {"success": True, "data": result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/agents/location/entities/delete")
+async def delete_location_entities(request: Dict[str, Any]):
+    """
+    Remove registered entities from the location matcher
+    """
+    try:
+        result = location_matcher.delete_entities(
+            entity_type=request.get("entity_type", ""),
+            entity_ids=request.get("ids", [])
+        )
+        return {"success": True, "data": result}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.post("/agents/location/delivery-partners/pings")
+async def ingest_delivery_partner_pings(request: Dict[str, Any]):
+    """
+    Ingest a batch of live delivery partner position pings
+    """
+    try:
+        result = location_matcher.ingest_location_pings(
+            pings=request.get("pings", [])
+        )
+        return {"success": True, "data": result}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@app.get("/agents/location/entities")
+async def get_registered_entity_counts():
+    """
+    Get the number of registered entities per type
+    """
+    return {"success": True, "data": location_matcher.get_registered_counts()}
+
+
 # ============================================================================
 # SERVER STARTUP
 # ============================================================================
@@ -0,0 +1,73 @@
+"""Context caching of static prompt prefixes, run against the local backend"""
+
+import asyncio
+from typing import Any, List
+
+from agents.base_agent import BaseAgent
+from agents.context_cache import ContextCache, LocalContextCacheBackend
+
+
+class _Response:
+    def __init__(self, text: str):
+        self.text = text
+
+
+class RecordingModel:
+    """Model that records the prompts it receives"""
+
+    def __init__(self):
+        self.prompts: List[str] = []
+
+    async def generate_content_async(self, prompt: str, **kwargs: Any) -> _Response:
+        self.prompts.append(prompt)
+        return _Response('{"ok": true}')
+
+
+PREFIX = "Fixed instructions. " * 40
+SUFFIX = "Request data: order 42"
+
+
+def _agent(min_tokens: int):
+    """Agent whose model and context cache record what is sent"""
+    agent = BaseAgent("context_cache_test")
+    agent.model = RecordingModel()
+    backend_model = RecordingModel()
+    backend = LocalContextCacheBackend(backend_model)
+    agent.context_cache = ContextCache(min_tokens=min_tokens, backend=backend)
+    return agent, backend, backend_model
+
+
+def _generate(agent: BaseAgent, prompt: str) -> str:
+    return asyncio.run(agent.generate_response(prompt, use_cache=False, static_prefix=PREFIX))
+
+
+def test_long_prefix_is_cached_once_and_only_the_suffix_is_sent():
+    agent, backend, backend_model = _agent(min_tokens=50)
+
+    assert _generate(agent, PREFIX + SUFFIX) == '{"ok": true}'
+    assert _generate(agent, PREFIX + "Request data: order 43") == '{"ok": true}'
+
+    # The cached-content model prepends the prefix; the shared model is unused
+    assert backend.created == 1
+    assert backend_model.prompts == [PREFIX + SUFFIX, PREFIX + "Request data: order 43"]
+    assert agent.model.prompts == []
+    assert agent.context_cache.stats()["hits"] == 1
+
+
+def test_short_prefix_is_sent_in_full():
+    agent, backend, _ = _agent(min_tokens=4096)
+
+    _generate(agent, PREFIX + SUFFIX)
+
+    assert backend.created == 0
+    assert agent.model.prompts == [PREFIX + SUFFIX]
+    assert agent.context_cache.stats()["skipped_short_prefixes"] == 1
+
+
+def test_prompt_not_starting_with_prefix_is_sent_in_full():
+    agent, backend, _ = _agent(min_tokens=50)
+
+    _generate(agent, SUFFIX)
+
+    assert backend.created == 0
+    assert agent.model.prompts == [SUFFIX]
@@ -0,0 +1,80 @@
+"""Semantic cache lookups with the offline HashingEmbedder"""
+
+import pytest
+
+from agents import semantic_cache
+from agents.semantic_cache import HashingEmbedder, SemanticCache
+
+
+CONTEXT = {"order_status": "out_for_delivery", "order_id": "o1"}
+ANSWER = {"answer": "Your order is on its way."}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def monotonic(self) -> float:
+        return self.now
+
+
+@pytest.fixture
+def cache() -> SemanticCache:
+    cache = SemanticCache(threshold=0.9, ttl_seconds=900.0, embedder=HashingEmbedder())
+    cache.set("Where is my order?", CONTEXT, ANSWER)
+    return cache
+
+
+@pytest.mark.parametrize("query", [
+    "where's my order",
+    "WHERE IS MY ORDER",
+    "Where is my order??",
+    "Where’s my order?",
+])
+def test_paraphrase_hits(cache, query):
+    assert cache.get(query, CONTEXT) == ANSWER
+    assert cache.stats()["hits"] == 1
+
+
+@pytest.mark.parametrize("query", [
+    "Do you sell fresh milk?",
+    "How do I cancel my order?",
+    "Where is my refund?",
+])
+def test_unrelated_question_misses(cache, query):
+    assert cache.get(query, CONTEXT) is None
+    assert cache.stats()["misses"] == 1
+
+
+def test_threshold_decides_between_hit_and_miss():
+    # "Where is my refund?" is similar to the cached question, but not
+    # similar enough for the default threshold
+    strict = SemanticCache(threshold=0.9, embedder=HashingEmbedder())
+    loose = SemanticCache(threshold=0.6, embedder=HashingEmbedder())
+    for cache in (strict, loose):
+        cache.set("Where is my order?", CONTEXT, ANSWER)
+
+    assert strict.get("Where is my refund?", CONTEXT) is None
+    assert loose.get("Where is my refund?", CONTEXT) == ANSWER
+
+
+def test_different_context_misses(cache):
+    other = {**CONTEXT, "order_status": "delivered"}
+
+    assert cache.get("where's my order", other) is None
+    assert cache.get("where's my order", None) is None
+    assert cache.get("where's my order", dict(reversed(list(CONTEXT.items())))) == ANSWER
+
+
+def test_entry_expires_after_ttl(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(semantic_cache, "time", clock)
+    cache = SemanticCache(ttl_seconds=60.0, embedder=HashingEmbedder())
+    cache.set("Where is my order?", CONTEXT, ANSWER)
+
+    clock.now += 59
+    assert cache.get("where's my order", CONTEXT) == ANSWER
+
+    clock.now += 2
+    assert cache.get("where's my order", CONTEXT) is None
+    assert len(cache) == 0